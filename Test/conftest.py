@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from moldyn.simulation.builder import Model
+
+
+def make_model(nx=6, ny=6, periodic=(1, 1), seed=0):
+    """
+    Small binary model on a jittered grid, with a temperature.
+    """
+    np.random.seed(seed)
+    model = Model(x_a=0.5)
+    model.atom_grid(nx, ny, 1.12*model.re)
+    model.set_periodic_boundary(*periodic)
+    model.shuffle_atoms()
+    model.pos += np.random.normal(scale=0.05*model.re, size=model.pos.shape)
+    model.T = 10
+    return model
+
+
+def model_consts(model):
+    """
+    Constants of the compute modules (see `forces_CPU.ForcesComputeCPU`).
+    """
+    return {key.upper(): value for key, value in model.params.items()}
+
+
+@pytest.fixture
+def model():
+    return make_model()
+
+
+@pytest.fixture
+def gpu():
+    """
+    OpenGL context of the calling thread, the test being skipped if there is none.
+    """
+    from moldyn.simulation.backends import registry
+    try:
+        return registry.context()
+    except Exception as e:
+        pytest.skip(f"GPU not available ({e})")
@@ -0,0 +1,36 @@
+import threading
+
+import numpy as np
+
+from moldyn.simulation.backends import registry
+from moldyn.simulation.runner import Simulation
+from moldyn.simulation.forces_GPU import ForcesComputeGPU
+
+
+def test_thread_contexts(model, gpu):
+    before = len(registry._contexts)
+    contexts = []
+    errors = []
+
+    def run():
+        try:
+            simulation = Simulation(model, prefer_gpu=True)
+            assert isinstance(simulation._compute, ForcesComputeGPU)
+            contexts.append(simulation._compute.context)
+            simulation.iter(5)
+            assert np.all(np.isfinite(simulation.model.pos))
+            simulation.release()
+        except Exception as e:
+            errors.append(e)
+
+    # threads successifs, dont les identifiants peuvent être réutilisés
+    for _ in range(3):
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+        assert not errors, errors
+        # contexte libéré avec son thread
+        assert len(registry._contexts) == before
+    # un contexte par thread, celui du thread principal étant conservé
+    assert len(contexts) == 3 and all(context is not gpu for context in contexts)
+    assert registry.context() is gpu
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from moldyn.simulation.runner import Simulation
+from moldyn.simulation.forces_GPU import ForcesComputeGPU
+from moldyn.utils.data_mng import DynState
+
+# demi-paires : avec des cellules sur CPU, avec une liste de voisins sur GPU
+NEIGHBOURS = {"all": ("all", False), "cells": ("cells", False), "verlet": ("verlet", False), "half": (None, True)}
+
+
+def make_simulation(model, gpu, resident, neighbours):
+    neighbours, half = NEIGHBOURS[neighbours]
+    if half:
+        neighbours = "verlet" if gpu else "cells"
+    if resident and neighbours == "verlet":
+        pytest.skip("Neighbour lists cannot be used with resident mode")
+    simulation = Simulation(model, prefer_gpu=gpu, resident=resident, neighbours=neighbours, half=half)
+    if gpu and not isinstance(simulation._compute, ForcesComputeGPU):
+        pytest.skip("GPU not available")
+    return simulation
+
+
+@pytest.mark.filterwarnings("ignore:GPU not available")
+@pytest.mark.parametrize("neighbours", list(NEIGHBOURS))
+@pytest.mark.parametrize("resident", [None, 4], ids=["host", "resident"])
+@pytest.mark.parametrize("gpu", [False, True], ids=["cpu", "gpu"])
+def test_resume_is_identical(tmp_path, model, gpu, resident, neighbours):
+    # simulation ininterrompue
+    np.random.seed(1)
+    reference = make_simulation(model, gpu, resident, neighbours)
+    reference.iter(30)
+
+    # même simulation, interrompue après le point de reprise de l'itération 14, puis reprise
+    np.random.seed(1)
+    ds = DynState(str(tmp_path / "run"))
+    interrupted = make_simulation(model, gpu, resident, neighbours)
+    interrupted.set_checkpoints(ds, 7)
+    interrupted.iter(17)
+    interrupted.release()
+
+    resumed = Simulation.from_checkpoint(ds)
+    assert resumed.current_iter == 14
+    assert type(resumed._compute) is type(reference._compute)
+    resumed.iter(30 - resumed.current_iter)
+
+    assert resumed.current_iter == reference.current_iter
+    assert np.array_equal(resumed.model.pos, reference.model.pos)
+    assert np.array_equal(resumed.model.v, reference.model.v)
+    for key in ("T", "EC", "EP", "bonds"):
+        assert np.array_equal(resumed.state_fct[key], np.asarray(reference.state_fct[key]))
+    resumed.release()
+    reference.release()
@@ -0,0 +1,28 @@
+import os
+import sys
+import subprocess
+
+from moldyn.simulation.builder import Model
+from moldyn.utils.data_mng import DynState
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def small_model(nx=6, ny=6):
+    model = Model(x_a=0.5)
+    model.atom_grid(nx, ny, 1.12*model.re)
+    model.set_periodic_boundary(1, 1)
+    model.shuffle_atoms()
+    model.T = 10
+    return model
+
+
+def test_run_exits(tmp_path):
+    # les noyaux parallèles sont lancés depuis un thread de calcul : le processus doit tout de même se terminer, avec
+    # la couche de threads choisie par défaut par numba
+    DynState(str(tmp_path / "model")).save_model(small_model())
+    env = {k: v for k, v in os.environ.items() if not k.startswith("NUMBA_THREADING_LAYER")}
+    result = subprocess.run([sys.executable, "-m", "moldyn.cli", str(tmp_path / "model"), "-o", str(tmp_path / "out"),
+                             "-n", "20", "-q"], env=env, cwd=ROOT, timeout=300)
+    assert result.returncode == 0
+    assert DynState(str(tmp_path / "out")).read_checkpoint()[1]["current_iter"] == 20
@@ -0,0 +1,115 @@
+import os
+import zipfile
+
+import numpy as np
+import pytest
+
+from moldyn.utils import data_mng
+from moldyn.utils.data_mng import DynState
+
+
+def save_run(path, model, frames=1):
+    ds = DynState(str(path))
+    ds.save_model(model)
+    with ds.trajectory_writer(model.npart, stride=10) as writer:
+        for k in range(frames):
+            writer.write(10*k, pos=model.pos + k)
+    return ds
+
+
+@pytest.fixture
+def data_path(tmp_path, monkeypatch):
+    # répertoires d'extraction dans le répertoire du test
+    monkeypatch.setattr(data_mng, "data_path", str(tmp_path / "data"))
+    return tmp_path / "data"
+
+
+def test_archives_are_not_shared(tmp_path, data_path, model):
+    for name, frames in (("a", 2), ("b", 1)):
+        save_run(tmp_path / name, model, frames).to_zip(str(tmp_path / (name + ".mds")))
+
+    a = DynState(str(tmp_path / "a.mds"))
+    b = DynState(str(tmp_path / "b.mds"))
+    assert a.abspath != b.abspath
+    assert len(a.load_trajectory()) == 2
+    assert len(b.load_trajectory()) == 1
+
+
+def test_stale_extractions_are_removed(tmp_path, data_path, model):
+    save_run(tmp_path / "a", model).to_zip(str(tmp_path / "a.mds"))
+    save_run(tmp_path / "b", model).to_zip(str(tmp_path / "b.mds"))
+    old = DynState(str(tmp_path / "a.mds")).abspath
+    removed = DynState(str(tmp_path / "b.mds")).abspath
+    os.remove(str(tmp_path / "b.mds"))
+    foreign = data_path / "tmp" / "foreign"
+    foreign.mkdir()
+
+    # nouvelle version de a.mds : l'extraction de l'ancienne, et celle de b.mds supprimée, ne servent plus
+    save_run(tmp_path / "a", model, 3).to_zip(str(tmp_path / "a.mds"))
+    new = DynState(str(tmp_path / "a.mds"))
+    assert len(new.load_trajectory()) == 3
+    assert not os.path.exists(old) and not os.path.exists(removed)
+    assert os.path.isdir(str(foreign))
+    assert sorted(os.listdir(str(data_path / "tmp"))) == sorted([os.path.basename(os.path.normpath(new.abspath)),
+                                                                 "foreign"])
+
+
+def test_written_files(tmp_path, data_path, model):
+    save_run(tmp_path / "a", model).to_zip(str(tmp_path / "a.mds"))
+    ds = DynState(str(tmp_path / "a.mds"))
+    moved = model.copy()
+    moved.pos += 1.0
+    ds.save_model(moved)
+    assert np.array_equal(ds.load_model().pos, moved.pos)
+
+    # fichiers écrits lors d'une ouverture précédente : oubliés dans le répertoire d'extraction de DynState...
+    assert np.array_equal(DynState(str(tmp_path / "a.mds")).load_model().pos, model.pos)
+
+    # ...mais pas dans un répertoire choisi par l'appelant
+    extraction = str(tmp_path / "mine")
+    DynState(str(tmp_path / "a.mds"), extraction_path=extraction).save_model(moved)
+    kept = DynState(str(tmp_path / "a.mds"), extraction_path=extraction)
+    assert np.array_equal(kept.load_model().pos, moved.pos)
+    assert not os.path.exists(os.path.join(extraction, data_mng.EXTRACTION_MARK))
+
+
+@pytest.mark.parametrize("compression", [None, {".mdt": zipfile.ZIP_DEFLATED}], ids=["stored", "deflated"])
+def test_zip_round_trip(tmp_path, data_path, model, compression):
+    save_run(tmp_path / "run", model, 3).to_zip(str(tmp_path / "run.mds"), compression=compression)
+    with zipfile.ZipFile(str(tmp_path / "run.mds")) as archive:
+        assert archive.testzip() is None
+        assert archive.getinfo("trajectory.mdt").compress_type == (zipfile.ZIP_DEFLATED if compression
+                                                                   else zipfile.ZIP_STORED)
+        assert archive.getinfo("pos.npy").compress_type == zipfile.ZIP_DEFLATED
+
+    archived = DynState(str(tmp_path / "run.mds"))
+    assert archived.archive == str(tmp_path / "run.mds")
+    loaded = archived.load_model()
+    assert np.array_equal(loaded.pos, model.pos)
+    assert loaded.params == model.params
+    traj = archived.load_trajectory()
+    assert np.array_equal(traj.iterations, [0, 10, 20])
+    assert np.array_equal(traj[:], [model.pos + k for k in range(3)])
+    # lus directement dans l'archive (la trajectoire seulement si elle est stockée sans compression)
+    assert not os.path.exists(os.path.join(archived.abspath, DynState.POS))
+    assert os.path.exists(os.path.join(archived.abspath, DynState.TRAJ)) == bool(compression)
+
+    # nouvelle archive, depuis celle-ci
+    archived.to_zip(str(tmp_path / "copy.mds"))
+    assert np.array_equal(DynState(str(tmp_path / "copy.mds")).load_trajectory()[:], traj[:])
+
+
+def test_zip_progress(tmp_path, data_path, model):
+    ds = save_run(tmp_path / "run", model)
+    with ds.open(DynState.POS_H, mode="w") as IO:
+        IO.save(np.random.default_rng(0).normal(size=(3*2**20,))) # 24 Mo, compressés
+    calls = []
+    ds.to_zip(str(tmp_path / "fast.mds"), level=1, callback=lambda done, total: calls.append((done, total)))
+    ds.to_zip(str(tmp_path / "small.mds"), level=9)
+
+    # appelé pendant la compression du gros fichier (par blocs de 4 Mo), jusqu'au total
+    done = [d for d, _ in calls]
+    assert done == sorted(done) and done[-1] == calls[-1][1]
+    with zipfile.ZipFile(str(tmp_path / "fast.mds")) as fast, zipfile.ZipFile(str(tmp_path / "small.mds")) as small:
+        assert len(set(done)) >= len(fast.namelist()) + 5
+        assert fast.getinfo(DynState.POS_H).compress_size > small.getinfo(DynState.POS_H).compress_size
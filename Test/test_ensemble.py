@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+from moldyn.simulation.ensemble import Ensemble
+from moldyn.simulation.runner import Simulation
+
+
+@pytest.mark.parametrize("neighbours", Ensemble.NEIGHBOURS)
+def test_replica_matches_simulation(model, neighbours):
+    # même tirage des vitesses initiales que la deuxième réplique (T lue avant la
+    # copie, les valeurs spéciales de Model étant liées au dernier modèle créé)
+    T = model.T
+    start = model.copy()
+    np.random.seed(5)
+    start.random_speed()
+    start.T = T
+
+    ensemble = Ensemble(model, replicas=3, seeds=[4, 5, 6], neighbours=neighbours, batch=7)
+    assert np.array_equal(ensemble.replica(1).v, start.v)
+    assert np.array_equal(ensemble.replica(1).pos, start.pos)
+    simulation = Simulation(start, prefer_gpu=False, neighbours=neighbours)
+
+    ensemble.iter(20)
+    simulation.iter(20)
+    assert np.array_equal(ensemble.pos[1], simulation.model.pos)
+    assert np.array_equal(ensemble.v[1], simulation.model.v)
+    assert np.array_equal(ensemble.iters, simulation.state_fct["iters"])
+    for key in ("T", "EC", "EP", "bonds"):
+        reference = np.asarray(simulation.state_fct[key])
+        assert np.allclose(ensemble.state_fct[key][1], reference, rtol=1e-12, atol=1e-12 * np.abs(reference).max())
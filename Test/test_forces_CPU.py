@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+
+from moldyn.simulation.forces_CPU import ForcesComputeCPU
+from moldyn.simulation.neighbours_CPU import VerletList
+
+from .conftest import make_model, model_consts
+
+# boîtes périodiques, non périodiques et mixtes ; les plus petites n'ont qu'une ou deux cellules par axe, leurs
+# cellules voisines se confondent donc par périodicité
+BOXES = [(3, 3, (1, 1)), (4, 4, (1, 1)), (9, 7, (1, 1)), (9, 7, (0, 0)), (9, 7, (1, 0)), (4, 9, (0, 1))]
+BOX_IDS = ["3x3", "4x4", "periodic", "closed", "periodic_x", "periodic_y"]
+
+
+def compute(model, nlist=None, energies=True, **options):
+    consts = model_consts(model)
+    forces = ForcesComputeCPU(consts, **options)
+    if options.get("neighbours") == "verlet":
+        if nlist is None:
+            nlist = VerletList(consts, 0.3*model.re, half=options.get("half", False))
+            nlist.build(model.pos)
+        forces.set_neighbours(nlist)
+    forces.set_pos(model.pos, energies)
+    result = np.array(forces.get_F()), np.array(forces.get_PE()), np.array(forces.get_COUNT())
+    forces.release()
+    return result
+
+
+def assert_same(result, reference):
+    F, PE, COUNT = result
+    F_ref, PE_ref, COUNT_ref = reference
+    # mêmes paires, sommées dans un autre ordre
+    assert np.array_equal(COUNT, COUNT_ref)
+    assert np.allclose(F, F_ref, rtol=1e-5, atol=1e-5 * np.abs(F_ref).max())
+    assert np.allclose(PE, PE_ref, rtol=1e-5, atol=1e-5 * np.abs(PE_ref).max())
+
+
+@pytest.fixture(params=BOXES, ids=BOX_IDS)
+def box(request):
+    nx, ny, periodic = request.param
+    model = make_model(nx, ny, periodic)
+    return model, compute(model)
+
+
+def test_cells(box):
+    model, reference = box
+    assert reference[2].sum() > 0
+    assert_same(compute(model, neighbours="cells"), reference)
+
+
+def test_verlet(box):
+    model, reference = box
+    assert_same(compute(model, neighbours="verlet"), reference)
+
+
+def test_verlet_skin():
+    # la liste reste valable tant qu'aucun atome ne s'est déplacé de plus de la moitié de la peau
+    model = make_model(9, 7)
+    nlist = VerletList(model_consts(model), 0.3*model.re)
+    nlist.build(model.pos)
+    rng = np.random.default_rng(0)
+    step = rng.normal(size=model.pos.shape)
+    model.pos += 0.14*model.re * step / np.linalg.norm(step, axis=1)[:, None]
+    assert not nlist.update(model.pos)
+    assert_same(compute(model, nlist, neighbours="verlet"), compute(model))
+
+    model.pos[0] += 0.2*model.re
+    assert nlist.update(model.pos)
+    assert nlist.builds == 2
+
+
+@pytest.mark.parametrize("neighbours", ["cells", "verlet"])
+def test_half(box, neighbours):
+    model, reference = box
+    assert_same(compute(model, neighbours=neighbours, half=True), reference)
+
+
+def test_half_needs_neighbours(model):
+    with pytest.raises(ValueError):
+        ForcesComputeCPU(model_consts(model), half=True)
+
+
+@pytest.mark.parametrize("chunk_size", [None, 7])
+def test_pool(box, chunk_size):
+    model, reference = box
+    assert_same(compute(model, engine="pool", threads=2, chunk_size=chunk_size), reference)
+
+
+@pytest.mark.parametrize("options", [{}, {"neighbours": "cells"}, {"neighbours": "cells", "half": True}],
+                         ids=["all", "cells", "cells_half"])
+def test_skip_energies(model, options):
+    F, PE, COUNT = compute(model, energies=False, **options)
+    F_ref, PE_ref, COUNT_ref = compute(model, **options)
+    assert np.array_equal(F, F_ref)
+    assert np.array_equal(COUNT, COUNT_ref)
+    assert not PE.any()
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from moldyn.simulation.forces_GPU import ForcesComputeGPU
+from moldyn.simulation.neighbours_CPU import VerletList, CellGrid
+
+from .conftest import make_model, model_consts
+from .test_forces_CPU import BOXES, BOX_IDS, assert_same, compute as compute_CPU
+
+
+def compute(model, energies=True, **options):
+    consts = model_consts(model)
+    forces = ForcesComputeGPU(consts, **options)
+    if options.get("neighbours") == "verlet":
+        nlist = VerletList(consts, 0.3*model.re, half=options.get("half", False))
+        nlist.build(model.pos)
+        forces.set_neighbours(nlist)
+    forces.set_pos(model.pos, energies)
+    result = np.array(forces.get_F()), np.array(forces.get_PE()), np.array(forces.get_COUNT())
+    forces.release()
+    return result
+
+
+@pytest.fixture(params=BOXES, ids=BOX_IDS)
+def box(request, gpu):
+    nx, ny, periodic = request.param
+    model = make_model(nx, ny, periodic)
+    return model, compute(model)
+
+
+def test_all(box):
+    # positions en simple précision sur GPU
+    model, reference = box
+    F, PE, COUNT = reference
+    F_ref, PE_ref, COUNT_ref = compute_CPU(model)
+    assert np.array_equal(COUNT, COUNT_ref)
+    assert np.allclose(F, F_ref, rtol=1e-3, atol=1e-3 * np.abs(F_ref).max())
+    assert np.allclose(PE, PE_ref, rtol=1e-3, atol=1e-3 * np.abs(PE_ref).max())
+
+
+@pytest.mark.parametrize("options", [{"tiled": True}, {"neighbours": "verlet"}, {"neighbours": "verlet", "half": True}],
+                         ids=["tiled", "verlet", "verlet_half"])
+def test_variants(box, options):
+    model, reference = box
+    assert_same(compute(model, **options), reference)
+
+
+@pytest.mark.parametrize("shared_scan", [True, False], ids=["shared_scan", "buffer_scan"])
+def test_cells(box, monkeypatch, shared_scan):
+    model, reference = box
+    if not shared_scan:
+        monkeypatch.setattr("moldyn.simulation.forces_GPU.SHARED_MEMORY_SIZE", 0)
+    assert_same(compute(model, neighbours="cells"), reference)
+
+
+def test_cells_sorted(box):
+    # atomes triés par indice dans chaque cellule, comme sur CPU, quel que soit l'ordonnancement
+    model, _ = box
+    consts = model_consts(model)
+    forces = ForcesComputeGPU(dict(consts), neighbours="cells")
+    forces.set_pos(model.pos)
+    cell_start = np.frombuffer(forces._BUFFER_CELL_START.read(), dtype=np.uint32)
+    cell_atoms = np.frombuffer(forces._BUFFER_CELL_ATOMS.read(), dtype=np.uint32)
+    forces.release()
+    grid = CellGrid(consts)
+    grid.bin(model.pos)
+    assert np.array_equal(cell_start, grid.cell_start)
+    assert np.array_equal(cell_atoms, grid.cell_atoms)
+
+
+@pytest.mark.parametrize("options", [{}, {"neighbours": "cells"}, {"neighbours": "verlet", "half": True}],
+                         ids=["all", "cells", "verlet_half"])
+def test_skip_energies(model, gpu, options):
+    F, PE, COUNT = compute(model, energies=False, **options)
+    F_ref, PE_ref, COUNT_ref = compute(model, **options)
+    assert np.array_equal(F, F_ref)
+    assert np.array_equal(COUNT, COUNT_ref)
+    assert not PE.any()
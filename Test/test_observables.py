@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from moldyn.simulation.observables import Series
+
+
+def test_growth():
+    series = Series([1.0, 2.0])
+    for x in range(100):
+        series.append(x)
+    series.extend(np.arange(50))
+    assert len(series) == 152
+    assert series.tolist() == [1.0, 2.0] + list(range(100)) + list(range(50))
+
+
+def test_indexing():
+    series = Series(np.arange(10))
+    assert series[0] == 0.0 and series[-1] == 9.0
+    assert isinstance(series[3], float)
+    assert np.array_equal(series[2:8:2], [2, 4, 6])
+    assert list(series) == list(range(10))
+    assert series == list(range(10))
+    assert np.mean(series) == 4.5
+    with pytest.raises(IndexError):
+        series[10]
+    with pytest.raises(IndexError):
+        series[-11]
+
+
+def test_spill(tmp_path):
+    path = str(tmp_path / "T.f8")
+    series = Series([0.0])
+    series.spill_to(path, chunk=8)
+    series.extend(np.arange(1, 20))
+    series.append(20)
+
+    # seul le dernier paquet reste en mémoire
+    assert series._n < 8
+    assert len(series) == 21
+    assert series.tolist() == list(range(21))
+    assert series[3] == 3.0 and series[-1] == 20.0
+    assert np.array_equal(np.fromfile(path), np.arange(series._spilled))
+
+    series.clear()
+    assert len(series) == 0
+    assert np.fromfile(path).size == 0
+
+
+def test_from_state(tmp_path):
+    path = str(tmp_path / "EP.f8")
+    series = Series()
+    series.spill_to(path, chunk=4)
+    series.extend(np.arange(10))
+    state = series.get_state()
+
+    # valeurs écrites après le point de reprise : oubliées à la reprise
+    series.extend(np.arange(10, 30))
+    restored = Series.from_state(*state)
+    assert restored.tolist() == list(range(10))
+    assert np.fromfile(path).size == state[1]
+    restored.extend(np.arange(10, 30))
+    assert restored.tolist() == list(range(30))
@@ -0,0 +1,53 @@
+import pytest
+
+from moldyn.simulation import profiler as prof
+from moldyn.simulation.profiler import StepProfiler
+from moldyn.simulation.runner import Simulation
+from moldyn.utils.data_mng import DynState
+
+
+def test_totals(monkeypatch):
+    # horloge fictive : chaque lecture avance d'une seconde
+    clock = iter(range(100))
+    monkeypatch.setattr(prof.time, "perf_counter", lambda: float(next(clock)))
+    profiler = StepProfiler(10, "cpu")
+    profiler.start()
+    for phase in ("set_pos", "get_F", "get_F", "kick", "get_F"):
+        profiler.lap(phase)
+    profiler.iterations = 2
+
+    assert profiler.times["get_F"] == 3 and profiler.times["set_pos"] == 1 and profiler.times["kick"] == 1
+    assert profiler.total == 5
+    assert profiler.atom_steps_per_second == 10*2/5
+
+    summary = profiler.summary()
+    assert summary["phases"] == {"set_pos": 1, "get_F": 3, "kick": 1}
+    assert summary["groups"] == {"compute": 3, "transfer": 1, "python": 1, "callback": 0}
+    assert summary["fractions"]["compute"] == pytest.approx(0.6)
+    assert sum(summary["fractions"].values()) == pytest.approx(1)
+    assert summary["bound"] == "compute"
+
+    profiler.reset()
+    assert profiler.total == 0 and profiler.atom_steps_per_second == 0
+    assert profiler.summary()["phases"] == {}
+
+
+def test_simulation(tmp_path, model):
+    simulation = Simulation(model, prefer_gpu=False, profile=True)
+    simulation.iter(12, lambda sim: None, 5)
+    profiler = simulation.profiler
+    assert profiler.iterations == 12
+    summary = profiler.summary()
+    assert summary["total"] == pytest.approx(sum(summary["phases"].values()))
+    assert summary["phases"]["get_F"] > 0 and summary["phases"]["callback"] > 0
+    assert summary["npart"] == model.npart and summary["backend"] == "cpu"
+
+    # résumé enregistré avec la simulation
+    ds = DynState(str(tmp_path / "run"))
+    assert ds.load_timings() is None
+    ds.save_timings(summary)
+    assert DynState(str(tmp_path / "run")).load_timings() == summary
+
+
+def test_disabled(model):
+    assert Simulation(model, prefer_gpu=False).profiler is None
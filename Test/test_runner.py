@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from moldyn.simulation.runner import Simulation
+from moldyn.simulation.forces_GPU import ForcesComputeGPU
+
+
+def run(model, n, callback_every=None, **options):
+    simulation = Simulation(model, **options)
+    frames = dict()
+
+    def record(sim):
+        frames[sim.current_iter] = sim.model.pos.copy()
+
+    simulation.iter(n, record, callback_every)
+    simulation.release()
+    return simulation, frames
+
+
+@pytest.mark.filterwarnings("ignore:GPU not available")
+@pytest.mark.parametrize("neighbours", ["all", "cells"])
+@pytest.mark.parametrize("gpu", [False, True], ids=["cpu", "gpu"])
+def test_resident(model, gpu, neighbours):
+    host, host_frames = run(model, 30, prefer_gpu=gpu, neighbours=neighbours)
+    if gpu and not isinstance(host._compute, ForcesComputeGPU):
+        pytest.skip("GPU not available")
+    resident, frames = run(model, 30, 10, prefer_gpu=gpu, neighbours=neighbours, resident=4)
+
+    # un appel par lot, dont ceux qui s'arrêtent aux multiples de callback_every
+    assert sorted(frames) == [0, 4, 8, 10, 14, 18, 20, 24, 28, 29]
+    assert resident.current_iter == host.current_iter == 30
+    # mêmes calculs, sauf la précision des positions sur GPU
+    rtol = 1e-4 if gpu else 1e-12
+    for k, pos in frames.items():
+        assert np.allclose(pos, host_frames[k], rtol=rtol, atol=rtol * model.re)
+    for key in ("T", "EC", "EP", "bonds"):
+        reference = np.asarray(host.state_fct[key])
+        assert np.allclose(resident.state_fct[key], reference, rtol=rtol, atol=rtol * np.abs(reference).max())
+
+
+@pytest.mark.parametrize("resident", [None, 4], ids=["host", "resident"])
+def test_sampling(model, resident):
+    every, _ = run(model, 20, resident=resident, prefer_gpu=False)
+    sampled, _ = run(model, 20, resident=resident, prefer_gpu=False, sampling=3)
+
+    # fonctions d'état alignées sur les itérations échantillonnées, dynamique inchangée
+    assert list(sampled.state_fct["iters"]) == list(range(0, 20, 3))
+    for key in ("T", "EC", "EP", "ET", "bonds", "time"):
+        assert len(sampled.state_fct[key]) == 7
+        assert np.array_equal(sampled.state_fct[key], np.asarray(every.state_fct[key])[::3])
+    assert np.array_equal(sampled.model.pos, every.model.pos)
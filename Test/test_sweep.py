@@ -0,0 +1,58 @@
+import os
+
+import numpy as np
+import pytest
+
+from moldyn.simulation.sweep import Sweep, _run_point
+
+
+def test_resume(tmp_path, model):
+    grid = {"T": [10, 20]}
+    reference = Sweep(model, str(tmp_path / "reference"), 20, grid, processes=1, trajectory_every=5,
+                      checkpoint_every=5)
+    reference.run()
+
+    # balayage interrompu pendant le second calcul, après son point de reprise de l'itération 10
+    sweep = Sweep(model, str(tmp_path / "sweep"), 20, grid, processes=1, trajectory_every=5, checkpoint_every=5)
+    _run_point(sweep.directory, sweep.names[1], sweep.points[1], 10, sweep.options, 5, 5)
+    sweep.dynstate(1).categories["status"] = "running"
+    spec = os.path.join(sweep.directory, Sweep.SPEC)
+    mtime = os.stat(spec).st_mtime_ns
+
+    resumed = Sweep.resume(sweep.directory, processes=1)
+    assert resumed.points == reference.points
+    assert resumed.pending() == [0, 1]
+    done = []
+    resumed.run(done.append)
+    assert sorted(done) == [0, 1]
+    assert resumed.pending() == []
+    assert os.stat(spec).st_mtime_ns == mtime
+
+    for k in range(2):
+        ds, ref = resumed.dynstate(k), reference.dynstate(k)
+        assert ds.categories["status"] == "complete"
+        assert np.array_equal(ds.load_model().pos, ref.load_model().pos)
+        assert np.array_equal(ds.load_trajectory().iterations, [0, 5, 10, 15])
+        assert np.array_equal(ds.load_trajectory()[:], ref.load_trajectory()[:])
+
+
+def test_existing_directory(tmp_path, model):
+    directory = str(tmp_path / "sweep")
+    sweep = Sweep(model, directory, 20, {"T": [10, 20]})
+    mtime = os.stat(os.path.join(directory, Sweep.SPEC)).st_mtime_ns
+
+    # le même balayage peut être recréé...
+    same = Sweep(model, directory, 20, {"T": [10, 20]})
+    assert same.points == sweep.points
+    assert os.stat(os.path.join(directory, Sweep.SPEC)).st_mtime_ns == mtime
+
+    # ...mais pas un autre, dont les calculs terminés ne correspondraient pas à la grille
+    with pytest.raises(ValueError, match="Sweep.resume"):
+        Sweep(model, directory, 20, {"T": [30, 40]})
+    with pytest.raises(ValueError):
+        Sweep(model, directory, 20, {"T": [10, 20]}, {"prefer_gpu": False, "neighbours": "cells"})
+    moved = model.copy()
+    moved.pos += 0.1
+    with pytest.raises(ValueError):
+        Sweep(moved, directory, 20, {"T": [10, 20]})
+    assert Sweep.resume(directory).points == sweep.points
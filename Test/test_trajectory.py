@@ -0,0 +1,130 @@
+import threading
+
+import numpy as np
+import pytest
+
+from moldyn.simulation.runner import Simulation
+from moldyn.utils.trajectory import TrajectoryWriter, Trajectory, AsyncTrajectoryWriter
+
+
+def frames(model, n, seed=0):
+    rng = np.random.default_rng(seed)
+    return [{"pos": model.pos + rng.normal(scale=0.1*model.re, size=model.pos.shape),
+             "v": rng.normal(size=model.pos.shape), "F": rng.normal(size=model.pos.shape)} for _ in range(n)]
+
+
+@pytest.mark.parametrize("dtype", ["f8", "f4"])
+def test_raw_round_trip(tmp_path, model, dtype):
+    path = str(tmp_path / "traj.mdt")
+    written = frames(model, 5)
+    with TrajectoryWriter(path, model.npart, dtype=dtype, stride=10, channels=("pos", "v", "F")) as writer:
+        for k, arrays in enumerate(written):
+            writer.write(10*k, **arrays)
+
+    traj = Trajectory(path)
+    assert len(traj) == 5
+    assert traj.header["stride"] == 10
+    assert np.array_equal(traj.iterations, [0, 10, 20, 30, 40])
+    for name in ("pos", "v", "F"):
+        assert np.array_equal(traj.channel(name), np.array([arrays[name] for arrays in written], dtype=dtype))
+    assert np.array_equal(traj[2], written[2]["pos"].astype(dtype))
+    assert np.array_equal(traj[::2], traj.channel("pos")[::2])
+    frame = traj.frame(3)
+    assert frame["iteration"] == 30
+    assert np.array_equal(frame["v"], written[3]["v"].astype(dtype))
+
+
+def test_append_until(tmp_path, model):
+    path = str(tmp_path / "traj.mdt")
+    written = frames(model, 8)
+    with TrajectoryWriter(path, model.npart, stride=10) as writer:
+        for k in range(6):
+            writer.write(10*k, pos=written[k]["pos"])
+    # enregistrement incomplet, comme après un arrêt pendant l'écriture
+    with open(path, "ab") as file:
+        file.write(b"\0" * 100)
+
+    # reprise depuis l'itération 30 : les images suivantes sont réécrites
+    with TrajectoryWriter(path, model.npart, mode="a", until=30) as writer:
+        assert writer.frames == 3
+        for k in range(3, 8):
+            writer.write(10*k, pos=written[k]["pos"])
+
+    traj = Trajectory(path)
+    assert np.array_equal(traj.iterations, 10*np.arange(8))
+    assert np.array_equal(traj[:], [arrays["pos"] for arrays in written])
+
+
+def test_async_drop(tmp_path, model):
+    writer = TrajectoryWriter(str(tmp_path / "traj.mdt"), model.npart)
+    # le disque est bloqué : le premier enregistrement reste en cours d'écriture, le second en attente
+    release = threading.Event()
+    write_records = writer.write_records
+
+    def blocked(records):
+        release.wait()
+        write_records(records)
+
+    writer.write_records = blocked
+    traj = AsyncTrajectoryWriter(writer, slots=2, policy="drop")
+    written = [traj.write(k, pos=model.pos + k) for k in range(5)]
+    assert written == [True, True, False, False, False]
+    assert traj.dropped == 3
+
+    # les images en attente sont écrites à la fermeture
+    release.set()
+    traj.close()
+    assert traj.written == 2
+    reader = Trajectory(str(tmp_path / "traj.mdt"))
+    assert np.array_equal(reader.iterations, [0, 1])
+    assert np.array_equal(reader[1], model.pos + 1)
+
+
+@pytest.mark.parametrize("resident", [None, 4], ids=["host", "resident"])
+def test_async_stride(tmp_path, model, resident):
+    simulation = Simulation(model, prefer_gpu=False, resident=resident)
+    path = str(tmp_path / "traj.mdt")
+    with AsyncTrajectoryWriter(TrajectoryWriter(path, model.npart, stride=10)) as traj:
+        simulation.iter(35, traj, 10)
+    assert np.array_equal(Trajectory(path).iterations, [0, 10, 20, 30])
+
+
+@pytest.mark.parametrize("codec", ["zlib", "lzma"])
+def test_quantized_error(tmp_path, model, codec):
+    precision = 1e-3*model.re
+    written = frames(model, 10)
+    path = str(tmp_path / "traj.mdt")
+    # plusieurs paquets, dont le dernier incomplet
+    with TrajectoryWriter(path, model.npart, stride=5, channels=("pos", "v"), codec=codec, precision=precision,
+                          origin=model.lim_inf, chunk=4) as writer:
+        for k, arrays in enumerate(written):
+            writer.write(5*k, pos=arrays["pos"], v=arrays["v"])
+
+    traj = Trajectory(path)
+    assert np.array_equal(traj.iterations, 5*np.arange(10))
+    # positions arrondies à un multiple de precision, les autres canaux sans perte
+    positions = np.array([arrays["pos"] for arrays in written])
+    assert np.abs(traj.channel("pos") - positions).max() <= precision/2 * (1 + 1e-9)
+    assert np.array_equal(traj.channel("v"), [arrays["v"] for arrays in written])
+    assert np.array_equal(traj[7], traj.channel("pos")[7])
+
+
+def test_quantized_append_until(tmp_path, model):
+    precision = 1e-3*model.re
+    written = frames(model, 10)
+    path = str(tmp_path / "traj.mdt")
+    with TrajectoryWriter(path, model.npart, codec="zlib", precision=precision, origin=model.lim_inf,
+                          chunk=4) as writer:
+        for k in range(7):
+            writer.write(k, pos=written[k]["pos"])
+
+    # reprise au milieu du second paquet
+    with TrajectoryWriter(path, model.npart, mode="a", until=5) as writer:
+        assert writer.frames == 5
+        for k in range(5, 10):
+            writer.write(k, pos=written[k]["pos"])
+
+    traj = Trajectory(path)
+    assert np.array_equal(traj.iterations, np.arange(10))
+    positions = np.array([arrays["pos"] for arrays in written])
+    assert np.abs(traj[:] - positions).max() <= precision/2 * (1 + 1e-9)
@@ -1,11 +1,18 @@
-from .utils import *
-from .processing import *
-from . import simulation
+import importlib
 
 
 __all__ = ["processing", "simulation", "utils"]
 __version = "0.0.1"
 
+def __getattr__(name):
+    # sous-paquets importés au premier accès (moldyn.simulation, ...), pour que `import moldyn` reste léger
+    if name in __all__:
+        return importlib.import_module("." + name, __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
 def gui():
     import sys
     from PyQt5.QtWidgets import QApplication
@@ -16,4 +23,4 @@ def gui():
     window = MoldynMainWindow()
     window.show()
 
-    app.exec_()
\ No newline at end of file
+    app.exec_()
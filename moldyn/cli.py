@@ -0,0 +1,300 @@
+# -*-encoding: utf-8 -*-
+"""
+Command line interface, to run simulations without the graphical interface (eg. on compute nodes).
+
+Neither Qt nor matplotlib are imported.
+
+Example
+-------
+.. code-block:: bash
+
+    moldyn-run model.mdl -o run1 -n 100000 --T-ramps 0:300,1e-10:50 --trajectory-every 100 --checkpoint-every 10000
+    # after a crash, resumes from the last checkpoint
+    moldyn-run model.mdl -o run1 -n 100000 --T-ramps 0:300,1e-10:50 --trajectory-every 100 --checkpoint-every 10000 --resume
+    # a grid of parameters, described by a JSON file ({"x_a": [0.3, 0.5], "T": [100, 300]})
+    moldyn-sweep model.mdl grid.json -o sweep1 -n 100000 --checkpoint-every 10000
+    moldyn-sweep --resume sweep1
+    # compiles numba kernels and compute shaders once, after installation
+    moldyn-warmup
+"""
+
+import argparse
+import json
+import sys
+import time
+
+from .utils.data_mng import DynState
+from .utils.trajectory import AsyncTrajectoryWriter, CODECS
+from .simulation.runner import Simulation
+from .simulation.forces_CPU import ForcesComputeCPU
+from .simulation.sweep import Sweep
+
+
+def _ramps(text):
+    # "t0:v0,t1:v1,..." -> ([t0, t1, ...], [v0, v1, ...])
+    try:
+        points = [tuple(float(x) for x in point.split(":")) for point in text.split(",")]
+        t, values = zip(*points)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"ramps must be given as t0:value0,t1:value1,... (got {text})")
+    return list(t), list(values)
+
+
+def parser():
+    """
+
+    Returns
+    -------
+    argparse.ArgumentParser
+        Parser of the arguments of `moldyn-run`.
+    """
+    p = argparse.ArgumentParser(prog="moldyn-run", description="Runs a molecular dynamics simulation.")
+    p.add_argument("model", help="model or simulation file (.mdl, .mds, .zip) or directory")
+    p.add_argument("-o", "--output", required=True,
+                   help="output directory (trajectory, state functions, checkpoint and final model)")
+    p.add_argument("-n", "--iterations", type=int, required=True,
+                   help="number of iterations to compute (in total, when resuming)")
+    p.add_argument("--resume", action="store_true", help="resume from the checkpoint of the output directory")
+    p.add_argument("--zip", help="also save the simulation as an archive (.mds)")
+
+    g = p.add_argument_group("control")
+    g.add_argument("--T-ramps", type=_ramps, help="temperature ramps, as t0:T0,t1:T1,... (s:K)")
+    g.add_argument("--Fx-ramps", type=_ramps, help="external force ramps along x, as t0:F0,t1:F1,... (s:N)")
+    g.add_argument("--Fy-ramps", type=_ramps, help="external force ramps along y, as t0:F0,t1:F1,... (s:N)")
+
+    g = p.add_argument_group("computation")
+    g.add_argument("--backend", choices=("cpu", "gpu"), default="cpu", help="where forces are computed")
+    g.add_argument("--neighbours", choices=ForcesComputeCPU.NEIGHBOURS, default="all", help="neighbour search")
+    g.add_argument("--half", action="store_true", help="compute each pair of atoms once")
+    g.add_argument("--threads", type=int, help="number of CPU threads")
+    g.add_argument("--resident", type=int, help="number of iterations by batch computed without Python code")
+    g.add_argument("--sampling", type=int, default=1, help="state functions are recorded every SAMPLING iterations")
+
+    g = p.add_argument_group("output")
+    g.add_argument("--trajectory-every", type=int, default=0, metavar="N",
+                   help="save positions every N iterations (0 : no trajectory)")
+    g.add_argument("--velocities", action="store_true", help="also save velocities in the trajectory")
+    g.add_argument("--codec", choices=CODECS, default="raw", help="trajectory compression")
+    g.add_argument("--precision", type=float, default=1e-4,
+                   help="precision of compressed positions, relative to sigma of the first species")
+    g.add_argument("--checkpoint-every", type=int, default=0, metavar="N",
+                   help="save a checkpoint every N iterations (0 : only at the end)")
+    g.add_argument("--profile", action="store_true",
+                   help="measure the time spent in each phase of the iterations (saved in timings.json)")
+    g.add_argument("-q", "--quiet", action="store_true", help="do not print progress")
+    return p
+
+
+def _progress(simulation, start_iter, start_time):
+    # une ligne par appel : itération, vitesse, température
+    done = simulation.current_iter - start_iter
+    elapsed = time.perf_counter() - start_time
+    T = simulation.T[-1] if len(simulation.T) else float("nan")
+    print(f"iteration {simulation.current_iter} : {done / max(elapsed, 1e-9):.1f} it/s, T = {T:.2f} K",
+          file=sys.stderr, flush=True)
+
+
+def run(argv=None):
+    """
+    Entry point of `moldyn-run`.
+
+    Parameters
+    ----------
+    argv : list
+        Arguments (defaults to those of the command line).
+
+    Returns
+    -------
+    int
+        Exit status.
+    """
+    args = parser().parse_args(argv)
+    out = DynState(args.output)
+
+    options = {"prefer_gpu": args.backend == "gpu", "neighbours": args.neighbours, "half": args.half,
+               "sampling": args.sampling, "resident": args.resident, "profile": args.profile}
+    if args.threads:
+        options["cpu_options"] = {"threads": args.threads}
+
+    resumed = args.resume and out.exists(out.CHECKPOINT)
+    if resumed:
+        simulation = Simulation.from_checkpoint(out, **options)
+    else:
+        simulation = Simulation(DynState(args.model).load_model(), **options)
+        if args.T_ramps:
+            simulation.set_T_ramps(*args.T_ramps)
+        if args.Fx_ramps:
+            simulation.set_Fx_ramps(*args.Fx_ramps)
+        if args.Fy_ramps:
+            simulation.set_Fy_ramps(*args.Fy_ramps)
+
+    model = simulation.model
+    model.params["save_pos_history"] = bool(args.trajectory_every)
+    callbacks = []
+
+    trajectory = None
+    if args.trajectory_every:
+        # les images postérieures au point de reprise sont écartées
+        writer = out.trajectory_writer(model.npart, mode="a" if resumed else "w", stride=args.trajectory_every,
+                                       channels=("pos", "v") if args.velocities else ("pos",), codec=args.codec,
+                                       precision=args.precision * model.sigma_a, origin=model.lim_inf,
+                                       until=simulation.current_iter)
+        trajectory = AsyncTrajectoryWriter(writer)
+        callbacks.append(trajectory)
+
+    simulation.set_checkpoints(out, args.checkpoint_every)
+
+    start_iter = simulation.current_iter
+    start_time = last_print = time.perf_counter()
+    if not args.quiet:
+        def progress(s):
+            nonlocal last_print
+            if time.perf_counter() - last_print > 5.0:
+                last_print = time.perf_counter()
+                _progress(s, start_iter, start_time)
+        callbacks.append(progress)
+
+    def callback(s):
+        for f in callbacks:
+            f(s)
+
+    try:
+        simulation.iter(max(0, args.iterations - simulation.current_iter), callback, args.trajectory_every)
+    except KeyboardInterrupt:
+        # l'itération en cours est incomplète : on ne garde que le dernier point de reprise
+        print("Interrupted, use --resume to continue from the last checkpoint.", file=sys.stderr)
+        return 130
+    finally:
+        if trajectory is not None:
+            trajectory.close()
+
+    simulation.checkpoint(out)
+    with out.open(out.STATE_FCT, mode="w") as IO:
+        IO.from_dict(simulation.state_fct)
+    out.save_model(model)
+    if simulation.profiler is not None:
+        out.save_timings(simulation.profiler.summary())
+
+    if not args.quiet:
+        _progress(simulation, start_iter, start_time)
+        if simulation.profiler is not None:
+            print(simulation.profiler.report(), file=sys.stderr)
+    if args.zip:
+        out.to_zip(args.zip)
+    return 0
+
+
+def sweep_parser():
+    """
+
+    Returns
+    -------
+    argparse.ArgumentParser
+        Parser of the arguments of `moldyn-sweep`.
+    """
+    p = argparse.ArgumentParser(prog="moldyn-sweep",
+                                description="Runs a simulation for every combination of a grid of parameters.")
+    p.add_argument("model", nargs="?", help="model or simulation file (.mdl, .mds, .zip) or directory")
+    p.add_argument("grid", nargs="?",
+                   help="JSON file of the values of each parameter (eg. {\"x_a\": [0.3, 0.5], \"T\": [100, 300]}), "
+                        "ramps being given as [t, values] pairs")
+    p.add_argument("-o", "--output", help="output directory")
+    p.add_argument("-n", "--iterations", type=int, help="number of iterations of each run")
+    p.add_argument("--resume", metavar="DIRECTORY", help="runs the incomplete runs of an existing sweep")
+    p.add_argument("-j", "--processes", type=int, help="number of processes (defaults to the number of CPUs)")
+    p.add_argument("--neighbours", choices=ForcesComputeCPU.NEIGHBOURS, default="all", help="neighbour search")
+    p.add_argument("--half", action="store_true", help="compute each pair of atoms once")
+    p.add_argument("--resident", type=int, help="number of iterations by batch computed without Python code")
+    p.add_argument("--sampling", type=int, default=1, help="state functions are recorded every SAMPLING iterations")
+    p.add_argument("--trajectory-every", type=int, default=0, metavar="N",
+                   help="save positions every N iterations (0 : no trajectory)")
+    p.add_argument("--checkpoint-every", type=int, default=0, metavar="N",
+                   help="save a checkpoint every N iterations (0 : only at the end)")
+    p.add_argument("-q", "--quiet", action="store_true", help="do not print progress")
+    return p
+
+
+def sweep(argv=None):
+    """
+    Entry point of `moldyn-sweep`.
+
+    Parameters
+    ----------
+    argv : list
+        Arguments (defaults to those of the command line).
+
+    Returns
+    -------
+    int
+        Exit status.
+    """
+    p = sweep_parser()
+    args = p.parse_args(argv)
+    if args.resume:
+        s = Sweep.resume(args.resume, args.processes)
+    else:
+        if not (args.model and args.grid and args.output and args.iterations):
+            p.error("model, grid, --output and --iterations are required, unless resuming")
+        with open(args.grid) as file:
+            grid = json.load(file)
+        options = {"prefer_gpu": False, "neighbours": args.neighbours, "half": args.half, "sampling": args.sampling,
+                   "resident": args.resident}
+        try:
+            s = Sweep(DynState(args.model).load_model(), args.output, args.iterations, grid, options, args.processes,
+                      args.trajectory_every, args.checkpoint_every)
+        except ValueError as e: # balayage différent déjà dans le répertoire
+            p.error(f"{e} (--resume)")
+
+    pending = s.pending()
+    if not args.quiet:
+        print(f"{len(pending)} of {len(s.points)} runs to compute", file=sys.stderr, flush=True)
+
+    def done(k):
+        if not args.quiet:
+            print(f"{s.names[k]} complete : {s.points[k]}", file=sys.stderr, flush=True)
+
+    try:
+        s.run(done)
+    except KeyboardInterrupt:
+        print("Interrupted, use --resume to continue the sweep.", file=sys.stderr)
+        return 130
+    return 0
+
+
+def warmup(argv=None):
+    """
+    Entry point of `moldyn-warmup` (see `simulation.backends.warmup`).
+
+    Parameters
+    ----------
+    argv : list
+        Arguments (defaults to those of the command line).
+
+    Returns
+    -------
+    int
+        Exit status.
+    """
+    from .simulation import backends
+
+    p = argparse.ArgumentParser(prog="moldyn-warmup",
+                                description="Compiles numba kernels and compute shaders, so that simulations start "
+                                            "at full speed.")
+    p.add_argument("--no-gpu", action="store_true", help="do not compile compute shaders")
+    p.add_argument("-q", "--quiet", action="store_true", help="do not print compile times")
+    args = p.parse_args(argv)
+
+    def done(name, seconds):
+        if not args.quiet:
+            print(f"{name} : {seconds:.2f} s", file=sys.stderr, flush=True)
+
+    start = time.perf_counter()
+    backends.warmup(gpu=not args.no_gpu, callback=done)
+    if not args.quiet:
+        print(f"Compiled in {time.perf_counter() - start:.1f} s (shader cache : {backends.SHADER_CACHE})",
+              file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(run())
@@ -12,6 +12,7 @@ import moderngl
 
 from moldyn.processing.strain_CPU import StrainComputeCPU
 from moldyn.simulation.builder import Model
+from moldyn.simulation.backends import registry
 from moldyn.utils import gl_util
 
 def cached(f, _cache=dict()):
@@ -191,6 +192,7 @@ class StrainComputeGPU:
 
         consts["LAYOUT_SIZE"] = self.layout_size
 
+        registry.probe()
         self.context = moderngl.create_standalone_context(require=430)
         #print(gl_util.source(os.path.dirname(__file__) + '/strain.glsl', consts))
         self.compute_shader = self.context.compute_shader(gl_util.source(os.path.dirname(__file__)+'/strain.glsl', consts))
@@ -166,11 +166,11 @@ def make_movie(simulation, dynstate, name: str, pfilm=5, fps=24, callback=None):
     simulation : Simulation
         The simulation object
     dynstate : DynState
-        The dynState object containing the position history file.
+        The dynState object containing the trajectory file.
     name : str
         The path (and name) of the file to be writen.
     pfilm : int
-        To make the movie, takes every pfilm position.
+        To make the movie, takes the positions of every pfilm iteration.
     fps : int
         The number of frame per seconds of the film.
     callback : function
@@ -181,52 +181,51 @@ def make_movie(simulation, dynstate, name: str, pfilm=5, fps=24, callback=None):
     -------
 
     """
-    # ouverture pour la lecture
-    npas = simulation.current_iter
     YlimB = simulation.model.y_lim_inf
     YlimH = simulation.model.y_lim_sup
     XlimG = simulation.model.x_lim_inf
     XlimD = simulation.model.x_lim_sup
     if not name.endswith(".mp4"):
         name += ".mp4"
-    with dynstate.open(dynstate.POS_H, 'r') as fix:
-        # liste de k ou tracer le graph
-        klist = set(range(0, npas, pfilm))
-        # boucle pour creer le film
-        figure_size = (1920, 1088)
-        try:
-            os.remove(name)
-        except FileNotFoundError:
-            pass
-        gen = write_frames(name, figure_size, fps=fps, quality=9)
-        gen.send(None)
-        fig = plt.figure(figsize=(figure_size[0] / (72 * 2), figure_size[1] / (72 * 2)))
-        plt.clf()
-        # definition du domaine de dessin
-        plt.ioff()  # pour ne pas afficher les graphs)
-        plt.axis('scaled')
-        plt.ylim(YlimB, YlimH)
-        plt.xlim(XlimG, XlimD)
-        pos = fix.load()
-        line1, = plt.plot(*pos[:simulation.model.n_a,:].T, 'ro', markersize=0.5)
-        line2, = plt.plot(*pos[simulation.model.n_a:,:].T, 'bo', markersize=0.5)
-        plt.xlabel("0")
-        temp = io.BytesIO()
-        for k in range(1, npas):
-            # dessin a chaque pas (ne s'ouvre pas: est sauvegarde de maniere incrementale)
-            if k in klist:
-                temp.seek(0)
-                plt.xlabel("Iteration : {}".format(k))
-                plt.title(f"T = {simulation.state_fct['T'][k]:.2f} K")
-                line1.set_data(*pos[:simulation.model.n_a,:].T)
-                line2.set_data(*pos[simulation.model.n_a:,:].T)
-                fig.savefig(temp, format='raw', dpi=72 * 2)  # sauvegarde incrementale
-                temp.seek(0)
-                if callback: callback(k)
-                gen.send(Image.frombytes('RGBA', figure_size, temp.read()).convert('RGB').tobytes())
-            pos = fix.load() # on charge a chaque pas de temps
-        gen.close()
-        plt.close(fig)
+    traj = dynstate.load_trajectory()
+    # accès direct aux positions tracées, sans relire les autres
+    frames = np.flatnonzero(traj.iterations % pfilm == 0)
+    iters = np.asarray(simulation.state_fct["iters"])
+    T = np.asarray(simulation.state_fct["T"])
+    # boucle pour creer le film
+    figure_size = (1920, 1088)
+    try:
+        os.remove(name)
+    except FileNotFoundError:
+        pass
+    gen = write_frames(name, figure_size, fps=fps, quality=9)
+    gen.send(None)
+    fig = plt.figure(figsize=(figure_size[0] / (72 * 2), figure_size[1] / (72 * 2)))
+    plt.clf()
+    # definition du domaine de dessin
+    plt.ioff()  # pour ne pas afficher les graphs)
+    plt.axis('scaled')
+    plt.ylim(YlimB, YlimH)
+    plt.xlim(XlimG, XlimD)
+    line1, = plt.plot([], [], 'ro', markersize=0.5)
+    line2, = plt.plot([], [], 'bo', markersize=0.5)
+    temp = io.BytesIO()
+    for f in frames:
+        # dessin de chaque image (ne s'ouvre pas: est sauvegarde de maniere incrementale)
+        k = int(traj.iterations[f])
+        pos = traj[f]
+        temp.seek(0)
+        plt.xlabel("Iteration : {}".format(k))
+        if len(iters): # température de l'itération échantillonnée la plus proche
+            plt.title(f"T = {T[min(np.searchsorted(iters, k), len(iters) - 1)]:.2f} K")
+        line1.set_data(*pos[:simulation.model.n_a,:].T)
+        line2.set_data(*pos[simulation.model.n_a:,:].T)
+        fig.savefig(temp, format='raw', dpi=72 * 2)  # sauvegarde incrementale
+        temp.seek(0)
+        if callback: callback(k)
+        gen.send(Image.frombytes('RGBA', figure_size, temp.read()).convert('RGB').tobytes())
+    gen.close()
+    plt.close(fig)
 
 
 @_plot_base(axis='scaled', grid=False)
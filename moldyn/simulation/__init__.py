@@ -1 +1,13 @@
-from . import *
\ No newline at end of file
+import importlib
+
+__all__ = ["backends", "builder", "ensemble", "forces_CPU", "forces_GPU", "integrator_CPU", "integrator_GPU",
+           "neighbours_CPU", "observables", "profiler", "runner", "sweep"]
+
+def __getattr__(name):
+    # modules importés au premier accès, seulement s'ils sont utilisés
+    if name in __all__:
+        return importlib.import_module("." + name, __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,370 @@
+# -*-encoding: utf-8 -*-
+"""
+Compute resources shared by all simulations of a process : OpenGL contexts, compiled compute shaders and process pools.
+
+Creating a context, compiling shaders or starting a pool takes up to a few seconds, which used to be paid each time a
+`runner.Simulation` was created (eg. each time a simulation is continued from the graphical interface). They are now
+created on first use, kept alive in the module-level :py:data:`registry`, and reused by later simulations, until
+:py:meth:`BackendRegistry.close` is called (it is also called when the interpreter exits).
+
+Across processes, compiled shaders are kept on disk by the OpenGL driver, in :py:data:`SHADER_CACHE` (see
+:py:func:`enable_shader_cache`), and numba kernels in their own cache. :py:func:`warmup` (or the `moldyn-warmup`
+command) fills both caches ahead of time, so that the first iterations of a simulation are not slowed down by
+compilation.
+
+Example
+-------
+.. code-block:: python
+
+    from moldyn.simulation.backends import registry
+
+    simulation = Simulation(model)
+    simulation.iter(1000)
+    simulation.release() # buffers of the simulation, the context and shaders are kept
+    simulation = Simulation(model) # no context creation nor shader compilation
+    ...
+    registry.close()
+"""
+
+import os
+import time
+import atexit
+import hashlib
+import weakref
+import threading
+import multiprocessing as mp
+
+import numpy as np
+
+from ..utils import appdirs
+
+SHADER_CACHE = os.path.join(appdirs.user_data_dir("open-moldyn"), "shader_cache")
+"""
+str : Directory in which OpenGL drivers save compiled shaders.
+"""
+
+
+def enable_shader_cache(directory=SHADER_CACHE):
+    """
+    Makes OpenGL drivers save compiled shaders (program binaries, keyed by a hash of their source code) in `directory`,
+    so that they are only compiled once, and not by each process. Supported by Mesa and NVIDIA drivers.
+
+    Drivers read these settings when the first context is created : this function is called by
+    :py:meth:`BackendRegistry.probe`, before moldyn creates its first context (programs that never create one are
+    left untouched). Settings already defined in the environment are kept.
+
+    Parameters
+    ----------
+    directory : str
+        Cache directory.
+
+    Returns
+    -------
+
+    """
+    os.makedirs(directory, exist_ok=True)
+    os.environ.setdefault("MESA_SHADER_CACHE_DIR", directory)
+    os.environ.setdefault("__GL_SHADER_DISK_CACHE", "1")
+    os.environ.setdefault("__GL_SHADER_DISK_CACHE_PATH", directory)
+
+
+class BackendRegistry:
+    """
+    Cache of compute resources.
+
+    OpenGL contexts can only be current in one thread at a time : one context is created per thread that asks for one,
+    so simulations computed by the same thread (such as the simulation thread of the graphical interface) share it. It
+    is kept in a :py:class:`threading.local`, and released (with its shaders) when its thread ends, so that threads
+    started for a single simulation do not leave contexts behind. Compute shaders are cached per context, keyed by their source code (with constants already substituted, see
+    `gl_util.source`).
+
+    Attributes
+    ----------
+    hits : int
+        Number of shaders found in the cache.
+    misses : int
+        Number of shaders compiled.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local() # contexte du thread
+        self._contexts = dict() # identifiant du contexte -> contexte, tant qu'il n'est pas libéré
+        self._shaders = dict() # (contexte, empreinte du source) -> programme
+        self._owners = dict() # contexte -> module de calcul dont les buffers sont liés
+        self._pools = dict() # nombre de processus -> pool
+        self._probed = False
+        self.hits = 0
+        self.misses = 0
+
+    def context(self):
+        """
+
+        Returns
+        -------
+        moderngl.Context
+            OpenGL (>=4.3) context of the calling thread, created on first call.
+        """
+        import moderngl
+
+        holder = getattr(self._local, "holder", None)
+        if holder is not None:
+            with self._lock:
+                # contexte libéré entre-temps par close
+                if self._contexts.get(id(holder.context)) is holder.context:
+                    return holder.context
+        self.probe()
+        context = moderngl.create_standalone_context(require=430)
+        with self._lock:
+            self._contexts[id(context)] = context
+        holder = self._local.holder = _ContextHolder(context)
+        # les données de threading.local sont effacées par le thread qui se termine, où le contexte est courant
+        weakref.finalize(holder, self._release_context, context)
+        return context
+
+    def _release_context(self, context):
+        """
+        Releases `context` and its shaders, unless :py:meth:`close` already did.
+        """
+        with self._lock:
+            if self._contexts.pop(id(context), None) is not context:
+                return
+            for key in [key for key in self._shaders if key[0] == id(context)]:
+                del self._shaders[key]
+            self._owners.pop(id(context), None)
+        context.release()
+
+    def probe(self):
+        """
+        Checks, once per process, that compute shaders can be compiled. If they cannot, Mesa is asked to expose
+        OpenGL 4.3 anyway (software rasterizers often support compute shaders without advertising them). The shader
+        cache is enabled first (see :py:func:`enable_shader_cache`).
+
+        This is done before the first context is created, rather than when compute modules are imported, so that
+        importing moldyn never creates an OpenGL context nor changes the environment.
+
+        Returns
+        -------
+
+        """
+        with self._lock:
+            if self._probed:
+                return
+            self._probed = True
+        from ..utils import gl_util
+
+        enable_shader_cache()
+
+        if not gl_util.testGL():
+            os.environ["MESA_GL_VERSION_OVERRIDE"] = "4.3"
+            os.environ["MESA_GLSL_VERSION_OVERRIDE"] = "430"
+
+    def shader(self, context, source):
+        """
+
+        Parameters
+        ----------
+        context : moderngl.Context
+            Context in which the shader runs.
+        source : str
+            Source code of the compute shader.
+
+        Returns
+        -------
+        moderngl.ComputeShader
+            Compiled shader, compiled only if the same source was not compiled before in this context.
+        """
+        key = (id(context), hashlib.sha1(source.encode()).hexdigest())
+        with self._lock:
+            shader = self._shaders.get(key)
+        if shader is None:
+            shader = context.compute_shader(source)
+            with self._lock:
+                self._shaders[key] = shader
+                self.misses += 1
+        else:
+            with self._lock:
+                self.hits += 1
+        return shader
+
+    def bind(self, context, owner):
+        """
+        Tells whether the storage buffers of `owner` have to be bound again, because another compute module bound its
+        own buffers to the same context since. `owner` is then recorded as the one whose buffers are bound.
+
+        Parameters
+        ----------
+        context : moderngl.Context
+            Shared context.
+        owner : object
+            Compute module about to run shaders.
+
+        Returns
+        -------
+        bool
+            `True` if buffers have to be bound.
+        """
+        with self._lock:
+            if self._owners.get(id(context)) is owner:
+                return False
+            self._owners[id(context)] = owner
+            return True
+
+    def unbind(self, context, owner):
+        """
+        Forgets `owner`, if its buffers were the last ones bound to `context` (eg. because they were released).
+
+        Parameters
+        ----------
+        context : moderngl.Context
+            Shared context.
+        owner : object
+            Compute module.
+        """
+        with self._lock:
+            if self._owners.get(id(context)) is owner:
+                del self._owners[id(context)]
+
+    def pool(self, processes):
+        """
+
+        Parameters
+        ----------
+        processes : int
+            Number of processes.
+
+        Returns
+        -------
+        multiprocessing.pool.Pool
+            Pool of `processes` processes, started on first call. Its processes are generic : data are shared with
+            them through named shared memory (see `forces_CPU.ForcesComputeCPU`).
+        """
+        with self._lock:
+            pool = self._pools.get(processes)
+            if pool is None:
+                pool = self._pools[processes] = mp.Pool(processes)
+            return pool
+
+    def close(self):
+        """
+        Terminates pools, and releases shaders and contexts. Resources are created again if needed afterwards.
+
+        Compute modules still using them must not be used anymore.
+
+        Returns
+        -------
+
+        """
+        with self._lock:
+            pools, self._pools = self._pools, dict()
+            contexts, self._contexts = self._contexts, dict()
+            self._shaders.clear() # libérés avec leur contexte
+            self._owners.clear()
+        for pool in pools.values():
+            pool.terminate()
+            pool.join()
+        for context in contexts.values():
+            context.release()
+
+
+class _ContextHolder:
+    """
+    Context of a thread, kept in `BackendRegistry._local`.
+    """
+
+    def __init__(self, context):
+        self.context = context
+
+
+registry = BackendRegistry()
+"""
+BackendRegistry : registry used by the compute modules.
+"""
+
+atexit.register(registry.close)
+
+
+def _warmup_model():
+    from .builder import Model
+
+    model = Model(x_a=0.5)
+    model.atom_grid(8, 8, 1.12*model.re)
+    model.set_periodic_boundary(1, 1)
+    model.shuffle_atoms()
+    model.T = 10
+    return model
+
+
+def warmup(gpu=True, callback=None):
+    """
+    Compiles numba kernels and compute shaders used by simulations, by computing a few iterations of a small model with
+    every compute option. Compiled code is saved in the caches of numba and of the OpenGL driver (see
+    :py:func:`enable_shader_cache`), where later processes find it ; the shaders of the calling thread are also kept
+    in :py:data:`registry`.
+
+    Kernels are compiled for the types used by simulations, whatever the size of the model : warming up once (eg. after
+    installing or upgrading moldyn) is enough.
+
+    Parameters
+    ----------
+    gpu : bool
+        If `False`, compute shaders are not compiled.
+    callback : callable
+        Called with the name of each configuration and the time it took (in s), once it is compiled.
+
+    Returns
+    -------
+    dict
+        Time taken by each configuration (in s).
+    """
+    from .runner import Simulation
+    from .ensemble import Ensemble
+    from .forces_CPU import ForcesComputeCPU, _chunk_iterate
+
+    rng = np.random.get_state() # le modèle est tiré au hasard, sans changer le générateur de l'utilisateur
+    try:
+        model = _warmup_model()
+    finally:
+        np.random.set_state(rng)
+
+    # (back end, voisins, demi-paires, itérations compilées, options)
+    configurations = [("cpu", "all", False, None, {}), ("cpu", "cells", False, None, {}),
+                      ("cpu", "cells", True, None, {}), ("cpu", "verlet", False, None, {}),
+                      ("cpu", "verlet", True, None, {}), ("cpu", "all", False, 2, {}), ("cpu", "cells", False, 2, {}),
+                      ("cpu", "cells", True, 2, {})]
+    if gpu:
+        configurations += [("gpu", "all", False, None, {}), ("gpu", "all", False, None, {"tiled": True}),
+                           ("gpu", "cells", False, None, {}), ("gpu", "verlet", False, None, {}),
+                           ("gpu", "verlet", True, None, {}), ("gpu", "all", False, 2, {}),
+                           ("gpu", "cells", False, 2, {})]
+
+    times = dict()
+
+    def done(name, start):
+        times[name] = time.perf_counter() - start
+        if callback:
+            callback(name, times[name])
+
+    for backend, neighbours, half, resident, options in configurations:
+        name = "{} {}{}{}{}".format(backend, neighbours, " half" if half else "", " resident" if resident else "",
+                                    "".join(f" {key}" for key in options))
+        start = time.perf_counter()
+        simulation = Simulation(model, prefer_gpu=backend == "gpu", neighbours=neighbours, half=half,
+                                resident=resident, gpu_options=options, sampling=2)
+        simulation.iter(4) # avec et sans énergies potentielles
+        simulation.release()
+        done(name, start)
+
+    for neighbours in Ensemble.NEIGHBOURS:
+        start = time.perf_counter()
+        Ensemble(model, replicas=2, neighbours=neighbours, sampling=2).iter(4)
+        done(f"cpu {neighbours} ensemble", start)
+
+    # noyau des processus du pool : compilé ici, les processus le trouveront dans le cache de numba
+    start = time.perf_counter()
+    compute = ForcesComputeCPU({k.upper(): v for k, v in model.params.items()})
+    _chunk_iterate(model.pos, compute._lj, compute.consts["N_A"], 0, model.npart, compute._grid.periodic,
+                   compute._grid.length, compute._F, compute._PE, compute._COUNT)
+    done("cpu pool", start)
+
+    return times
@@ -8,8 +8,7 @@ The first species values are stored in the first part of arrays (lower indices),
 (higher indices). This is meant to facilitate computation of inter-atomic forces and potential energy.
 """
 
-import numexpr as ne
-from ..utils.data_mng import *
+import numpy as np
 
 
 class Model:
@@ -215,6 +214,34 @@ class Model:
 
     __copy__ = copy
 
+    def set_params(self, params : dict):
+        """
+        Changes several parameters, keeping dependent ones consistent (eg. cut-off radii if :py:attr:`rcut_fact`
+        changes, :py:attr:`n_a` and masses if :py:attr:`x_a` changes, speeds if :py:attr:`T` changes).
+
+        Parameters
+        ----------
+        params : dict
+            New values, by parameter name.
+
+        Returns
+        -------
+
+        """
+        for key, value in params.items():
+            if key == "T":
+                continue
+            if key in self._special_values:
+                self.__setattr__(key, value)
+            else:
+                self.params[key] = value
+        if "rcut_fact" in params:
+            for sp in ("a", "b", "ab"):
+                self.params["rcut_"+sp] = self.rcut_fact*self.params["re_"+sp]
+        self._m()
+        if "T" in params: # en dernier, la température dépend des masses
+            self.T = params["T"]
+
     _derived_values = [  # Les valeurs calculables à partir des autres
         "T",
         "EC",
@@ -447,11 +474,15 @@ class Model:
         return np.array([self.up_x_component, self.up_y_component])
 
     def get_total_EC(self): # énergie cinétique totale
+        import numexpr as ne # importé à la demande, pour que l'import du module reste léger
+
         v = self.v
         m = self.m
         return 0.5*ne.evaluate("sum(m*v**2)")
 
     def get_EC(self): # énergie cinétique microscopique
+        import numexpr as ne
+
         v = self.v
         m = self.m
         v_avg = np.average(v, axis=0)
@@ -0,0 +1,288 @@
+# -*-encoding: utf-8 -*-
+"""
+Ensembles of replicas : the same model simulated several times, from different random initial speeds, to compute
+statistics.
+
+Positions and speeds of all replicas are stacked in :code:`(replicas, npart, 2)` arrays, and advanced together by a
+single compiled kernel (see `integrator_CPU`), each thread computing whole replicas. This is much faster than running
+independent `runner.Simulation` objects, which would each spread their computation over all cores.
+
+Example
+-------
+.. code-block:: python
+
+    ensemble = Ensemble(model, replicas=32, neighbours="cells")
+    ensemble.set_T_ramps([0, 1e-11], [300, 50])
+    ensemble.iter(10000)
+    T, T_std = ensemble.average("T")
+"""
+
+import numpy as np
+import numba
+
+from .runner import Simulation
+from .neighbours_CPU import CellGrid
+from .forces_CPU import _lj_table
+from .integrator_CPU import _run_replicas
+from .observables import Series
+
+# fonctions d'état propres à chaque réplique (les autres sont communes : consigne, temps, itérations)
+REPLICA_SERIES = ("T", "EC", "EP", "ET", "bonds")
+
+
+class Ensemble:
+    """
+    Replicas of a model, differing by their initial speeds, simulated together on CPU.
+
+    Every replica follows the same set points (temperature ramps, external forces of the upper zone), but has its own
+    thermostat.
+
+    Parameters
+    ----------
+    model : builder.Model
+        Model to simulate. It is copied, and thus preserved.
+    replicas : int
+        Number of replicas.
+    seeds : list
+        Seed of the random generator used to draw the initial speeds of each replica (see `builder.Model.random_speed`),
+        which are then scaled to the temperature of `model`. Defaults to :code:`range(replicas)`. The global random
+        generator of numpy is left untouched.
+    neighbours : str
+        Neighbour search method, `"all"` or `"cells"` (see `forces_CPU.ForcesComputeCPU`).
+    sampling : int
+        State functions are recorded every `sampling` iterations (see `runner.Simulation`).
+    batch : int
+        Number of iterations computed by each call to the compiled kernel. The callback of :py:meth:`iter` is called
+        after each batch.
+    threads : int
+        Number of threads, each one computing whole replicas. Defaults to all cores (but not more than the number of
+        replicas).
+
+    Attributes
+    ----------
+    model : builder.Model
+        Reference model (its positions and speeds are those of the first replica at initialisation only).
+    pos : np.ndarray
+        Positions of the atoms of each replica, :code:`(replicas, npart, 2)`.
+    v : np.ndarray
+        Speeds of the atoms of each replica, :code:`(replicas, npart, 2)`.
+    F : np.ndarray
+        Last computed forces applied to the atoms of each replica.
+    current_iter : int
+        Number of iterations already computed, since initialisation.
+    state_fct : dict
+        State functions. `"T"`, `"EC"`, `"EP"`, `"ET"` and `"bonds"` are lists of one `observables.Series` per replica,
+        `"T_ctrl"`, `"time"` and `"iters"` are `observables.Series` shared by all replicas. Set point ramps are also
+        kept there, like in `runner.Simulation`.
+    """
+
+    NEIGHBOURS = ("all", "cells")
+
+    def __init__(self, model, replicas=16, seeds=None, neighbours="all", sampling=1, batch=100, threads=None):
+        if neighbours not in self.NEIGHBOURS:
+            raise ValueError(f"Replicas can only be computed with neighbours among {self.NEIGHBOURS}")
+        seeds = list(range(replicas)) if seeds is None else list(seeds)
+        if len(seeds) != replicas:
+            raise ValueError("One seed is needed per replica")
+
+        self.model = model.copy()
+        self.replicas = replicas
+        self.seeds = seeds
+        self.neighbours = neighbours
+        self.sampling = max(1, int(sampling))
+        self.batch = max(1, int(batch))
+        self.threads = min(threads or numba.config.NUMBA_NUM_THREADS, numba.config.NUMBA_NUM_THREADS, replicas)
+
+        npart = self.model.npart
+        T = self.model.T
+        self.pos = np.empty((replicas, npart, 2))
+        self.v = np.empty((replicas, npart, 2))
+        rng = np.random.get_state() # random_speed tire dans le générateur global, qu'on restaure ensuite
+        try:
+            for r, seed in enumerate(seeds):
+                replica = self.model.copy()
+                np.random.seed(seed)
+                replica.random_speed()
+                if T:
+                    replica.T = T
+                self.pos[r] = replica.pos
+                self.v[r] = replica.v
+        finally:
+            np.random.set_state(rng)
+
+        # paramétrage commun à toutes les répliques
+        consts = dict()
+        for k in self.model.params:
+            consts[k.upper()] = self.model.params[k]
+        self._consts = consts
+        self._lj = _lj_table(consts)
+        self._grid = CellGrid(consts)
+
+        ncell = len(self._grid.cell_start)
+        self._atom_cell = np.zeros((replicas, npart), dtype=np.int64)
+        self._cell_start = np.zeros((replicas, ncell), dtype=np.int64)
+        self._cell_atoms = np.zeros((replicas, npart), dtype=np.int64)
+        self.F = np.zeros((replicas, npart, 2), dtype=np.float32)
+        self._PE = np.zeros((replicas, npart), dtype=np.float32)
+        self._COUNT = np.zeros((replicas, npart), dtype=np.float32)
+
+        apply_up_zone_forces = self.model.up_apply_force_x or self.model.up_apply_force_y
+        self._up_forces = bool(apply_up_zone_forces)
+        self._rotative = bool(apply_up_zone_forces and not self.model.y_periodic)
+
+        # atomes bloqués choisis une fois pour toutes, comme dans Simulation
+        if self.model.low_block:
+            self.block_mask = self.pos[:, :, 1] > self.model.low_zone_upper_limit
+        else:
+            self.block_mask = np.ones((replicas, npart), dtype=np.bool_)
+
+        self.T_f = lambda t: T
+        self.Fx_f = lambda t: 0.0
+        self.Fy_f = lambda t: 0.0
+        self.T_cntl = False
+
+        self.current_iter = 0
+        self.state_fct = dict()
+        for key in REPLICA_SERIES:
+            self.state_fct[key] = [Series() for _ in range(replicas)]
+        for key in ("T_ctrl", "time", "iters"):
+            self.state_fct[key] = Series()
+        for key in ("T_ramps", "Fx_ramps", "Fy_ramps"):
+            self.state_fct[key] = [[], []]
+        for s in self.state_fct:
+            self.__setattr__(s, self.state_fct[s])
+
+    # consignes : mêmes fonctions que pour une simulation
+    _f = Simulation._f
+    F_f = Simulation.F_f
+    set_T_ramps = Simulation.set_T_ramps
+    set_Fx_ramps = Simulation.set_Fx_ramps
+    set_Fy_ramps = Simulation.set_Fy_ramps
+
+    def set_T_f(self, f):
+        """
+        Sets function that controls temperature (see `runner.Simulation.set_T_f`). Speeds of every replica are scaled
+        to its current value.
+
+        Parameters
+        ----------
+        f : callable
+            Must take time (float) as an argument and return temperature (in K, float).
+
+        Returns
+        -------
+
+        """
+        self.T_cntl = True
+        self.T_f = f
+        T = f(self.current_iter * self.model.dt)
+        for r in range(self.replicas):
+            replica = self.replica(r)
+            replica.T = T
+            self.v[r] = replica.v
+
+    def iter(self, n=1, callback=None):
+        """
+        Iterates all replicas.
+
+        Parameters
+        ----------
+        n : int
+            Number of iterations to perform.
+        callback : callable
+            A callback function that must take the Ensemble object as first argument. It is called after each batch of
+            iterations.
+
+        Returns
+        -------
+
+        """
+        model = self.model
+        grid = self._grid
+        dt = model.dt
+        npart = model.npart
+        block = self.block_mask.astype(np.float64)
+        lim_inf = np.asarray(model.lim_inf, dtype=np.float64)
+        lim_sup = np.asarray(model.lim_sup, dtype=np.float64)
+        y_middle = 0.5 * (model.y_lim_sup + model.y_lim_inf)
+
+        done = 0
+        while done < n:
+            k = min(self.batch, n - done)
+            iters = self.current_iter + np.arange(k)
+            t = iters * dt
+
+            # consignes calculées à l'avance, puisque ce sont des fonctions Python
+            T_v = np.array([self.T_f(x) for x in t], dtype=np.float64) if self.T_cntl else np.zeros(k)
+            if self._up_forces:
+                up_zone_force = np.array([self.F_f(x) for x in t], dtype=np.float64).reshape((k, 2))
+            else:
+                up_zone_force = np.zeros((k, 2))
+
+            sampled = iters % self.sampling == 0
+            out = tuple(np.empty((self.replicas, int(np.count_nonzero(sampled)))) for _ in range(4))
+
+            threads = numba.get_num_threads()
+            numba.set_num_threads(self.threads)
+            try:
+                _run_replicas(k, sampled, self.pos, self.v, model.m, block, dt, model.gamma, model.kB * npart,
+                              lim_inf, lim_sup, bool(self.T_cntl), T_v, self._up_forces, up_zone_force,
+                              float(model.up_zone_lower_limit), self._rotative, y_middle, self._lj,
+                              self._consts["N_A"], int(self.neighbours == "cells"), grid.periodic, grid.length,
+                              grid.origin, grid.size, grid.ncells, self._atom_cell, self._cell_start,
+                              self._cell_atoms, self.F, self._PE, self._COUNT, *out)
+            finally:
+                numba.set_num_threads(threads)
+
+            EC, EP, T, bonds = out
+            for r in range(self.replicas):
+                self.EC[r].extend(EC[r])
+                self.T[r].extend(T[r])
+                self.EP[r].extend(EP[r])
+                self.ET[r].extend(EC[r] + EP[r])
+                self.bonds[r].extend(bonds[r])
+            self.T_ctrl.extend(T_v[sampled] if self.T_cntl else np.mean(T, axis=0))
+            self.iters.extend(iters[sampled])
+            self.time.extend(t[sampled])
+
+            done += k
+            self.current_iter += k
+
+            if callback:
+                callback(self)
+
+    def average(self, key):
+        """
+        Statistics of a state function over the replicas.
+
+        Parameters
+        ----------
+        key : str
+            State function (`"T"`, `"EC"`, `"EP"`, `"ET"` or `"bonds"`).
+
+        Returns
+        -------
+        tuple
+            Mean and standard deviation over the replicas at each recorded iteration (as `np.ndarray`).
+        """
+        values = np.array([np.asarray(s) for s in self.state_fct[key]])
+        return values.mean(axis=0), values.std(axis=0)
+
+    def replica(self, r):
+        """
+
+        Parameters
+        ----------
+        r : int
+            Index of the replica.
+
+        Returns
+        -------
+        builder.Model
+            Copy of the model, with the current positions and speeds of replica `r` (eg. to save it, or to go on with
+            a `runner.Simulation`).
+        """
+        model = self.model.copy()
+        model.pos = self.pos[r].copy()
+        model.v = self.v[r].copy()
+        return model
@@ -6,11 +6,21 @@
 installer icc-rt et tbb sur les machines à processeur intel
 """
 
+import os
 import numpy as np
 import numba
 import threading
 import multiprocessing as mp
-import ctypes
+from multiprocessing import shared_memory
+
+from .neighbours_CPU import CellGrid, _neighbour_cells, _min_image
+from .backends import registry
+
+# les noyaux parallèles sont lancés depuis des threads de calcul (et, dans l'interface graphique, depuis le thread des
+# simulations) : avec TBB, le processus ne se termine alors plus. OpenMP (ou à défaut workqueue) est donc préféré, sauf
+# si l'utilisateur a choisi lui-même (à faire avant le premier lancement d'un noyau parallèle)
+if "NUMBA_THREADING_LAYER_PRIORITY" not in os.environ:
+    numba.config.THREADING_LAYER_PRIORITY = ["omp", "workqueue", "tbb"]
 
 
 @numba.njit(nogil=True)
@@ -24,106 +34,288 @@ def energy(dist, epsilon, p):
 
 
 @numba.njit(nogil=True, cache=True)
-def _iterate(current_pos, i, pos, a, b, epsilon, sigma, rcut, X_PERIODIC, Y_PERIODIC, SHIFT_X, SHIFT_Y, LENGTH_X, LENGTH_Y):
-    f = np.zeros((2,))
+def _pair(pos, i, j, lj, N_A, periodic, length, energies):
+    # interaction entre les atomes i et j : (force/distance, composantes de la distance, énergie, liaison)
+    # l'énergie n'est calculée que si energies est vrai
+    # lj[espèce de i, espèce de j] = (epsilon, sigma, rcut)
+    si = 0 if i < N_A else 1
+    sj = 0 if j < N_A else 1
+    epsilon = lj[si, sj, 0]
+    sigma = lj[si, sj, 1]
+    rcut = lj[si, sj, 2]
+
+    dx = _min_image(pos[i, 0] - pos[j, 0], periodic[0], length[0])
+    dy = _min_image(pos[i, 1] - pos[j, 1], periodic[1], length[1])
+
+    if np.abs(dx) < rcut and np.abs(dy) < rcut:
+        dist = np.sqrt(dx * dx + dy * dy)
+
+        if dist < rcut:
+            p = (sigma / dist) ** 6
+            e = energy(dist, epsilon, p) if energies else 0.0
+            return force(dist, epsilon, p), dx, dy, e, 1.0
+    return 0.0, dx, dy, 0.0, 0.0
+
+
+@numba.njit(nogil=True, cache=True)
+def _atom_all(pos, i, lj, N_A, periodic, length, F, PE, COUNT, energies):
+    # interactions de l'atome i avec tous les autres
+    fx = 0.0
+    fy = 0.0
     e = 0.0
     m = 0.0
-    for j in range(a, b):
-        if i==j:
+    for j in range(pos.shape[0]):
+        if i == j:
             continue
-        distxy = current_pos - pos[j, :]
-
-        if X_PERIODIC:
-            if distxy[0] < (-SHIFT_X):
-                distxy[0] += LENGTH_X
-            if distxy[0] > SHIFT_X:
-                distxy[0] -= LENGTH_X
-
-        if Y_PERIODIC:
-            if distxy[1] < (-SHIFT_Y):
-                distxy[1] += LENGTH_Y
-            if distxy[1] > SHIFT_Y:
-                distxy[1] -= LENGTH_Y
-
-        if np.abs(distxy[0])<rcut and np.abs(distxy[1])<rcut:
-            dist = np.sqrt(np.sum(distxy ** 2))
-
-            if dist < rcut:
-                p = (sigma / dist) ** 6
-                f += force(dist, epsilon, p)*distxy
-                e += energy(dist, epsilon, p)
-                m += 1.0
-    return np.array((f[0], f[1], e, m))
-
-
-def _par_iterate(current_pos, i, EPSILON_A, EPSILON_B, EPSILON_AB, SIGMA_A, SIGMA_B, SIGMA_AB, RCUT_A, RCUT_B,
-                 RCUT_AB, N_A, NPART, LENGTH_X, LENGTH_Y, X_PERIODIC, Y_PERIODIC, SHIFT_X, SHIFT_Y):
-    ret = np.zeros((4,))
-    pos = np.array(_pos_array).reshape(NPART,2)
-    if i < N_A:
-        ret += _iterate(current_pos, i, pos, 0, N_A, EPSILON_A, SIGMA_A, RCUT_A, X_PERIODIC,
-                           Y_PERIODIC, SHIFT_X, SHIFT_Y, LENGTH_X, LENGTH_Y)
-        ret += _iterate(current_pos, i, pos, N_A, NPART, EPSILON_AB, SIGMA_AB, RCUT_AB,
-                           X_PERIODIC, Y_PERIODIC, SHIFT_X, SHIFT_Y, LENGTH_X, LENGTH_Y)
-    else:
-        ret += _iterate(current_pos, i, pos, 0, N_A, EPSILON_AB, SIGMA_AB, RCUT_AB, X_PERIODIC,
-                           Y_PERIODIC, SHIFT_X, SHIFT_Y, LENGTH_X, LENGTH_Y)
-        ret += _iterate(current_pos, i, pos, N_A, NPART, EPSILON_B, SIGMA_B, RCUT_B, X_PERIODIC,
-                           Y_PERIODIC, SHIFT_X, SHIFT_Y, LENGTH_X, LENGTH_Y)
-    return ret
-
-
-def _p_compute_forces(
-        pool,
-        _array,
-        F,
-        PE,
-        counts,
-        EPSILON_A,
-        EPSILON_B,
-        EPSILON_AB,
-        SIGMA_A,
-        SIGMA_B,
-        SIGMA_AB,
-        RCUT_A,
-        RCUT_B,
-        RCUT_AB,
-        N_A,
-        NPART,
-        LENGTH_X,
-        LENGTH_Y,
-        X_PERIODIC,
-        Y_PERIODIC,
-        SHIFT_X,
-        SHIFT_Y,
-        offset,
-        end):
-    pos = np.array(_array).reshape(NPART,2)
-
-    gen = ((pos[i,:], i, EPSILON_A,EPSILON_B,EPSILON_AB,SIGMA_A,SIGMA_B,SIGMA_AB,RCUT_A,RCUT_B,
-            RCUT_AB,N_A,NPART,LENGTH_X,LENGTH_Y,X_PERIODIC,Y_PERIODIC, SHIFT_X, SHIFT_Y) for i in range(offset, end))
-
-    sortie = np.array(pool.starmap(_par_iterate, gen))
-
-    F[:,:] = sortie[:,:2]
-    PE[:] = sortie[:,2]
-    counts[:] = sortie[:,3]
-
-_pos_array = None
-
-def initProcess(array):
-    global _pos_array
-    _pos_array = array
+        f, dx, dy, e_ij, m_ij = _pair(pos, i, j, lj, N_A, periodic, length, energies)
+        fx += f * dx
+        fy += f * dy
+        e += e_ij
+        m += m_ij
+    F[i, 0] = fx
+    F[i, 1] = fy
+    PE[i] = e
+    COUNT[i] = m
+
+
+@numba.njit(nogil=True, cache=True)
+def _cell_atoms(pos, c, lj, N_A, offset, end, periodic, length, ncells, cell_start, cell_atoms, neigh, F, PE, COUNT,
+                energies):
+    # interactions des atomes de la cellule c avec ceux des cellules voisines
+    nn = _neighbour_cells(c, ncells, periodic, neigh)
+    for a in range(cell_start[c], cell_start[c + 1]):
+        i = cell_atoms[a]
+        if i < offset or i >= end:
+            continue
+        fx = 0.0
+        fy = 0.0
+        e = 0.0
+        m = 0.0
+        for k in range(nn):
+            c2 = neigh[k]
+            for b in range(cell_start[c2], cell_start[c2 + 1]):
+                j = cell_atoms[b]
+                if i == j:
+                    continue
+                f, dx, dy, e_ij, m_ij = _pair(pos, i, j, lj, N_A, periodic, length, energies)
+                fx += f * dx
+                fy += f * dy
+                e += e_ij
+                m += m_ij
+        F[i, 0] = fx
+        F[i, 1] = fy
+        PE[i] = e
+        COUNT[i] = m
+
+
+@numba.njit(nogil=True, parallel=True, cache=True)
+def _all_iterate(pos, lj, N_A, offset, end, periodic, length, F, PE, COUNT, energies):
+    for i in numba.prange(offset, end):
+        _atom_all(pos, i, lj, N_A, periodic, length, F, PE, COUNT, energies)
+
+
+@numba.njit(nogil=True, parallel=True, cache=True)
+def _cells_iterate(pos, lj, N_A, offset, end, periodic, length, ncells, cell_start, cell_atoms, F, PE, COUNT,
+                   energies):
+    for c in numba.prange(cell_start.shape[0] - 1):
+        neigh = np.empty((9,), dtype=np.int64)
+        _cell_atoms(pos, c, lj, N_A, offset, end, periodic, length, ncells, cell_start, cell_atoms, neigh, F, PE,
+                    COUNT, energies)
+
+
+@numba.njit(nogil=True, parallel=True, cache=True)
+def _verlet_iterate(pos, lj, N_A, offset, end, periodic, length, start, nlist, F, PE, COUNT, energies):
+    for i in numba.prange(offset, end):
+        fx = 0.0
+        fy = 0.0
+        e = 0.0
+        m = 0.0
+        for k in range(start[i], start[i + 1]):
+            f, dx, dy, e_ij, m_ij = _pair(pos, i, nlist[k], lj, N_A, periodic, length, energies)
+            fx += f * dx
+            fy += f * dy
+            e += e_ij
+            m += m_ij
+        F[i, 0] = fx
+        F[i, 1] = fy
+        PE[i] = e
+        COUNT[i] = m
+
+
+@numba.njit(nogil=True, cache=True)
+def _scatter(acc, i, j, f, dx, dy, e, m):
+    # troisième loi de Newton : la force sur j est l'opposée de celle sur i
+    acc[i, 0] += f * dx
+    acc[i, 1] += f * dy
+    acc[j, 0] -= f * dx
+    acc[j, 1] -= f * dy
+    acc[i, 2] += e
+    acc[j, 2] += e
+    acc[i, 3] += m
+    acc[j, 3] += m
+
+
+@numba.njit(nogil=True, parallel=True, cache=True)
+def _reduce_acc(acc, F, PE, COUNT):
+    for i in numba.prange(acc.shape[1]):
+        s = np.zeros((4,))
+        for t in range(acc.shape[0]):
+            s += acc[t, i, :]
+        F[i, 0] = s[0]
+        F[i, 1] = s[1]
+        PE[i] = s[2]
+        COUNT[i] = s[3]
+
+
+@numba.njit(nogil=True, parallel=True, cache=True)
+def _cells_iterate_half(pos, lj, N_A, periodic, length, ncells, cell_start, cell_atoms, acc, F, PE, COUNT,
+                        energies):
+    # chaque paire (i, j>i) n'est calculée qu'une fois ; chaque tâche accumule dans son propre tampon acc[t]
+    nchunks = acc.shape[0]
+    ncell = cell_start.shape[0] - 1
+    for t in numba.prange(nchunks):
+        buf = acc[t]
+        buf[:, :] = 0.0
+        neigh = np.empty((9,), dtype=np.int64)
+        for c in range(t * ncell // nchunks, (t + 1) * ncell // nchunks):
+            nn = _neighbour_cells(c, ncells, periodic, neigh)
+            for a in range(cell_start[c], cell_start[c + 1]):
+                i = cell_atoms[a]
+                for k in range(nn):
+                    c2 = neigh[k]
+                    for b in range(cell_start[c2], cell_start[c2 + 1]):
+                        j = cell_atoms[b]
+                        if j <= i:
+                            continue
+                        f, dx, dy, e, m = _pair(pos, i, j, lj, N_A, periodic, length, energies)
+                        if m:
+                            _scatter(buf, i, j, f, dx, dy, e, m)
+    _reduce_acc(acc, F, PE, COUNT)
+
+
+@numba.njit(nogil=True, parallel=True, cache=True)
+def _verlet_iterate_half(pos, lj, N_A, periodic, length, start, nlist, acc, F, PE, COUNT, energies):
+    # la liste ne contient que les voisins j>i (voir VerletList)
+    nchunks = acc.shape[0]
+    npart = pos.shape[0]
+    for t in numba.prange(nchunks):
+        buf = acc[t]
+        buf[:, :] = 0.0
+        for i in range(t * npart // nchunks, (t + 1) * npart // nchunks):
+            for k in range(start[i], start[i + 1]):
+                j = nlist[k]
+                f, dx, dy, e, m = _pair(pos, i, j, lj, N_A, periodic, length, energies)
+                if m:
+                    _scatter(buf, i, j, f, dx, dy, e, m)
+    _reduce_acc(acc, F, PE, COUNT)
+
+
+def _lj_table(consts):
+    """
+    Lennard-Jones parameters indexed by species (0 for A, 1 for B) of both atoms, as :code:`(epsilon, sigma, rcut)`.
+    """
+    a = (consts["EPSILON_A"], consts["SIGMA_A"], consts["RCUT_A"])
+    b = (consts["EPSILON_B"], consts["SIGMA_B"], consts["RCUT_B"])
+    ab = (consts["EPSILON_AB"], consts["SIGMA_AB"], consts["RCUT_AB"])
+    return np.array(((a, ab), (ab, b)), dtype=np.float64)
+
+
+@numba.njit(nogil=True, cache=True)
+def _chunk_iterate(pos, lj, N_A, lo, hi, periodic, length, F, PE, COUNT):
+    # version séquentielle de _all_iterate, pour les processus du pool
+    for i in range(lo, hi):
+        _atom_all(pos, i, lj, N_A, periodic, length, F, PE, COUNT, True)
+
+
+def _shared_views(buf, npart):
+    # positions (float64), forces, énergies potentielles et liaisons (float32) dans un même segment partagé
+    pos = np.frombuffer(buf, dtype=np.float64, count=2 * npart).reshape((npart, 2))
+    F = np.frombuffer(buf, dtype=np.float32, count=2 * npart, offset=16 * npart).reshape((npart, 2))
+    PE = np.frombuffer(buf, dtype=np.float32, count=npart, offset=24 * npart)
+    COUNT = np.frombuffer(buf, dtype=np.float32, count=npart, offset=28 * npart)
+    return pos, F, PE, COUNT
+
+
+# Segment partagé du dernier module de calcul servi, propre à chaque processus du pool : les processus du pool sont
+# réutilisés par les modules de calcul successifs (voir backends.BackendRegistry)
+_shared = None
+
+def _attach(name, npart):
+    global _shared
+    if _shared is None or _shared[0] != name:
+        if _shared is not None:
+            segment = _shared[1]
+            _shared = None # les vues doivent disparaître avant la fermeture du segment
+            segment.close()
+        segment = shared_memory.SharedMemory(name=name)
+        _shared = (name, segment, _shared_views(segment.buf, npart))
+    return _shared[2]
+
+def _compute_chunk(task, lo, hi):
+    name, npart, lj, N_A, periodic, length = task
+    pos, F, PE, COUNT = _attach(name, npart)
+    _chunk_iterate(pos, lj, N_A, lo, hi, periodic, length, F, PE, COUNT)
+
 
 class ForcesComputeCPU:
     """
     Compute module.
     Runs on CPU.
-    Uses `numba` for JIT compilation and `multiprocessing` for multicore.
+    Uses `numba` for JIT compilation and multithreading.
     See `ForcesComputeGPU` for documentation.
+
+    Parameters
+    ----------
+    neighbours : str
+        Neighbour search method :
+
+            - `"all"` : every pair of atoms is tested. Cost grows as the square of the number of atoms.
+            - `"cells"` : atoms are sorted in cells as wide as the cut-off radius (see `neighbours_CPU.CellGrid`), and
+              only neighbouring cells are visited. Cost grows linearly with the number of atoms.
+            - `"verlet"` : only the pairs of a neighbour list are visited. The list must be given with
+              :py:meth:`set_neighbours` (and kept up to date) before computing.
+    half : bool
+        If `True`, each pair of atoms is computed only once and the opposite force is applied to the other atom
+        (Newton's third law), which roughly halves the amount of calculations. Needs `"cells"` or `"verlet"`
+        neighbours (with a list built with :code:`half=True`), and all atoms to be computed.
+
+        Each thread accumulates results in its own buffer, which takes :code:`32*npart` bytes per thread.
+    engine : str
+        How work is spread among cores :
+
+            - `"numba"` : all atoms are computed in one call, by `numba` threads sharing the same arrays.
+            - `"pool"` : contiguous ranges of atoms are sent to a `multiprocessing` pool, whose processes read
+              positions and write results directly in shared memory. Only with `"all"` neighbours. Useful when
+              `numba` multithreading is not available. The pool is kept alive by `backends.registry`, and reused by
+              later compute modules.
+    threads : int
+        Number of threads used by the `"numba"` engine, or of processes in the pool. Defaults to all cores.
+    chunk_size : int
+        Number of atoms per task sent to the pool. Defaults to a quarter of an equal share between processes, to
+        balance load.
     """
 
-    def __init__(self, consts, compute_npart=None, compute_offset=0):
+    NEIGHBOURS = ("all", "cells", "verlet")
+    ENGINES = ("numba", "pool")
+
+    def __init__(self, consts, compute_npart=None, compute_offset=0, neighbours="all", half=False, engine="numba",
+                 threads=None, chunk_size=None):
+
+        if neighbours not in self.NEIGHBOURS:
+            raise ValueError(f"Unknown neighbour search method : {neighbours}")
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown compute engine : {engine}")
+        if half and neighbours == "all":
+            raise ValueError("Half-pair computation needs a neighbour search method")
+        if engine == "pool" and neighbours != "all":
+            raise ValueError("The process pool only computes all pairs")
+        self.neighbours = neighbours
+        self.half = half
+        self.engine = engine
+        if engine == "pool":
+            self.threads = threads or mp.cpu_count()
+        else:
+            self.threads = min(threads or numba.config.NUMBA_NUM_THREADS, numba.config.NUMBA_NUM_THREADS)
 
         self.consts = consts
 
@@ -134,72 +326,141 @@ class ForcesComputeCPU:
 
         self.compute_npart = min(self.compute_npart, self.npart)
 
+        if half and self.compute_npart < self.npart:
+            raise ValueError("Half-pair computation needs all atoms to be computed")
+
         self.array_shape = (self.npart, 2)
-        self._F = np.zeros(self.array_shape, dtype=np.float32)
-        self._PE = np.zeros((self.npart,), dtype=np.float32)
-        self._COUNT = np.zeros((self.npart,), dtype=np.float32)
 
         self._thr_run = False
-
-        self._POS = mp.Array(ctypes.c_float, self.npart * 2, lock=False)
-        self._pool = mp.Pool(mp.cpu_count(), initializer=initProcess, initargs=(self._POS,))
+        self._pool = None
+        self._energies = True
+
+        self._lj = _lj_table(consts)
+        self._grid = CellGrid(consts)
+        self._nlist = None
+
+        self._segment = None
+        if engine == "pool":
+            # tout est en mémoire partagée : seuls le nom du segment, les paramètres et les bornes des tâches
+            # transitent par le pool
+            self._segment = shared_memory.SharedMemory(create=True, size=32 * self.npart)
+            self._pos, self._F, self._PE, self._COUNT = _shared_views(self._segment.buf, self.npart)
+
+            chunk_size = chunk_size or int(np.ceil(self.compute_npart / (4 * self.threads)))
+            end = self.compute_offset + self.compute_npart
+            task = (self._segment.name, self.npart, self._lj, consts["N_A"], self._grid.periodic, self._grid.length)
+            self._chunks = [(task, lo, min(lo + chunk_size, end))
+                            for lo in range(self.compute_offset, end, chunk_size)]
+
+            self._pool = registry.pool(self.threads)
+        else:
+            self._pos = np.zeros(self.array_shape, dtype=np.float64)
+            self._F = np.zeros(self.array_shape, dtype=np.float32)
+            self._PE = np.zeros((self.npart,), dtype=np.float32)
+            self._COUNT = np.zeros((self.npart,), dtype=np.float32)
+            if half:
+                self._acc = np.zeros((self.threads, self.npart, 4))
 
     def __del__(self):
-        self._pool.close() # pour ne pas garder des processus ouverts pour rien
+        self.release()
+
+    def release(self):
+        """
+        Frees the shared memory of the `"pool"` engine. The pool itself is kept for other compute modules (see
+        `backends.BackendRegistry`).
+
+        Returns
+        -------
+
+        """
+        segment = getattr(self, "_segment", None)
+        if segment is not None:
+            self._join_thr()
+            self._segment = None
+            self._pos = self._F = self._PE = self._COUNT = None # les vues doivent disparaître avant le segment
+            segment.unlink()
+            try:
+                segment.close()
+            except BufferError: # des vues (eg. renvoyées par get_F) existent encore : libéré avec elles
+                pass
+
+    def _compute_cells(self):
+        grid = self._grid
+        grid.bin(self._pos)
+        if self.half:
+            _cells_iterate_half(self._pos, self._lj, self.consts["N_A"], grid.periodic, grid.length, grid.ncells,
+                                grid.cell_start, grid.cell_atoms, self._acc, self._F, self._PE, self._COUNT,
+                                self._energies)
+            return
+        _cells_iterate(self._pos, self._lj, self.consts["N_A"], self.compute_offset,
+                       self.compute_offset + self.compute_npart, grid.periodic, grid.length, grid.ncells,
+                       grid.cell_start, grid.cell_atoms, self._F, self._PE, self._COUNT, self._energies)
+
+    def _compute_verlet(self):
+        grid = self._grid
+        if self.half:
+            _verlet_iterate_half(self._pos, self._lj, self.consts["N_A"], grid.periodic, grid.length,
+                                 self._nlist.start, self._nlist.nlist, self._acc, self._F, self._PE, self._COUNT,
+                                 self._energies)
+            return
+        _verlet_iterate(self._pos, self._lj, self.consts["N_A"], self.compute_offset,
+                        self.compute_offset + self.compute_npart, grid.periodic, grid.length,
+                        self._nlist.start, self._nlist.nlist, self._F, self._PE, self._COUNT, self._energies)
+
+    def _compute_all(self):
+        grid = self._grid
+        _all_iterate(self._pos, self._lj, self.consts["N_A"], self.compute_offset,
+                     self.compute_offset + self.compute_npart, grid.periodic, grid.length,
+                     self._F, self._PE, self._COUNT, self._energies)
 
     def _compute_forces(self):
-        EPSILON_A = self.consts["EPSILON_A"]
-        EPSILON_B = self.consts["EPSILON_B"]
-        EPSILON_AB = self.consts["EPSILON_AB"]
-        SIGMA_A = self.consts["SIGMA_A"]
-        SIGMA_B = self.consts["SIGMA_B"]
-        SIGMA_AB = self.consts["SIGMA_AB"]
-        RCUT_A = self.consts["RCUT_A"]
-        RCUT_B = self.consts["RCUT_B"]
-        RCUT_AB = self.consts["RCUT_AB"]
-        N_A = self.consts["N_A"]
-        NPART = self.consts["NPART"]
-        LENGTH_X = self.consts["LENGTH_X"]
-        LENGTH_Y = self.consts["LENGTH_Y"]
-        X_PERIODIC = self.consts["X_PERIODIC"]
-        Y_PERIODIC = self.consts["Y_PERIODIC"]
-
-        SHIFT_X = LENGTH_X / 2
-        SHIFT_Y = LENGTH_Y / 2
-        end = NPART
-        _p_compute_forces(
-            self._pool,
-            self._POS,
-            self._F,
-            self._PE,
-            self._COUNT,
-            EPSILON_A,
-            EPSILON_B,
-            EPSILON_AB,
-            SIGMA_A,
-            SIGMA_B,
-            SIGMA_AB,
-            RCUT_A,
-            RCUT_B,
-            RCUT_AB,
-            N_A,
-            NPART,
-            LENGTH_X,
-            LENGTH_Y,
-            X_PERIODIC,
-            Y_PERIODIC,
-            SHIFT_X,
-            SHIFT_Y,
-            self.compute_offset,
-            end)
+        if self._pool is not None:
+            self._pool.starmap(_compute_chunk, self._chunks, chunksize=1)
+            return
+
+        numba.set_num_threads(self.threads) # propre à chaque thread, donc à faire dans celui du calcul
+        if self.neighbours == "cells":
+            self._compute_cells()
+        elif self.neighbours == "verlet":
+            self._compute_verlet()
+        else:
+            self._compute_all()
 
     def _join_thr(self):
         if self._thr_run:
             self._thread.join()
             self._thr_run = False
 
-    def set_pos(self, pos):
-        self._POS[:] = pos.reshape((self.npart * 2,))
+    def set_neighbours(self, nlist):
+        """
+        Sets the neighbour list used when `neighbours` is `"verlet"`.
+
+        Parameters
+        ----------
+        nlist : neighbours_CPU.VerletList
+            Neighbour list. It is read at each computation, so it must not be rebuilt while forces are computed.
+        """
+        self._join_thr()
+        self._nlist = nlist
+
+    def set_pos(self, pos, energies=True):
+        """
+        Set position array and start computing forces.
+
+        Parameters
+        ----------
+        pos : np.ndarray
+            Array of positions.
+        energies : bool
+            If `False`, potential energies are not computed (they are set to zero), only forces and bonds. The process
+            pool always computes them.
+
+        Returns
+        -------
+
+        """
+        self._pos[:, :] = pos
+        self._energies = energies
         self._thr_run = True
         self._thread = threading.Thread(target=self._compute_forces)
         self._thread.start()
@@ -214,4 +475,15 @@ class ForcesComputeCPU:
 
     def get_COUNT(self):
         self._join_thr()
-        return self._COUNT[:]
\ No newline at end of file
+        return self._COUNT[:]
+
+    def get_totals(self):
+        """
+
+        Returns
+        -------
+        tuple
+            Sum of computed potential energies, and sum of near atoms counts.
+        """
+        self._join_thr()
+        return float(np.sum(self._PE, dtype=np.float64)), float(np.sum(self._COUNT, dtype=np.float64))
@@ -2,12 +2,15 @@
 
 from ..utils import gl_util
 import os
-import moderngl
 import numpy as np
 
-if not gl_util.testGL():
-    os.environ["MESA_GL_VERSION_OVERRIDE"] = "4.3"
-    os.environ["MESA_GLSL_VERSION_OVERRIDE"] = "430"
+from .neighbours_CPU import CellGrid, _transpose
+from .backends import registry
+
+SHARED_MEMORY_SIZE = 32768
+"""
+int : Shared memory (in bytes) that compute shaders may use, whatever the driver.
+"""
 
 
 class ForcesComputeGPU:
@@ -19,6 +22,24 @@ class ForcesComputeGPU:
     ----------
     consts : dict
         Dictionary containing constants used for calculations.
+    neighbours : str
+        Neighbour search method :
+
+            - `"all"` : every pair of atoms is tested.
+            - `"cells"` : atoms are sorted by cell on GPU at each computation (counting sort, then by index within
+              each cell, so that results do not depend on scheduling), and only atoms of neighbouring cells are
+              visited. The prefix sum over cells is done in shared memory if the grid fits in
+              32 kB (the minimum `GL_MAX_COMPUTE_SHARED_MEMORY_SIZE` of OpenGL 4.3, moderngl cannot query the actual
+              limit) and if the driver accepts it, and directly in the storage buffer otherwise.
+            - `"verlet"` : only the pairs of a neighbour list are visited. The list must be given with
+              :py:meth:`set_neighbours` (and kept up to date) before computing.
+    half : bool
+        If `True`, each pair of the neighbour list is computed only once, and the opposite force is applied to the
+        other atom in a second pass (Newton's third law). Needs `"verlet"` neighbours, with a list built with
+        :code:`half=True`.
+    tiled : bool
+        If `True`, with `"all"` neighbours, positions are read by tiles loaded in shared memory by each work group,
+        which saves a lot of memory bandwidth (especially on integrated GPUs and software rasterizers).
 
     Attributes
     ----------
@@ -26,10 +47,30 @@ class ForcesComputeGPU:
         Number of atoms.
     consts : dict
         Dictionary containing constants used for calculations, and some parameters to run the compute shader.
+    context : moderngl.Context
+        Context of the calling thread, shared with other compute modules (see `backends.BackendRegistry`), as well as
+        compiled shaders. Buffers are owned by the compute module, and freed by :py:meth:`release`.
 
     """
 
-    def __init__(self, consts, compute_npart=None):
+    NEIGHBOURS = ("all", "cells", "verlet")
+
+    _templates = {
+        "all": "moldyn.glsl",
+        "verlet": "moldyn_verlet.glsl",
+    }
+
+    def __init__(self, consts, compute_npart=None, neighbours="all", half=False, tiled=False):
+
+        if neighbours not in self.NEIGHBOURS:
+            raise ValueError(f"Unknown neighbour search method : {neighbours}")
+        if half and neighbours != "verlet":
+            raise ValueError("Half-pair computation needs a neighbour list")
+        if tiled and neighbours != "all":
+            raise ValueError("Tiled computation is only available for all-pairs search")
+        self.neighbours = neighbours
+        self.half = half
+        self.tiled = tiled
 
         self.npart = consts["NPART"]
         self.compute_npart = compute_npart or consts["NPART"]
@@ -39,39 +80,175 @@ class ForcesComputeGPU:
         self.layout_size = int(np.ceil(self.compute_npart / self.groups_number))
 
         consts["LAYOUT_SIZE"] = self.layout_size
+        consts["ENERGIES"] = 1
 
         self.compute_npart = min(self.compute_npart, self.npart)
         self.compute_offset = 0
 
-        self.context = moderngl.create_standalone_context(require=430)
-        self.compute_shader = self.context.compute_shader(gl_util.source(os.path.dirname(__file__)+'/templates/moldyn.glsl', consts))
+        self.context = registry.context()
+        self._bindings = dict() # point de liaison -> buffer, pour les relier à nouveau (contexte partagé)
+        self._shader_consts = consts
+        if neighbours == "cells":
+            self._init_cells(consts)
+        self.compute_shader, self._gather_shader = self._compute_shaders(self._shader_consts)
+        self._forces_shaders = None # variante sans énergies potentielles, compilée à la demande
 
+        # Réduction des énergies potentielles et des liaisons, pour ne relire que deux flottants
+        self._reduce_groups = int(min(64, np.ceil(self.npart / 256)))
+        self._reduce_shader = self._shader("reduce.glsl", dict(consts, REDUCE_GROUPS=self._reduce_groups))
 
         self.consts = consts
 
         # Buffer de positions 1
-        self._BUFFER_P = self.context.buffer(reserve=2 * 4 * self.npart)
-        self._BUFFER_P.bind_to_storage_buffer(0)
+        self._BUFFER_P = self._buffer(2 * 4 * self.npart, 0)
 
         # Buffer de forces
-        self._BUFFER_F = self.context.buffer(reserve=2 * 4 * self.npart)
-        self._BUFFER_F.bind_to_storage_buffer(1)
+        self._BUFFER_F = self._buffer(2 * 4 * self.npart, 1)
 
         # Buffer d'énergies potentielles
-        self._BUFFER_E = self.context.buffer(reserve=4 * self.npart)
-        self._BUFFER_E.bind_to_storage_buffer(2)
+        self._BUFFER_E = self._buffer(4 * self.npart, 2)
 
         # Buffer de compteurs de liaisons
-        self._BUFFER_COUNT = self.context.buffer(reserve=4 * self.npart)
-        self._BUFFER_COUNT.bind_to_storage_buffer(3)
+        self._BUFFER_COUNT = self._buffer(4 * self.npart, 3)
 
         # Buffer de paramètres, inutilisé pour l'instant
-        self._BUFFER_PARAMS = self.context.buffer(reserve=4 * 5)
-        self._BUFFER_PARAMS.bind_to_storage_buffer(4)
+        self._BUFFER_PARAMS = self._buffer(4 * 5, 4)
+
+        # Buffers des sommes partielles et totales de la réduction
+        self._BUFFER_PARTIALS = self._buffer(2 * 4 * self._reduce_groups, 14)
+        self._BUFFER_TOTALS = self._buffer(2 * 4, 13)
+
+        # Buffers de la liste de voisins (et, pour les demi-paires, des résultats par paire et de la liste inverse),
+        # (ré)alloués à la demande
+        self._BUFFER_NSTART = None
+        self._BUFFER_NLIST = None
+        self._BUFFER_PAIRS = None
+        self._BUFFER_RSTART = None
+        self._BUFFER_RLIST = None
 
         self.array_shape = (self.npart, 2)
 
-    def set_pos(self, pos):
+    def _init_cells(self, consts):
+        import moderngl # pour moderngl.Error seulement, le module est déjà chargé par le contexte
+
+        grid = CellGrid(consts)
+        self.ncells = int(np.prod(grid.ncells))
+        consts = dict(consts, NCX=int(grid.ncells[0]), NCY=int(grid.ncells[1]),
+                      ORIGIN_X=float(grid.origin[0]), ORIGIN_Y=float(grid.origin[1]),
+                      CELL_SIZE_X=float(grid.size[0]), CELL_SIZE_Y=float(grid.size[1]))
+
+        self._shader_consts = consts
+        self._bin_shader = self._shader("cells_bin.glsl", consts)
+
+        # 32 ko : minimum garanti par OpenGL 4.3 (moderngl ne permet pas de lire GL_MAX_COMPUTE_SHARED_MEMORY_SIZE)
+        self.shared_scan = 4 * (self.ncells + 256) <= SHARED_MEMORY_SIZE
+        if self.shared_scan:
+            try:
+                self._scan_shader = self._shader("cells_scan.glsl", dict(consts, SHARED_COUNTS=1))
+            except moderngl.Error: # trop de mémoire partagée pour ce pilote
+                self.shared_scan = False
+        if not self.shared_scan:
+            self._scan_shader = self._shader("cells_scan.glsl", dict(consts, SHARED_COUNTS=0))
+
+        self._BUFFER_CELL_COUNT = self._buffer(4 * self.ncells, 15)
+        self._BUFFER_CELL_START = self._buffer(4 * (self.ncells + 1), 16)
+        self._BUFFER_CELL_ATOMS = self._buffer(4 * self.npart, 17)
+        self._BUFFER_ATOM_CELL = self._buffer(4 * self.npart, 18)
+
+    def _sort_cells(self):
+        # tri par comptage : nombre d'atomes par cellule, somme préfixe, rangement, puis tri de chaque cellule
+        self._BUFFER_CELL_COUNT.clear()
+        self._bin_shader["stage"].value = 0
+        self._bin_shader.run(group_x=self.groups_number)
+        self.context.memory_barrier()
+        self._scan_shader.run(group_x=1)
+        self.context.memory_barrier()
+        self._bin_shader["stage"].value = 1
+        self._bin_shader.run(group_x=self.groups_number)
+        self.context.memory_barrier()
+        self._bin_shader["stage"].value = 2
+        self._bin_shader.run(group_x=int(np.ceil(self.ncells / self.layout_size)))
+        self.context.memory_barrier()
+
+    def _compute_shaders(self, consts):
+        # shader de calcul des forces, et celui de la seconde passe pour les demi-paires
+        if self.half:
+            return self._shader("moldyn_half.glsl", consts), self._shader("moldyn_half_gather.glsl", consts)
+        if self.tiled:
+            return self._shader("moldyn_tiled.glsl", consts), None
+        if self.neighbours == "cells":
+            return self._shader("moldyn_cells.glsl", consts), None
+        return self._shader(self._templates[self.neighbours], consts), None
+
+    def _shader(self, template, consts):
+        source = gl_util.source(os.path.dirname(__file__)+'/templates/'+template, consts)
+        return registry.shader(self.context, source)
+
+    def _buffer(self, size, binding):
+        # le contexte est partagé : on relie d'abord les buffers de ce module, si un autre a relié les siens
+        self._bind()
+        buffer = self.context.buffer(reserve=size)
+        buffer.bind_to_storage_buffer(binding)
+        self._bindings[binding] = buffer
+        return buffer
+
+    def _bind(self):
+        if registry.bind(self.context, self):
+            for binding, buffer in self._bindings.items():
+                buffer.bind_to_storage_buffer(binding)
+
+    def _reserve(self, buffer, size, binding):
+        # réutilise le buffer s'il est assez grand, sinon en alloue un plus grand que nécessaire
+        if buffer is None or buffer.size < size:
+            if buffer is not None:
+                self._bindings.pop(binding, None) # ne doit plus être relié, une fois libéré
+                buffer.release()
+            buffer = self._buffer(max(4, int(1.25 * size)), binding)
+        return buffer
+
+    def release(self):
+        """
+        Frees the buffers of the compute module. The context and compiled shaders are kept for other compute modules
+        (see `backends.BackendRegistry`).
+
+        Returns
+        -------
+
+        """
+        for buffer in self._bindings.values():
+            buffer.release()
+        self._bindings.clear()
+        registry.unbind(self.context, self)
+
+    def _storage(self, buffer, data, binding):
+        data = data.tobytes()
+        buffer = self._reserve(buffer, len(data), binding)
+        buffer.write(data)
+        return buffer
+
+    def set_neighbours(self, nlist):
+        """
+        Uploads the neighbour list used when `neighbours` is `"verlet"`.
+
+        Parameters
+        ----------
+        nlist : neighbours_CPU.VerletList
+            Neighbour list.
+
+        Returns
+        -------
+
+        """
+        self._BUFFER_NSTART = self._storage(self._BUFFER_NSTART, nlist.start.astype('u4'), 5)
+        self._BUFFER_NLIST = self._storage(self._BUFFER_NLIST, nlist.nlist.astype('u4'), 6)
+
+        if self.half:
+            rstart, rlist = _transpose(nlist.start, nlist.nlist)
+            self._BUFFER_PAIRS = self._reserve(self._BUFFER_PAIRS, 4 * 4 * len(nlist.nlist), 7)
+            self._BUFFER_RSTART = self._storage(self._BUFFER_RSTART, rstart.astype('u4'), 8)
+            self._BUFFER_RLIST = self._storage(self._BUFFER_RLIST, rlist.astype('u4'), 9)
+
+    def set_pos(self, pos, energies=True):
         """
         Set position array and start computing forces.
 
@@ -79,13 +256,43 @@ class ForcesComputeGPU:
         ----------
         pos : np.ndarray
             Array of positions.
+        energies : bool
+            If `False`, potential energies are not computed (they are set to zero), only forces and bonds.
 
         Returns
         -------
 
         """
         self._BUFFER_P.write(pos.astype('f4').tobytes())
-        self.compute_shader.run(group_x=self.groups_number)
+        self.run(energies)
+
+    def run(self, energies=True):
+        """
+        Computes forces from the positions already in the GPU buffer.
+
+        Parameters
+        ----------
+        energies : bool
+            If `False`, a variant of the compute shader that does not compute potential energies is used.
+
+        Returns
+        -------
+
+        """
+        if energies:
+            compute_shader, gather_shader = self.compute_shader, self._gather_shader
+        else:
+            if self._forces_shaders is None:
+                self._forces_shaders = self._compute_shaders(dict(self._shader_consts, ENERGIES=0))
+            compute_shader, gather_shader = self._forces_shaders
+
+        self._bind()
+        if self.neighbours == "cells":
+            self._sort_cells()
+        compute_shader.run(group_x=self.groups_number)
+        if self.half:
+            self.context.memory_barrier() # la seconde passe lit les résultats de la première
+            gather_shader.run(group_x=self.groups_number)
 
     def get_F(self):
         """
@@ -115,4 +322,31 @@ class ForcesComputeGPU:
         np.ndarray
             Near atoms (one could count this as bonds).
         """
-        return np.frombuffer(self._BUFFER_COUNT.read(), dtype=np.float32)
\ No newline at end of file
+        return np.frombuffer(self._BUFFER_COUNT.read(), dtype=np.float32)
+
+    def reduce(self):
+        """
+        Sums potential energies and bonds on GPU, in a buffer that stays on GPU (see :py:meth:`get_totals`).
+
+        Returns
+        -------
+
+        """
+        self._bind()
+        self.context.memory_barrier()
+        for stage, groups in ((0, self._reduce_groups), (1, 1)):
+            self._reduce_shader["stage"].value = stage
+            self._reduce_shader.run(group_x=groups)
+            self.context.memory_barrier()
+
+    def get_totals(self):
+        """
+        Sums potential energies and bonds on GPU, so that only two floats are read back.
+
+        Returns
+        -------
+        tuple
+            Sum of computed potential energies, and sum of near atoms counts.
+        """
+        self.reduce()
+        return tuple(float(x) for x in np.frombuffer(self._BUFFER_TOTALS.read(), dtype=np.float32))
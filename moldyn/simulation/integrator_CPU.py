@@ -0,0 +1,246 @@
+# -*-encoding: utf-8 -*-
+"""
+Position-Verlet integrator compiled with numba.
+
+Several iterations (drift, periodic boundaries, inter-atomic forces, thermostat, kick) are computed in a single call to
+compiled code, state functions being written in preallocated arrays, so that the Python interpreter is not the
+bottleneck on small models.
+"""
+
+import numpy as np
+import numba
+
+from .forces_CPU import _all_iterate, _cells_iterate, _cells_iterate_half, _atom_all, _cell_atoms
+from .neighbours_CPU import _bin_atoms
+
+
+@numba.njit(nogil=True, cache=True)
+def _compute_forces(pos, lj, N_A, neighbours, half, periodic, length, origin, size, ncells, atom_cell, cell_start,
+                    cell_atoms, acc, F, PE, COUNT, energies):
+    # neighbours : 0 pour toutes les paires, 1 pour les cellules
+    if neighbours == 0:
+        _all_iterate(pos, lj, N_A, 0, pos.shape[0], periodic, length, F, PE, COUNT, energies)
+        return
+    _bin_atoms(pos, origin, size, ncells, periodic, atom_cell, cell_start, cell_atoms)
+    if half:
+        _cells_iterate_half(pos, lj, N_A, periodic, length, ncells, cell_start, cell_atoms, acc, F, PE, COUNT,
+                            energies)
+    else:
+        _cells_iterate(pos, lj, N_A, 0, pos.shape[0], periodic, length, ncells, cell_start, cell_atoms, F, PE, COUNT,
+                       energies)
+
+
+@numba.njit(nogil=True, cache=True)
+def _serial_forces(pos, lj, N_A, neighbours, periodic, length, origin, size, ncells, atom_cell, cell_start,
+                   cell_atoms, F, PE, COUNT, energies):
+    # comme _compute_forces, dans le thread appelant (pour les répliques, déjà réparties entre les threads)
+    npart = pos.shape[0]
+    if neighbours == 0:
+        for i in range(npart):
+            _atom_all(pos, i, lj, N_A, periodic, length, F, PE, COUNT, energies)
+        return
+    _bin_atoms(pos, origin, size, ncells, periodic, atom_cell, cell_start, cell_atoms)
+    neigh = np.empty((9,), dtype=np.int64)
+    for c in range(cell_start.shape[0] - 1):
+        _cell_atoms(pos, c, lj, N_A, 0, npart, periodic, length, ncells, cell_start, cell_atoms, neigh, F, PE, COUNT,
+                    energies)
+
+
+@numba.njit(nogil=True, cache=True)
+def _drift(pos, v, dt2, periodic, lim_inf, lim_sup, length):
+    # half drift, puis conditions périodiques de bord, seulement selon le(s) axe(s) spécifié(s)
+    for i in range(pos.shape[0]):
+        for a in range(2):
+            pos[i, a] += v[i, a] * dt2
+            if periodic[a]:
+                if pos[i, a] < lim_inf[a]:
+                    pos[i, a] += length[a]
+                elif pos[i, a] > lim_sup[a]:
+                    pos[i, a] -= length[a]
+
+
+@numba.njit(nogil=True, cache=True)
+def _kinetic(pos, v, m, rotative, y_middle):
+    # énergie cinétique microscopique (sans le mouvement d'ensemble)
+    npart = pos.shape[0]
+    v_avg_x = 0.0
+    v_avg_y = 0.0
+    rot = 0.0
+    for i in range(npart):
+        v_avg_x += v[i, 0]
+        v_avg_y += v[i, 1]
+        if rotative:
+            rot += v[i, 0] / (pos[i, 1] - y_middle)
+    v_avg_x /= npart
+    v_avg_y /= npart
+    rot /= npart
+
+    EC = 0.0
+    for i in range(npart):
+        dvx = v[i, 0] - v_avg_x
+        if rotative:
+            dvx -= rot * (pos[i, 1] - y_middle)
+        dvy = v[i, 1] - v_avg_y
+        EC += m[i, 0] * dvx * dvx + m[i, 1] * dvy * dvy
+    return 0.5 * EC
+
+
+@numba.njit(nogil=True, cache=True)
+def _kick(pos, v, F, m, block, dt, dt2, scale, up_forces, up_force, up_limit):
+    # kick, puis half drift
+    for i in range(pos.shape[0]):
+        for a in range(2):
+            f = F[i, a]
+            if up_forces and pos[i, 1] > up_limit:
+                f += up_force[a]
+            v[i, a] = (v[i, a] + f * dt / m[i, a]) * scale * block[i]
+            pos[i, a] += v[i, a] * dt2
+
+
+@numba.njit(nogil=True, cache=True)
+def _record(PE, COUNT, npart, EC, T, j, out_EC, out_EP, out_T, out_bonds):
+    EP = 0.0
+    bonds = 0.0
+    for i in range(npart):
+        EP += PE[i]
+        bonds += COUNT[i]
+
+    out_EC[j] = EC
+    out_T[j] = T
+    out_EP[j] = 0.5 * EP
+    out_bonds[j] = 0.5 * bonds / npart
+
+
+@numba.njit(nogil=True, cache=True)
+def _run(n, sampled, pos, v, m, block, dt, gamma, knparts, lim_inf, lim_sup, T_cntl, T_v, up_forces, up_force, up_limit,
+         rotative, y_middle, lj, N_A, neighbours, half, periodic, length, origin, size, ncells, atom_cell, cell_start,
+         cell_atoms, acc, F, PE, COUNT, out_EC, out_EP, out_T, out_bonds):
+    npart = pos.shape[0]
+    dt2 = 0.5 * dt
+    j = 0 # nombre d'itérations échantillonnées
+    for k in range(n):
+        _drift(pos, v, dt2, periodic, lim_inf, lim_sup, length)
+
+        _compute_forces(pos, lj, N_A, neighbours, half, periodic, length, origin, size, ncells, atom_cell,
+                        cell_start, cell_atoms, acc, F, PE, COUNT, sampled[k])
+
+        # Énergie cinétique et température
+        EC = _kinetic(pos, v, m, rotative, y_middle)
+        T = EC / knparts
+
+        if sampled[k]:
+            _record(PE, COUNT, npart, EC, T, j, out_EC, out_EP, out_T, out_bonds)
+            j += 1
+
+        # Thermostat
+        scale = np.sqrt(1 + gamma * (T_v[k] / T - 1)) if T_cntl else 1.0
+
+        _kick(pos, v, F, m, block, dt, dt2, scale, up_forces, up_force[k], up_limit)
+
+
+@numba.njit(nogil=True, parallel=True, cache=True)
+def _run_replicas(n, sampled, pos, v, m, block, dt, gamma, knparts, lim_inf, lim_sup, T_cntl, T_v, up_forces, up_force,
+                  up_limit, rotative, y_middle, lj, N_A, neighbours, periodic, length, origin, size, ncells, atom_cell,
+                  cell_start, cell_atoms, F, PE, COUNT, out_EC, out_EP, out_T, out_bonds):
+    # même schéma que _run, chaque réplique (premier indice des tableaux) étant calculée par un thread
+    npart = pos.shape[1]
+    dt2 = 0.5 * dt
+    for r in numba.prange(pos.shape[0]):
+        j = 0
+        for k in range(n):
+            _drift(pos[r], v[r], dt2, periodic, lim_inf, lim_sup, length)
+
+            _serial_forces(pos[r], lj, N_A, neighbours, periodic, length, origin, size, ncells, atom_cell[r],
+                           cell_start[r], cell_atoms[r], F[r], PE[r], COUNT[r], sampled[k])
+
+            EC = _kinetic(pos[r], v[r], m, rotative, y_middle)
+            T = EC / knparts
+
+            if sampled[k]:
+                _record(PE[r], COUNT[r], npart, EC, T, j, out_EC[r], out_EP[r], out_T[r], out_bonds[r])
+                j += 1
+
+            scale = np.sqrt(1 + gamma * (T_v[k] / T - 1)) if T_cntl else 1.0
+
+            _kick(pos[r], v[r], F[r], m, block[r], dt, dt2, scale, up_forces, up_force[k], up_limit)
+
+
+class IntegratorCPU:
+    """
+    Integrator that runs several iterations per call in compiled code.
+
+    Uses the kernels of the `"numba"` engine of the compute module, with `"all"` or `"cells"` neighbours.
+
+    Parameters
+    ----------
+    compute : ForcesComputeCPU
+        Compute module whose parameters and buffers (forces, potential energies, bonds) are reused.
+    model : builder.Model
+        Simulated model.
+
+    Attributes
+    ----------
+    compute : ForcesComputeCPU
+        Compute module.
+    """
+
+    def __init__(self, compute, model):
+        if compute.engine != "numba" or compute.neighbours == "verlet":
+            raise ValueError("Compiled iterations need the numba engine, with all pairs or cells")
+        if compute.compute_offset or compute.compute_npart < compute.npart:
+            raise ValueError("Compiled iterations need all atoms to be computed")
+
+        self.compute = compute
+        self.model = model
+
+        apply_up_zone_forces = model.up_apply_force_x or model.up_apply_force_y
+        self.up_forces = bool(apply_up_zone_forces)
+        self.rotative = bool(apply_up_zone_forces and not model.y_periodic)
+
+        acc = getattr(compute, "_acc", None)
+        self._acc = acc if acc is not None else np.zeros((1, 1, 4))
+
+    def run(self, n, block, T_cntl, T_v, up_force, sampled):
+        """
+        Computes `n` iterations on the model.
+
+        Parameters
+        ----------
+        n : int
+            Number of iterations.
+        block : np.ndarray
+            For each atom, `1.0` if it may move, `0.0` if it is blocked.
+        T_cntl : bool
+            Specifies if temperature is controlled.
+        T_v : np.ndarray
+            Temperature set point at each iteration.
+        up_force : np.ndarray
+            External force applied to atoms of the upper zone at each iteration.
+        sampled : np.ndarray
+            For each iteration, `True` if state functions are recorded. Potential energies are only computed for those
+            iterations.
+
+        Returns
+        -------
+        tuple
+            Kinetic energy, potential energy, temperature and bonds at each sampled iteration (as `np.ndarray`).
+        """
+        model = self.model
+        compute = self.compute
+        grid = compute._grid
+        out = tuple(np.empty((int(np.count_nonzero(sampled)),)) for _ in range(4))
+
+        threads = numba.get_num_threads()
+        numba.set_num_threads(compute.threads)
+        try:
+            _run(n, np.asarray(sampled, dtype=np.bool_), model.pos, model.v, model.m, block, model.dt, model.gamma, model.kB * model.npart,
+                 np.asarray(model.lim_inf, dtype=np.float64), np.asarray(model.lim_sup, dtype=np.float64),
+                 bool(T_cntl), T_v, self.up_forces, up_force, float(model.up_zone_lower_limit), self.rotative,
+                 0.5 * (model.y_lim_sup + model.y_lim_inf), compute._lj, compute.consts["N_A"],
+                 int(compute.neighbours == "cells"), compute.half, grid.periodic, grid.length, grid.origin, grid.size,
+                 grid.ncells, grid.atom_cell, grid.cell_start, grid.cell_atoms, self._acc, compute._F, compute._PE,
+                 compute._COUNT, *out)
+        finally:
+            numba.set_num_threads(threads)
+
+        return out
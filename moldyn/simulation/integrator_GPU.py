@@ -0,0 +1,220 @@
+# -*-encoding: utf-8 -*-
+"""
+Position-Verlet integrator running on GPU.
+
+Positions and speeds stay in GPU buffers from one iteration to the next : drift, periodic boundaries, inter-atomic
+forces, thermostat and kick are all computed by compute shaders, and the host only reads results back when asked to.
+State functions of each iteration are recorded in a GPU buffer, and read back all at once.
+"""
+
+import numpy as np
+
+
+class IntegratorGPU:
+    """
+    Integrator that keeps the whole state of the model on GPU.
+
+    Works in single precision, like the compute shaders.
+
+    Parameters
+    ----------
+    compute : ForcesComputeGPU
+        Compute module whose context and buffers (positions, forces, potential energies, bonds) are reused.
+    model : builder.Model
+        Simulated model.
+
+    Attributes
+    ----------
+    compute : ForcesComputeGPU
+        Compute module running the inter-atomic forces shader.
+    """
+
+    def __init__(self, compute, model):
+        self.compute = compute
+        self.npart = compute.npart
+        self.knparts = model.kB * model.npart
+        self.model = model
+
+        apply_up_zone_forces = model.up_apply_force_x or model.up_apply_force_y
+
+        consts = dict(compute.consts)
+        consts["KNPARTS"] = model.kB * model.npart
+        consts["UP_FORCES"] = int(bool(apply_up_zone_forces))
+        consts["ROTATIVE"] = int(bool(apply_up_zone_forces and not model.y_periodic))
+
+        self._drift_shader = compute._shader("drift.glsl", consts)
+        self._thermo_shader = compute._shader("thermo.glsl", consts)
+        self._kick_shader = compute._shader("kick.glsl", consts)
+        self._record_shader = compute._shader("record.glsl", consts)
+
+        # Buffers créés par le module de calcul, qui les relie à nouveau si un autre module a partagé son contexte
+        # Buffer de vitesses
+        self._BUFFER_V = compute._buffer(2 * 4 * self.npart, 10)
+
+        # Buffer des atomes bloqués
+        self._BUFFER_BLOCK = compute._buffer(4 * self.npart, 11)
+
+        # Buffer d'état : vitesse moyenne, terme de rotation, énergie cinétique microscopique
+        self._BUFFER_STATE = compute._buffer(4 * 4, 12)
+
+        # Buffer des fonctions d'état enregistrées à chaque itération, (ré)alloué à la demande
+        self._BUFFER_RECORDS = None
+
+    @staticmethod
+    def _uniform(shader, name, value):
+        try:
+            shader[name].value = value
+        except KeyError: # variable inutilisée, supprimée par le compilateur
+            pass
+
+    def upload(self, pos, v, block):
+        """
+        Sends the state of the model to the GPU.
+
+        Parameters
+        ----------
+        pos : np.ndarray
+            Array of positions.
+        v : np.ndarray
+            Array of speeds.
+        block : np.ndarray
+            For each atom, `True` if it may move, `False` if it is blocked.
+
+        Returns
+        -------
+
+        """
+        self.compute._BUFFER_P.write(pos.astype('f4').tobytes())
+        self._BUFFER_V.write(v.astype('f4').tobytes())
+        self._BUFFER_BLOCK.write(np.asarray(block, dtype='f4').tobytes())
+
+    def step(self, T_v, thermostat, up_force, energies=True):
+        """
+        Computes one iteration.
+
+        Parameters
+        ----------
+        T_v : float
+            Temperature set point.
+        thermostat : bool
+            Specifies if temperature is controlled.
+        up_force : array
+            External force applied to atoms of the upper zone.
+        energies : bool
+            If `False`, potential energies are not computed.
+
+        Returns
+        -------
+
+        """
+        context = self.compute.context
+        groups_number = self.compute.groups_number
+
+        self.compute._bind()
+        self._drift_shader.run(group_x=groups_number)
+        context.memory_barrier()
+
+        self.compute.run(energies)
+        context.memory_barrier()
+
+        for stage in range(2):
+            self._uniform(self._thermo_shader, "stage", stage)
+            self._thermo_shader.run(group_x=1)
+            context.memory_barrier()
+
+        self._uniform(self._kick_shader, "T_v", T_v)
+        self._uniform(self._kick_shader, "thermostat", int(bool(thermostat)))
+        self._uniform(self._kick_shader, "up_force", tuple(up_force))
+        self._kick_shader.run(group_x=groups_number)
+        context.memory_barrier()
+
+    def record(self, index):
+        """
+        Sums potential energies and bonds of the last iteration, and records them with kinetic energy.
+
+        Parameters
+        ----------
+        index : int
+            Index of the record in the buffer (see :py:meth:`run`).
+
+        Returns
+        -------
+
+        """
+        self.compute.reduce()
+        self._uniform(self._record_shader, "index", index)
+        self._record_shader.run(group_x=1)
+
+    def download(self, pos, v):
+        """
+        Reads positions and speeds back from the GPU.
+
+        Parameters
+        ----------
+        pos : np.ndarray
+            Array in which positions are written.
+        v : np.ndarray
+            Array in which speeds are written.
+
+        Returns
+        -------
+
+        """
+        pos[:, :] = np.frombuffer(self.compute._BUFFER_P.read(), dtype=np.float32).reshape(pos.shape)
+        v[:, :] = np.frombuffer(self._BUFFER_V.read(), dtype=np.float32).reshape(v.shape)
+
+    def get_EC(self):
+        """
+
+        Returns
+        -------
+        float
+            Microscopic kinetic energy computed at last iteration, before kick.
+        """
+        return float(np.frombuffer(self._BUFFER_STATE.read(), dtype=np.float32)[3])
+
+    def run(self, n, block, T_cntl, T_v, up_force, sampled):
+        """
+        Computes `n` iterations on the model : its positions and speeds are uploaded, and read back at the end.
+
+        Parameters
+        ----------
+        n : int
+            Number of iterations.
+        block : np.ndarray
+            For each atom, `1.0` if it may move, `0.0` if it is blocked.
+        T_cntl : bool
+            Specifies if temperature is controlled.
+        T_v : np.ndarray
+            Temperature set point at each iteration.
+        up_force : np.ndarray
+            External force applied to atoms of the upper zone at each iteration.
+        sampled : np.ndarray
+            For each iteration, `True` if state functions are recorded. Potential energies are only computed for those
+            iterations.
+
+        Returns
+        -------
+        tuple
+            Kinetic energy, potential energy, temperature and bonds at each sampled iteration (as `np.ndarray`).
+        """
+        model = self.model
+        records_number = int(np.count_nonzero(sampled))
+        self._BUFFER_RECORDS = self.compute._reserve(self._BUFFER_RECORDS, 4 * 4 * max(1, records_number), 19)
+
+        self.upload(model.pos, model.v, block)
+        j = 0
+        for i in range(n):
+            self.step(T_v[i], T_cntl, up_force[i], sampled[i])
+            if sampled[i]:
+                self.record(j)
+                j += 1
+        self.compute.context.memory_barrier()
+        self.download(model.pos, model.v)
+
+        records = np.zeros((records_number, 4), dtype=np.float32)
+        if records_number:
+            records[:] = np.frombuffer(self._BUFFER_RECORDS.read(size=4 * 4 * records_number),
+                                       dtype=np.float32).reshape((records_number, 4))
+        EC = records[:, 0].astype(np.float64)
+        return EC, 0.5 * records[:, 1], EC / self.knparts, 0.5 / self.npart * records[:, 2]
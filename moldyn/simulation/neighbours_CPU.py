@@ -0,0 +1,303 @@
+# -*-encoding: utf-8 -*-
+"""
+Neighbour search structures for the CPU compute module.
+
+Atoms are binned into a grid of cells at least as wide as the largest cut-off radius, so that two interacting atoms
+are always in the same cell or in adjacent ones (periodic boundaries being taken in account).
+"""
+
+import numpy as np
+import numba
+
+
+@numba.njit(nogil=True, cache=True)
+def _min_image(d, periodic, length):
+    if periodic:
+        if d < (-0.5 * length):
+            d += length
+        if d > 0.5 * length:
+            d -= length
+    return d
+
+
+@numba.njit(nogil=True, cache=True)
+def _cell_coord(x, origin, size, n, periodic):
+    c = int(np.floor((x - origin) / size))
+    if periodic:
+        c = c % n
+    elif c < 0: # hors de la boîte : on range l'atome dans la cellule du bord
+        c = 0
+    elif c >= n:
+        c = n - 1
+    return c
+
+
+@numba.njit(nogil=True, cache=True)
+def _bin_atoms(pos, origin, size, ncells, periodic, atom_cell, cell_start, cell_atoms):
+    # tri par comptage : cell_atoms[cell_start[c]:cell_start[c+1]] contient les atomes de la cellule c
+    ncx = ncells[0]
+    cell_start[:] = 0
+    for i in range(pos.shape[0]):
+        cx = _cell_coord(pos[i, 0], origin[0], size[0], ncells[0], periodic[0])
+        cy = _cell_coord(pos[i, 1], origin[1], size[1], ncells[1], periodic[1])
+        c = cy * ncx + cx
+        atom_cell[i] = c
+        cell_start[c + 1] += 1
+
+    for c in range(cell_start.shape[0] - 1):
+        cell_start[c + 1] += cell_start[c]
+
+    fill = cell_start[:-1].copy()
+    for i in range(pos.shape[0]): # les atomes restent triés par indice à l'intérieur d'une cellule
+        c = atom_cell[i]
+        cell_atoms[fill[c]] = i
+        fill[c] += 1
+
+
+@numba.njit(nogil=True, cache=True)
+def _neighbour_cells(c, ncells, periodic, out):
+    """
+    Fills `out` with the indices of cell `c` and its neighbours, each one appearing only once (small periodic grids
+    would otherwise visit the same cell several times). Returns the number of cells written.
+    """
+    ncx = ncells[0]
+    ncy = ncells[1]
+    cx = c % ncx
+    cy = c // ncx
+
+    nx = min(3, ncx) if periodic[0] else 3
+    ny = min(3, ncy) if periodic[1] else 3
+
+    k = 0
+    for oy in range(ny):
+        y = cy - 1 + oy
+        if periodic[1]:
+            y = y % ncy
+        elif y < 0 or y >= ncy:
+            continue
+        for ox in range(nx):
+            x = cx - 1 + ox
+            if periodic[0]:
+                x = x % ncx
+            elif x < 0 or x >= ncx:
+                continue
+            out[k] = y * ncx + x
+            k += 1
+    return k
+
+
+class CellGrid:
+    """
+    Grid of cells covering the simulation box, used to find neighbouring atoms in linear time.
+
+    Along a non periodic axis, atoms that left the box are kept in the border cells : results stay exact, but the
+    search slows down if many atoms escape.
+
+    Parameters
+    ----------
+    consts : dict
+        Dictionary containing constants used for calculations (see `ForcesComputeGPU`).
+    rcut : float
+        Minimum width of a cell. Defaults to the largest cut-off radius.
+
+    Attributes
+    ----------
+    ncells : np.ndarray
+        Number of cells along x and y axis.
+    size : np.ndarray
+        Width of a cell along x and y axis.
+    cell_start : np.ndarray
+        Atoms of cell `c` are :code:`cell_atoms[cell_start[c]:cell_start[c+1]]`.
+    cell_atoms : np.ndarray
+        Atom indices, sorted by cell.
+    atom_cell : np.ndarray
+        Cell of each atom.
+    """
+
+    def __init__(self, consts, rcut=None):
+        if rcut is None:
+            rcut = max(consts["RCUT_A"], consts["RCUT_B"], consts["RCUT_AB"])
+
+        npart = consts["NPART"]
+        length = np.array((consts["LENGTH_X"], consts["LENGTH_Y"]), dtype=np.float64)
+
+        self.rcut = rcut
+        self.origin = np.array((consts["X_LIM_INF"], consts["Y_LIM_INF"]), dtype=np.float64)
+        self.periodic = np.array((consts["X_PERIODIC"], consts["Y_PERIODIC"]), dtype=np.bool_)
+        self.length = length
+
+        self.ncells = np.maximum(1, length // rcut).astype(np.int64)
+        self.size = np.where(length > 0, length / self.ncells, rcut) # boîte dégénérée : une seule cellule
+
+        self.cell_start = np.zeros((int(np.prod(self.ncells)) + 1,), dtype=np.int64)
+        self.cell_atoms = np.zeros((npart,), dtype=np.int64)
+        self.atom_cell = np.zeros((npart,), dtype=np.int64)
+
+    def bin(self, pos):
+        """
+        Sorts atoms by cell.
+
+        Parameters
+        ----------
+        pos : np.ndarray
+            Array of positions.
+        """
+        _bin_atoms(pos, self.origin, self.size, self.ncells, self.periodic,
+                   self.atom_cell, self.cell_start, self.cell_atoms)
+
+
+@numba.njit(nogil=True, cache=True)
+def _build_verlet(pos, rcut, N_A, skin, half, periodic, length, ncells, cell_start, cell_atoms, atom_cell):
+    # deux passes : on compte les voisins de chaque atome, puis on remplit la liste (format CSR)
+    npart = pos.shape[0]
+    start = np.zeros((npart + 1,), dtype=np.int64)
+    neigh = np.empty((9,), dtype=np.int64)
+
+    for fill in range(2):
+        if fill:
+            for i in range(npart):
+                start[i + 1] += start[i]
+            nlist = np.empty((start[npart],), dtype=np.int64)
+            k = start[:-1].copy()
+        else:
+            nlist = np.empty((0,), dtype=np.int64)
+            k = np.empty((0,), dtype=np.int64)
+
+        for i in range(npart):
+            si = 0 if i < N_A else 1
+            nn = _neighbour_cells(atom_cell[i], ncells, periodic, neigh)
+            for c in range(nn):
+                c2 = neigh[c]
+                for b in range(cell_start[c2], cell_start[c2 + 1]):
+                    j = cell_atoms[b]
+                    if i == j or (half and j < i):
+                        continue
+                    sj = 0 if j < N_A else 1
+                    r = rcut[si, sj] + skin
+                    dx = _min_image(pos[i, 0] - pos[j, 0], periodic[0], length[0])
+                    dy = _min_image(pos[i, 1] - pos[j, 1], periodic[1], length[1])
+                    if dx * dx + dy * dy < r * r:
+                        if fill:
+                            nlist[k[i]] = j
+                            k[i] += 1
+                        else:
+                            start[i + 1] += 1
+    return start, nlist
+
+
+@numba.njit(nogil=True, cache=True)
+def _transpose(start, nlist):
+    # liste "inverse" : rlist[rstart[j]:rstart[j+1]] sont les positions k dans nlist telles que nlist[k] == j
+    npart = start.shape[0] - 1
+    rstart = np.zeros((npart + 1,), dtype=np.int64)
+    for k in range(nlist.shape[0]):
+        rstart[nlist[k] + 1] += 1
+    for j in range(npart):
+        rstart[j + 1] += rstart[j]
+    rlist = np.empty((nlist.shape[0],), dtype=np.int64)
+    fill = rstart[:-1].copy()
+    for k in range(nlist.shape[0]):
+        j = nlist[k]
+        rlist[fill[j]] = k
+        fill[j] += 1
+    return rstart, rlist
+
+
+@numba.njit(nogil=True, cache=True)
+def _max_displacement(pos, ref, periodic, length):
+    d2 = 0.0
+    for i in range(pos.shape[0]):
+        dx = _min_image(pos[i, 0] - ref[i, 0], periodic[0], length[0])
+        dy = _min_image(pos[i, 1] - ref[i, 1], periodic[1], length[1])
+        d2 = max(d2, dx * dx + dy * dy)
+    return np.sqrt(d2)
+
+
+class VerletList:
+    """
+    Verlet neighbour list : for each atom, the atoms closer than the cut-off radius plus a skin distance.
+
+    The list stays valid as long as no atom moved by more than half the skin since it was built, so it only needs to
+    be rebuilt every few iterations (see :py:meth:`update`).
+
+    Parameters
+    ----------
+    consts : dict
+        Dictionary containing constants used for calculations (see `ForcesComputeGPU`).
+    skin : float
+        Skin distance added to the cut-off radii.
+    half : bool
+        If `True`, each pair is only stored once (neighbours of atom `i` are the atoms `j>i`), for compute kernels that
+        apply Newton's third law.
+
+    Attributes
+    ----------
+    start : np.ndarray
+        Neighbours of atom `i` are :code:`nlist[start[i]:start[i+1]]`.
+    nlist : np.ndarray
+        Neighbour indices.
+    builds : int
+        Number of times the list was built.
+    updates : int
+        Number of calls to :py:meth:`update`.
+    """
+
+    def __init__(self, consts, skin, half=False):
+        self.skin = skin
+        self.half = half
+        self.N_A = consts["N_A"]
+        self.rcut = np.array(((consts["RCUT_A"], consts["RCUT_AB"]), (consts["RCUT_AB"], consts["RCUT_B"])),
+                             dtype=np.float64)
+        self.grid = CellGrid(consts, max(consts["RCUT_A"], consts["RCUT_B"], consts["RCUT_AB"]) + skin)
+
+        self.ref_pos = None
+        self.start = np.zeros((consts["NPART"] + 1,), dtype=np.int64)
+        self.nlist = np.zeros((0,), dtype=np.int64)
+
+        self.builds = 0
+        self.updates = 0
+
+    def build(self, pos):
+        """
+        Builds the list from scratch.
+
+        Parameters
+        ----------
+        pos : np.ndarray
+            Array of positions.
+        """
+        grid = self.grid
+        grid.bin(pos)
+        self.start, self.nlist = _build_verlet(pos, self.rcut, self.N_A, self.skin, self.half, grid.periodic,
+                                               grid.length, grid.ncells, grid.cell_start, grid.cell_atoms,
+                                               grid.atom_cell)
+        self.ref_pos = np.array(pos, dtype=np.float64)
+        self.builds += 1
+
+    def update(self, pos):
+        """
+        Rebuilds the list if an atom moved by more than half the skin since last build.
+
+        Parameters
+        ----------
+        pos : np.ndarray
+            Array of positions.
+
+        Returns
+        -------
+        bool
+            `True` if the list was rebuilt.
+        """
+        self.updates += 1
+        if self.ref_pos is None or \
+                _max_displacement(pos, self.ref_pos, self.grid.periodic, self.grid.length) > 0.5 * self.skin:
+            self.build(pos)
+            return True
+        return False
+
+    @property
+    def rebuild_rate(self):
+        """
+        float : Fraction of updates that led to a rebuild.
+        """
+        return self.builds / max(1, self.updates)
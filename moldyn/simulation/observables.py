@@ -0,0 +1,221 @@
+# -*-encoding: utf-8 -*-
+"""
+Storage of state functions (temperature, energies, bonds...) recorded at each iteration.
+
+Values are kept in growable numpy arrays rather than in Python lists, and can be spilled to disk by chunks for very long
+simulations.
+"""
+
+import os
+import numpy as np
+
+# fonctions d'état enregistrées à chaque itération (les autres entrées de Simulation.state_fct sont des consignes)
+SERIES = ("T", "T_ctrl", "EC", "EP", "ET", "bonds", "time", "iters")
+
+
+class Series:
+    """
+    Growable array of floats, that can be used (mostly) like a list.
+
+    The array doubles its capacity when full, so appending is done in amortized constant time. If a spill file is set
+    (see :py:meth:`spill_to`), values are written to it by chunks, and only the last chunk is kept in memory.
+
+    Parameters
+    ----------
+    values : iterable
+        Initial values.
+
+    Example
+    -------
+    .. code-block:: python
+
+        T = Series()
+        T.append(300.0)
+        T.extend(np.ones(10))
+        T[-1], len(T), np.mean(T)
+    """
+
+    def __init__(self, values=()):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        self._buf = np.empty((max(16, len(values)),))
+        self._buf[:len(values)] = values
+        self._n = len(values) # nombre de valeurs en mémoire
+        self._spilled = 0 # nombre de valeurs écrites dans le fichier
+        self._spill = None
+        self.chunk = None
+
+    def spill_to(self, path, chunk=2**20):
+        """
+        Sets a file to which values are written by chunks, to limit memory use.
+
+        Parameters
+        ----------
+        path : str
+            Path of the spill file (raw float64 values). It is overwritten.
+        chunk : int
+            Number of values kept in memory before being written to the file.
+        """
+        if self._spilled:
+            raise ValueError("Values were already spilled to another file")
+        self._spill = path
+        self.chunk = chunk
+        with open(path, "wb"):
+            pass
+        self._spilled = 0
+        self._flush()
+
+    def _flush(self):
+        if self._spill is not None and self._n >= self.chunk:
+            with open(self._spill, "ab") as file:
+                self._buf[:self._n].tofile(file)
+            self._spilled += self._n
+            self._n = 0
+
+    def _reserve(self, n):
+        if n > len(self._buf):
+            buf = np.empty((max(n, 2 * len(self._buf)),))
+            buf[:self._n] = self._buf[:self._n]
+            self._buf = buf
+
+    def append(self, x):
+        """
+        Appends a value.
+
+        Parameters
+        ----------
+        x : float
+        """
+        self._reserve(self._n + 1)
+        self._buf[self._n] = x
+        self._n += 1
+        self._flush()
+
+    def extend(self, values):
+        """
+        Appends several values.
+
+        Parameters
+        ----------
+        values : iterable
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        self._reserve(self._n + len(values))
+        self._buf[self._n:self._n + len(values)] = values
+        self._n += len(values)
+        self._flush()
+
+    def clear(self):
+        """
+        Removes all values.
+        """
+        self._n = 0
+        self._spilled = 0
+        if self._spill is not None:
+            self.spill_to(self._spill, self.chunk)
+
+    @property
+    def array(self):
+        """
+        np.ndarray : All values. Without a spill file, this is a view on the internal buffer : it should not be kept
+        across appends.
+        """
+        if not self._spilled:
+            return self._buf[:self._n]
+        spilled = np.memmap(self._spill, dtype=np.float64, mode="r", shape=(self._spilled,))
+        return np.concatenate((spilled, self._buf[:self._n]))
+
+    def __len__(self):
+        return self._spilled + self._n
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return self.array[item]
+        n = len(self)
+        if item < 0:
+            item += n
+        if not 0 <= item < n:
+            raise IndexError("Series index out of range")
+        if item >= self._spilled:
+            return float(self._buf[item - self._spilled])
+        return float(np.memmap(self._spill, dtype=np.float64, mode="r", shape=(self._spilled,))[item])
+
+    def __iter__(self):
+        return iter(self.array.tolist())
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self.array, dtype=dtype)
+
+    def __eq__(self, other):
+        return len(self) == len(other) and bool(np.all(self.array == np.asarray(other)))
+
+    def __repr__(self):
+        return f"Series({self.array!r})"
+
+    def get_state(self):
+        """
+        State of the series, to save a checkpoint (see `runner.Simulation.checkpoint`).
+
+        Returns
+        -------
+        tuple
+            Spill file (or `None`), number of values already written to it, chunk size and values kept in memory.
+        """
+        return self._spill, self._spilled, self.chunk, self._buf[:self._n].copy()
+
+    @classmethod
+    def from_state(cls, spill, spilled, chunk, values):
+        """
+        Restores a series from a checkpoint. Values written to the spill file after the checkpoint are discarded.
+
+        Parameters
+        ----------
+        spill : str
+            Spill file, or `None`.
+        spilled : int
+            Number of values written to the spill file when the checkpoint was saved.
+        chunk : int
+            Number of values kept in memory.
+        values : np.ndarray
+            Values kept in memory when the checkpoint was saved.
+
+        Returns
+        -------
+        Series
+        """
+        series = cls(values)
+        if spill is not None:
+            with open(spill, "r+b") as file:
+                file.truncate(8 * spilled)
+            series._spill = spill
+            series._spilled = spilled
+            series.chunk = chunk
+        return series
+
+    def tolist(self):
+        """
+
+        Returns
+        -------
+        list
+            All values, as a list of floats.
+        """
+        return self.array.tolist()
+
+
+def spill_state_fct(state_fct, directory, chunk=2**20):
+    """
+    Sets a spill file for each series of a state function dictionary (see `Series.spill_to`).
+
+    Parameters
+    ----------
+    state_fct : dict
+        State functions (see `runner.Simulation`).
+    directory : str
+        Directory of the spill files, named after the state functions.
+    chunk : int
+        Number of values kept in memory for each state function.
+    """
+    os.makedirs(directory, exist_ok=True)
+    for key, value in state_fct.items():
+        if isinstance(value, Series):
+            value.spill_to(os.path.join(directory, key + ".f8"), chunk)
@@ -0,0 +1,171 @@
+# -*-encoding: utf-8 -*-
+"""
+Wall-clock time spent in each phase of the iterations of a simulation, to tell whether a run is limited by the
+computation of forces, by transfers between the compute module and Python, or by Python code itself.
+
+Profiling is enabled with :code:`Simulation(model, profile=True)` ; it is disabled by default, and then costs one test
+per phase and per iteration.
+
+Example
+-------
+.. code-block:: python
+
+    simulation = Simulation(model, profile=True)
+    simulation.iter(1000)
+    print(simulation.profiler.report())
+    dynstate.save_timings(simulation.profiler.summary())
+"""
+
+import time
+
+# phases d'une itération, dans l'ordre où elles sont calculées
+PHASES = ("setup", "drift", "wrap", "neighbours", "set_pos", "thermostat", "get_F", "kick", "readback", "record",
+          "set_points", "integrator", "callback", "checkpoint")
+
+# ce qui limite la simulation, selon les phases où le temps est passé : set_pos copie les positions et lance le calcul
+# des forces (dans un thread sur CPU), get_F attend qu'il soit terminé
+GROUPS = {
+    "compute": ("get_F", "integrator"),
+    "transfer": ("set_pos", "readback"),
+    "python": ("setup", "drift", "wrap", "neighbours", "thermostat", "kick", "record", "set_points"),
+    "callback": ("callback", "checkpoint"),
+}
+
+
+class StepProfiler:
+    """
+    Accumulates the wall-clock time spent in each phase of the iterations of a `runner.Simulation` :
+
+        - `"drift"`, `"wrap"`, `"kick"` : half drifts, periodic boundaries, kick (with the thermostat applied).
+        - `"neighbours"` : update of the neighbour list.
+        - `"set_pos"` : positions sent to the compute module, which starts computing forces (software rasterizers
+          compute them right away).
+        - `"thermostat"` : kinetic energy and temperature, masks of the upper zone (while forces are computed).
+        - `"get_F"` : wait for the forces, and read them.
+        - `"readback"` : sums of potential energies and bonds read from the compute module.
+        - `"record"` : state functions appended.
+        - `"set_points"`, `"integrator"` : set points, and batches of iterations in resident mode (see
+          `runner.Simulation`).
+        - `"callback"`, `"checkpoint"`.
+        - `"setup"` : preparation of each call to `runner.Simulation.iter`.
+
+    Parameters
+    ----------
+    npart : int
+        Number of atoms.
+    backend : str
+        `"cpu"` or `"gpu"`, where forces are computed.
+
+    Attributes
+    ----------
+    times : dict
+        Time spent in each phase (in s).
+    iterations : int
+        Number of iterations profiled.
+    """
+
+    def __init__(self, npart, backend="cpu"):
+        self.npart = npart
+        self.backend = backend
+        self._last = time.perf_counter()
+        self.reset()
+
+    def reset(self):
+        """
+        Forgets the accumulated times.
+
+        Returns
+        -------
+
+        """
+        self.times = dict.fromkeys(PHASES, 0.0)
+        self.iterations = 0
+
+    def start(self):
+        """
+        Starts timing : the next call to :py:meth:`lap` measures the time elapsed since.
+
+        Returns
+        -------
+
+        """
+        self._last = time.perf_counter()
+
+    def lap(self, phase):
+        """
+        Adds the time elapsed since the last call (or since :py:meth:`start`) to `phase`.
+
+        Parameters
+        ----------
+        phase : str
+            Phase that just ended.
+
+        Returns
+        -------
+
+        """
+        now = time.perf_counter()
+        self.times[phase] += now - self._last
+        self._last = now
+
+    @property
+    def total(self):
+        """
+        float : Total time profiled (in s).
+        """
+        return sum(self.times.values())
+
+    @property
+    def atom_steps_per_second(self):
+        """
+        float : Number of atoms times number of iterations, computed per second.
+        """
+        total = self.total
+        return self.npart * self.iterations / total if total else 0.0
+
+    def summary(self):
+        """
+
+        Returns
+        -------
+        dict
+            Times by phase and by group of phases (compute, transfer, Python code, callback), in s, fraction of the
+            total time spent in each group, group that limits the simulation (`"bound"`, callbacks excluded), number
+            of iterations and of atoms, and atom-steps per second. Can be saved as json (see
+            `moldyn.utils.data_mng.DynState.save_timings`).
+        """
+        total = self.total
+        groups = {group: sum(self.times[phase] for phase in phases)
+                  for group, phases in GROUPS.items()}
+        bound = max(("compute", "transfer", "python"), key=groups.get)
+        return {
+            "backend": self.backend,
+            "npart": self.npart,
+            "iterations": self.iterations,
+            "total": total,
+            "atom_steps_per_second": self.atom_steps_per_second,
+            "phases": {phase: t for phase, t in self.times.items() if t},
+            "groups": groups,
+            "fractions": {group: t / total if total else 0.0 for group, t in groups.items()},
+            "bound": bound,
+        }
+
+    def report(self):
+        """
+
+        Returns
+        -------
+        str
+            Summary as a table, one line per phase.
+        """
+        summary = self.summary()
+        total = summary["total"] or 1.0
+        lines = [f"{summary['iterations']} iterations of {self.npart} atoms on {self.backend} in "
+                 f"{summary['total']:.3f} s : {summary['atom_steps_per_second']:.4g} atom-steps/s, "
+                 f"{summary['bound']}-bound"]
+        for phase, t in summary["phases"].items():
+            per_iter = t / max(1, summary["iterations"])
+            lines.append(f"  {phase:12} {t:10.4f} s {100 * t / total:6.1f} % {1e6 * per_iter:10.1f} us/it")
+        for group, t in summary["groups"].items():
+            lines.append(f"  [{group}]{'':{10 - len(group)}} {t:10.4f} s {100 * t / total:6.1f} %")
+        return "\n".join(lines)
@@ -6,11 +6,17 @@ Simulates the dynamics of a model (on the CPU or GPU).
 
 import numpy as np
 import numexpr as ne
-import scipy.interpolate as inter
 import warnings
 
+from .builder import Model
+
 from .forces_CPU import ForcesComputeCPU
 from .forces_GPU import ForcesComputeGPU
+from .neighbours_CPU import VerletList
+from .integrator_GPU import IntegratorGPU
+from .integrator_CPU import IntegratorCPU
+from .observables import Series, spill_state_fct
+from .profiler import StepProfiler
 
 class Simulation:
     """
@@ -27,6 +33,38 @@ class Simulation:
     prefer_gpu : bool
         Specifies if GPU should be used to compute inter-atomic forces.
         Defaults to `True`, as it generally results in a significant speed gain.
+    neighbours : str
+        Neighbour search method used by the computing module (see `ForcesComputeCPU`). Defaults to `"all"`, or to the
+        method of the copied simulation.
+
+        With `"verlet"`, a neighbour list (see `neighbours_CPU.VerletList`) is maintained across iterations, and only
+        rebuilt when an atom moved by more than half the skin distance.
+    skin : float
+        Skin distance of the neighbour list. Defaults to :code:`0.3*re`, or to the skin of the copied simulation.
+    half : bool
+        If `True`, each pair of atoms is computed only once (see `ForcesComputeCPU`). Needs `"cells"` (CPU only) or
+        `"verlet"` neighbours. Defaults to `False`, or to the setting of the copied simulation.
+    cpu_options : dict
+        Additional keyword arguments for `ForcesComputeCPU` (eg. :code:`{"threads": 1}`), used if computation runs on
+        CPU. Defaults to those of the copied simulation.
+    gpu_options : dict
+        Additional keyword arguments for `ForcesComputeGPU` (eg. :code:`{"tiled": True}`), used if computation runs on
+        GPU. Defaults to those of the copied simulation.
+    sampling : int
+        State functions are recorded every `sampling` iterations (those whose number is a multiple of `sampling`).
+        Potential energies are only computed for these iterations ; temperature is still computed at each iteration,
+        for the thermostat. Defaults to `1`, or to the setting of the copied simulation.
+    resident : int
+        If set, :py:meth:`iter` computes iterations by batches of `resident`, without going back to Python code
+        between two iterations : on GPU, positions and speeds stay in GPU buffers (see `integrator_GPU.IntegratorGPU`),
+        on CPU iterations run in compiled code (see `integrator_CPU.IntegratorCPU`, which needs the `"numba"` engine).
+        State functions are still recorded at each iteration, but the callback is only called after each batch
+        (batches end at the iterations given by `callback_every` in :py:meth:`iter`, and at checkpoints).
+        Cannot be used with `"verlet"` neighbours.
+        Defaults to `None` (one iteration at a time), or to the setting of the copied simulation.
+    profile : bool
+        If `True`, the time spent in each phase of the iterations is measured (see :py:attr:`profiler`). Defaults to
+        `False`, or to the setting of the copied simulation.
 
     Attributes
     ----------
@@ -50,12 +88,50 @@ class Simulation:
         Warning
         -------
         Changing the values will affect behavior of the model.
+    state_fct : dict
+        State functions recorded at each iteration (`"T"`, `"T_ctrl"`, `"EC"`, `"EP"`, `"ET"`, `"bonds"`, `"time"`,
+        `"iters"`), as `observables.Series`, and set point ramps. State functions are also attributes of the
+        simulation (eg. :code:`simulation.T`).
+    nlist : neighbours_CPU.VerletList
+        Neighbour list, if `neighbours` is `"verlet"` (`None` otherwise). Its `builds` and `rebuild_rate` attributes
+        tell how often it had to be rebuilt.
+    block_mask : numpy.ndarray
+        If the lower zone of the model is blocked, `True` for atoms that may move. Atoms are selected at the first
+        iteration, so that their number does not change. `None` until then.
+    profiler : profiler.StepProfiler
+        Time spent in each phase of the iterations, if profiling is enabled (`None` otherwise).
     """
 
-    def __init__(self, model = None, simulation = None, prefer_gpu = True):
+    def __init__(self, model = None, simulation = None, prefer_gpu = True, neighbours = None, skin = None,
+                 half = None, cpu_options = None, gpu_options = None, sampling = None, resident = None,
+                 profile = None):
 
         if simulation:
             model = simulation.model
+            neighbours = neighbours or simulation.neighbours
+            skin = skin or simulation.skin
+            if half is None:
+                half = simulation.half
+            if cpu_options is None:
+                cpu_options = simulation.cpu_options
+            if gpu_options is None:
+                gpu_options = simulation.gpu_options
+            sampling = sampling or simulation.sampling
+            if resident is None:
+                resident = simulation.resident
+            if profile is None:
+                profile = simulation.profiler is not None
+
+        self.neighbours = neighbours or "all"
+        self.skin = skin or 0.3*model.re
+        self.half = bool(half)
+        self.cpu_options = dict(cpu_options or {})
+        self.gpu_options = dict(gpu_options or {})
+        self.sampling = max(1, int(sampling or 1))
+        self.resident = resident or None
+
+        if self.resident and self.neighbours == "verlet":
+            raise ValueError("Neighbour lists are maintained by Python code, and cannot be used with resident mode")
 
         self.model = model.copy()
 
@@ -66,19 +142,43 @@ class Simulation:
 
         if prefer_gpu:
             try:
-                self._compute = ForcesComputeGPU(consts)
-            except:
-                warnings.warn("GPU not available, falling back on CPU. GPU compute needs OpenGL >=4.3.")
-                self._compute = ForcesComputeCPU(consts)
+                self._compute = ForcesComputeGPU(consts, neighbours=self.neighbours, half=self.half,
+                                                 **self.gpu_options)
+            except Exception as e:
+                warnings.warn(f"GPU not available ({e}), falling back on CPU. GPU compute needs OpenGL >=4.3.")
+                self._compute = ForcesComputeCPU(consts, neighbours=self.neighbours, half=self.half,
+                                                 **self.cpu_options)
+        else:
+            self._compute = ForcesComputeCPU(consts, neighbours=self.neighbours, half=self.half, **self.cpu_options)
+
+        if profile:
+            backend = "gpu" if isinstance(self._compute, ForcesComputeGPU) else "cpu"
+            self.profiler = StepProfiler(self.model.npart, backend)
         else:
-            self._compute = ForcesComputeCPU(consts)
+            self.profiler = None
+
+        if self.neighbours == "verlet":
+            self.nlist = VerletList(consts, self.skin, half=self.half)
+        else:
+            self.nlist = None
+
+        if self.resident:
+            if isinstance(self._compute, ForcesComputeGPU):
+                self._integrator = IntegratorGPU(self._compute, self.model)
+            else:
+                self._integrator = IntegratorCPU(self._compute, self.model)
 
         self.T_f = lambda t:self.T[-1]
         self.Fx_f = lambda t:0.0
         self.Fy_f = lambda t:0.0
 
+        self.block_mask = None
+        self._checkpoints = (None, 0)
+
         if simulation :
             self.current_iter = simulation.current_iter
+            self.block_mask = simulation.block_mask
+            self._checkpoints = simulation._checkpoints
 
             self.state_fct = simulation.state_fct
 
@@ -94,20 +194,20 @@ class Simulation:
 
             self.state_fct = dict()
 
-            self.state_fct["T"] = []
-            self.state_fct["T_ctrl"] = []
+            self.state_fct["T"] = Series()
+            self.state_fct["T_ctrl"] = Series()
             self.state_fct["T_ramps"] = [[],[]]
 
             self.state_fct["Fx_ramps"] = [[],[]]
             self.state_fct["Fy_ramps"] = [[],[]]
 
-            self.state_fct["EC"] = []
-            self.state_fct["EP"] = []
-            self.state_fct["ET"] = []
-            self.state_fct["bonds"] = []
+            self.state_fct["EC"] = Series()
+            self.state_fct["EP"] = Series()
+            self.state_fct["ET"] = Series()
+            self.state_fct["bonds"] = Series()
 
-            self.state_fct["time"] = []
-            self.state_fct["iters"] = []
+            self.state_fct["time"] = Series()
+            self.state_fct["iters"] = Series()
 
             self.T_cntl = False
 
@@ -116,7 +216,7 @@ class Simulation:
         for s in self.state_fct:
             self.__setattr__(s, self.state_fct[s])
 
-    def iter(self, n=1, callback=None):
+    def iter(self, n=1, callback=None, callback_every=None):
         """
         Iterates one or more simulation steps.
 
@@ -129,7 +229,13 @@ class Simulation:
             Number of iterations to perform.
         callback : callable
             A callback function that must take the Simulation object as first argument.
-            It is called at the end of each iteration.
+            It is called at the end of each iteration (or of each batch of iterations if :py:attr:`resident` is set),
+            :py:attr:`current_iter` being the number of the iteration just computed.
+            To save the trajectory without slowing down the simulation, use a
+            `moldyn.utils.trajectory.AsyncTrajectoryWriter`.
+        callback_every : int
+            If :py:attr:`resident` is set, batches are also ended at each iteration whose number is a multiple of
+            `callback_every`, so that the callback is called for it (eg. the stride of a trajectory).
 
         Note
         ----
@@ -149,7 +255,18 @@ class Simulation:
         for s in self.state_fct:
             self.__setattr__(s, self.state_fct[s])
 
+        # mesure du temps passé dans chaque phase : un simple test par phase si elle est désactivée
+        profiler = self.profiler
+        lap = profiler.lap if profiler is not None else None
+        if lap:
+            profiler.start()
+
+        if self.resident:
+            self._iter_resident(n, callback, callback_every, lap)
+            return
+
         betaC = self.T_cntl # Contrôle de la température
+        sampling = self.sampling
 
         # on crée des alias aux valeurs du modèles pour numexpr
         v = self.model.v
@@ -168,7 +285,6 @@ class Simulation:
         length = self.model.length
 
         F = self.F
-        bondsGL = np.zeros(self.model.npart)
 
         periodic = self.model.x_periodic or self.model.y_periodic
 
@@ -198,22 +314,35 @@ class Simulation:
         if betaC:
             kick += "*sqrt(1 + gamma*(T_v/T - 1))"
         if low_zone_block:
-            # On présélectionne les atomes bloqués, afin que leur nombre ne change pas
-            low_block_mask = pos[:,1] > low_zone_limit
-            low_block_mask = np.array([low_block_mask]*2).T
+            low_block_mask = np.array([self._block_mask()]*2).T
             kick += "*low_block_mask"
 
+        if lap:
+            lap("setup")
+
         for i in range(n):
 
             t = self.current_iter * dt # l'heure, qui sert pour le calcul de température
 
             ne.evaluate("pos + v*dt2", out=pos)  # half drift
+            if lap:
+                lap("drift")
 
             # conditions périodiques de bord
             if periodic:
                 ne.evaluate("pos + (pos<limInf)*length - (pos>limSup)*length", out=pos)
+                if lap:
+                    lap("wrap")
 
-            self._compute.set_pos(pos)
+            if self.nlist is not None and self.nlist.update(pos):
+                self._compute.set_neighbours(self.nlist)
+                if lap:
+                    lap("neighbours")
+
+            sampled = not self.current_iter % sampling
+            self._compute.set_pos(pos, sampled) # énergies potentielles seulement pour les itérations échantillonnées
+            if lap:
+                lap("set_pos")
 
             v_avg = np.average(v, axis=0)
 
@@ -224,39 +353,302 @@ class Simulation:
                 from_y_middle[:] = pos[:,1]-y_middle
                 rotative_term[:,0] = (np.sum(v[:,0]/from_y_middle)/npart)*from_y_middle
 
-            # Énergie cinétique et température
+            # Énergie cinétique et température, nécessaires au thermostat à chaque itération
             EC = 0.5 * ne.evaluate(micro_ke)
             T = EC / knparts
-            self.EC.append(EC)
-            self.T.append(T)
+            if lap:
+                lap("thermostat")
 
             F[:] = self._compute.get_F()
-
-            # Énergie potentielle
-            EPgl = self._compute.get_PE()
-            EP = 0.5 * ne.evaluate("sum(EPgl)")
-            self.EP.append(EP)
-            self.ET.append(EC + EP)
+            if lap:
+                lap("get_F")
 
             # Thermostat
-            T_v = self.T_f(t)
-            self.T_ctrl.append(T_v)
+            T_v = self.T_f(t) if betaC else T
             ne.evaluate(kick, out=v) # kick
 
             ne.evaluate("pos + v*dt2", out=pos)  # half drift
+            if lap:
+                lap("kick")
+
+            if sampled:
+                # Énergie potentielle (sommée par le module de calcul)
+                PE_total, COUNT_total = self._compute.get_totals()
+                if lap:
+                    lap("readback")
+
+                self.EC.append(EC)
+                self.T.append(T)
+
+                EP = 0.5 * PE_total
+                self.EP.append(EP)
+                self.ET.append(EC + EP)
+
+                self.T_ctrl.append(T_v)
+                self.bonds.append(inv2npart*COUNT_total)
+
+                self.iters.append(self.current_iter)
+                self.time.append(t)
+                if lap:
+                    lap("record")
+
+            if callback:
+                callback(self)
+                if lap:
+                    lap("callback")
 
-            bondsGL[:] = self._compute.get_COUNT()
-            self.bonds.append(inv2npart*ne.evaluate("sum(bondsGL)"))
+            self.current_iter += 1
+
+            ckpt_ds, ckpt_every = self._checkpoints
+            if ckpt_every and not self.current_iter % ckpt_every:
+                self.checkpoint(ckpt_ds)
+                if lap:
+                    lap("checkpoint")
+
+            if lap:
+                profiler.iterations += 1
 
-            self.iters.append(self.current_iter)
-            self.time.append(t)
+    def _iter_resident(self, n, callback, callback_every=None, lap=None):
+        # même schéma que iter, mais calculé par paquets de self.resident itérations par l'intégrateur (IntegratorGPU
+        # ou IntegratorCPU), sans repasser par Python entre deux itérations
+        integrator = self._integrator
+
+        dt = self.model.dt
+        npart = self.model.npart
+
+        apply_up_zone_forces = self.model.up_apply_force_x or self.model.up_apply_force_y
+
+        if self.model.low_block:
+            block = self._block_mask().astype(np.float64)
+        else:
+            block = np.ones(npart)
+
+        if lap:
+            lap("setup")
+
+        done = 0
+        while done < n:
+            k = min(self.resident, n - done)
+            # le lot s'arrête aux itérations attendues par le callback, et avant les points de reprise
+            if callback_every:
+                k = min(k, (-self.current_iter) % callback_every + 1)
+            ckpt_ds, ckpt_every = self._checkpoints
+            if ckpt_every:
+                k = min(k, ckpt_every - self.current_iter % ckpt_every)
+            iters = self.current_iter + np.arange(k)
+            t = iters * dt
+
+            # consignes calculées à l'avance, puisque ce sont des fonctions Python
+            T_v = np.array([self.T_f(x) for x in t], dtype=np.float64) if self.T_cntl else np.zeros(k)
+            if apply_up_zone_forces:
+                up_zone_force = np.array([self.F_f(x) for x in t], dtype=np.float64).reshape((k, 2))
+            else:
+                up_zone_force = np.zeros((k, 2))
+
+            sampled = iters % self.sampling == 0
+            if lap:
+                lap("set_points")
+
+            EC, EP, T, bonds = integrator.run(k, block, self.T_cntl, T_v, up_zone_force, sampled)
+            if lap:
+                lap("integrator")
+
+            self.EC.extend(EC)
+            self.T.extend(T)
+            self.EP.extend(EP)
+            self.ET.extend(EC + EP)
+            self.T_ctrl.extend(T_v[sampled] if self.T_cntl else T)
+            self.bonds.extend(bonds)
+            self.iters.extend(iters[sampled])
+            self.time.extend(t[sampled])
+            if lap:
+                lap("record")
+
+            self.F[:] = self._compute.get_F()
+            if lap:
+                lap("get_F")
+
+            done += k
+            self.current_iter += k - 1 # comme dans iter, le callback voit le numéro de la dernière itération calculée
 
             if callback:
                 callback(self)
+                if lap:
+                    lap("callback")
 
             self.current_iter += 1
 
+            if ckpt_every and not self.current_iter % ckpt_every:
+                self.checkpoint(ckpt_ds)
+                if lap:
+                    lap("checkpoint")
+
+            if lap:
+                self.profiler.iterations += k
+
+    def _block_mask(self):
+        # On présélectionne les atomes bloqués, afin que leur nombre ne change pas
+        if self.block_mask is None:
+            self.block_mask = self.model.pos[:,1] > self.model.low_zone_upper_limit
+        return self.block_mask
+
+    def release(self):
+        """
+        Frees the buffers (or shared memory) of the compute module. OpenGL contexts, compiled shaders and process pools
+        are kept for later simulations (see `backends.BackendRegistry`).
+
+        The simulation cannot be iterated anymore, but a new one can be created from it (see `Simulation`).
+
+        Returns
+        -------
+
+        """
+        self._compute.release()
+
+    def checkpoint(self, dynstate):
+        """
+        Saves the state of the simulation (positions, speeds, forces, state functions, ramps, random generator...)
+        to the checkpoint file of a `DynState`, so that it can be resumed with :py:meth:`from_checkpoint`.
+
+        The checkpoint is written atomically. State functions that are spilled to disk (see
+        :py:meth:`spill_state_fct`) are not copied : only the number of values already written is saved.
+
+        Parameters
+        ----------
+        dynstate : DynState
+            Where to save the checkpoint.
+
+        Returns
+        -------
+
+        """
+        arrays = {"pos": self.model.pos, "v": self.model.v, "F": self.F}
+        if self.block_mask is not None:
+            arrays["block_mask"] = self.block_mask
+        rng = np.random.get_state()
+        arrays["rng_keys"] = rng[1]
+
+        series = dict()
+        for key, value in self.state_fct.items():
+            if isinstance(value, Series):
+                spill, spilled, chunk, arrays["state_fct/" + key] = value.get_state()
+                series[key] = [spill, spilled, chunk]
+
+        meta = {
+            "current_iter": self.current_iter,
+            "T_cntl": self.T_cntl,
+            "ramps": {key: self.state_fct[key] for key in ("T_ramps", "Fx_ramps", "Fy_ramps")},
+            "series": series,
+            "rng": [rng[0], rng[2], rng[3], rng[4]],
+            "params": self.model.params,
+            "simulation": {"prefer_gpu": isinstance(self._compute, ForcesComputeGPU), "neighbours": self.neighbours,
+                           "skin": self.skin, "half": self.half, "cpu_options": self.cpu_options,
+                           "gpu_options": self.gpu_options, "sampling": self.sampling, "resident": self.resident,
+                           "profile": self.profiler is not None},
+        }
+        dynstate.write_checkpoint(arrays, meta)
+
+    def set_checkpoints(self, dynstate, every):
+        """
+        Saves a checkpoint (see :py:meth:`checkpoint`) every `every` iterations while iterating.
+
+        Parameters
+        ----------
+        dynstate : DynState
+            Where to save checkpoints.
+        every : int
+            Number of iterations between two checkpoints (with :py:attr:`resident` set, batches are split so that
+            checkpoints are saved at the same iterations). `0` to stop saving checkpoints.
+
+        Returns
+        -------
+
+        """
+        self._checkpoints = (dynstate, int(every or 0))
+
+    @classmethod
+    def from_checkpoint(cls, dynstate, **kwargs):
+        """
+        Resumes a simulation saved with :py:meth:`checkpoint`. Iterating the resumed simulation gives the same results
+        as iterating the original one would have.
+
+        Set point ramps are restored, but a temperature control function set with :py:meth:`set_T_f` has to be set
+        again.
+
+        Parameters
+        ----------
+        dynstate : DynState or str
+            Where the checkpoint was saved.
+        kwargs
+            Parameters of the simulation (see `Simulation`). Default to those of the saved simulation.
+
+        Returns
+        -------
+        Simulation
+        """
+        if isinstance(dynstate, str):
+            from ..utils.data_mng import DynState # datreant, long à importer, ne sert qu'ici
+
+            dynstate = DynState(dynstate)
+        arrays, meta = dynstate.read_checkpoint()
+
+        model = Model()
+        model.params = dict(meta["params"])
+        model.pos = np.array(arrays["pos"])
+        model.v = np.array(arrays["v"])
+        model._m()
+
+        options = dict(meta["simulation"])
+        options.update(kwargs)
+        simulation = cls(model, **options)
+        simulation.current_iter = meta["current_iter"]
+        simulation.F[:] = arrays["F"]
+        simulation.block_mask = arrays.get("block_mask")
+
+        for key, (spill, spilled, chunk) in meta["series"].items():
+            simulation.state_fct[key] = Series.from_state(spill, spilled, chunk, arrays["state_fct/" + key])
+        for key, value in meta["ramps"].items():
+            simulation.state_fct[key] = value
+        for s in simulation.state_fct:
+            simulation.__setattr__(s, simulation.state_fct[s])
+
+        # les consignes ne sont pas réappliquées par set_T_ramps, qui changerait la température du modèle
+        t, T = simulation.T_ramps
+        if len(t) > 1:
+            simulation.T_f = simulation._f(t, T)
+        elif meta["T_cntl"]:
+            warnings.warn("Temperature control function was not saved, and has to be set again with set_T_f.")
+        simulation.T_cntl = meta["T_cntl"]
+        for axis in ("x", "y"):
+            t, F = simulation.state_fct[f"F{axis}_ramps"]
+            if len(t) > 1:
+                simulation.__setattr__(f"F{axis}_f", simulation._f(t, F))
+
+        rng = meta["rng"]
+        np.random.set_state((rng[0], arrays["rng_keys"], rng[1], rng[2], rng[3]))
+
+        return simulation
+
+    def spill_state_fct(self, directory, chunk=2**20):
+        """
+        Writes state functions to disk by chunks as they are recorded, to limit memory use of very long simulations.
+
+        Parameters
+        ----------
+        directory : str
+            Directory in which a file is written for each state function (see `observables.Series`).
+        chunk : int
+            Number of values of each state function kept in memory.
+
+        Returns
+        -------
+
+        """
+        spill_state_fct(self.state_fct, directory, chunk)
+
     def _f(self, t, y):
+        import scipy.interpolate as inter # long à importer, et seulement utile aux rampes
+
         f2 = inter.interp1d(t, y)
 
         def f(x):
@@ -0,0 +1,262 @@
+# -*-encoding: utf-8 -*-
+"""
+Parameter sweeps : the same model simulated for every combination of a grid of parameters.
+
+Each run is computed by a process of a pool, and saved in its own `DynState` (tagged with its parameters as datreant
+categories), so that a sweep that was interrupted can be resumed.
+
+Example
+-------
+.. code-block:: python
+
+    sweep = Sweep(model, "sweep_dir", 10000, {"x_a": [0.3, 0.5, 0.7], "rcut_fact": [2.0, 2.5],
+                                              "T_ramps": [([0, 1e-11], [300, 50])]})
+    runs = sweep.run()
+    runs[0].categories["x_a"], runs[0].load_state_fct()["T"]
+"""
+
+import os
+import json
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing as mp
+
+import numpy as np
+
+from ..utils.data_mng import DynState
+
+# paramètres de la grille qui ne sont pas des paramètres du modèle, mais des consignes de la simulation
+RAMPS = ("T_ramps", "Fx_ramps", "Fy_ramps")
+
+
+def _init_worker():
+    # un seul thread par processus, le parallélisme étant assuré par le nombre de processus
+    import numba
+    import numexpr as ne
+    numba.set_num_threads(1)
+    ne.set_num_threads(1)
+
+
+def _category(value):
+    # les catégories datreant ne peuvent être que des nombres ou des chaînes de caractères
+    if isinstance(value, (bool, int, float, str)):
+        return value
+    return json.dumps(np.asarray(value).tolist())
+
+
+def _run_point(directory, name, point, iterations, options, trajectory_every, checkpoint_every):
+    from .runner import Simulation
+
+    options = dict(options)
+    options["cpu_options"] = dict(options.get("cpu_options") or {}, threads=1)
+    ds = DynState(os.path.join(directory, name))
+    if ds.exists(ds.CHECKPOINT):
+        simulation = Simulation.from_checkpoint(ds, **options)
+    else:
+        model = DynState(os.path.join(directory, Sweep.MODEL)).load_model()
+        model.set_params({key: value for key, value in point.items() if key not in RAMPS})
+        simulation = Simulation(model, **options)
+        for key in RAMPS:
+            if key in point:
+                getattr(simulation, "set_" + key)(*point[key])
+        ds.categories.add({key: _category(value) for key, value in point.items()})
+
+    ds.categories["status"] = "running"
+    simulation.model.params["save_pos_history"] = bool(trajectory_every)
+    simulation.set_checkpoints(ds, checkpoint_every)
+
+    trajectory = None
+    if trajectory_every:
+        from ..utils.trajectory import AsyncTrajectoryWriter
+        trajectory = AsyncTrajectoryWriter(
+            ds.trajectory_writer(simulation.model.npart, mode="a" if simulation.current_iter else "w",
+                                 stride=trajectory_every, until=simulation.current_iter))
+    try:
+        simulation.iter(max(0, iterations - simulation.current_iter), trajectory, trajectory_every)
+    finally:
+        if trajectory is not None:
+            trajectory.close()
+
+    simulation.checkpoint(ds)
+    with ds.open(ds.STATE_FCT, mode="w") as IO:
+        IO.from_dict(simulation.state_fct)
+    ds.save_model(simulation.model)
+    ds.categories["status"] = "complete"
+    return name
+
+
+class Sweep:
+    """
+    Simulations of a model for every combination of a grid of parameters.
+
+    Runs are computed in parallel by a pool of processes. On CPU, each process computes forces with a single thread, so
+    that the host is not oversubscribed.
+
+    Each run is saved in a `DynState` of `directory`, whose categories are its parameters, and `"status"`
+    (`"running"` or `"complete"`). Calling :py:meth:`run` again only computes the runs that are not complete, resuming
+    them from their last checkpoint if any.
+
+    Parameters
+    ----------
+    model : builder.Model
+        Reference model. It is saved in `directory` with the description of the sweep, and is not needed to resume
+        it (see :py:meth:`resume`, which passes `None`).
+    directory : str
+        Directory of the sweep. If it already holds a sweep, it must be the same one (same model, grid and options) :
+        `ValueError` is raised otherwise, as its complete runs would not match the new grid.
+    iterations : int
+        Number of iterations of each run.
+    grid : dict
+        Values taken by each parameter : model parameters (see `builder.Model.set_params`), or set point ramps
+        (`"T_ramps"`, `"Fx_ramps"`, `"Fy_ramps"`, whose values are :code:`(t, values)` tuples, see
+        `runner.Simulation.set_T_ramps`).
+    options : dict
+        Keyword arguments of `runner.Simulation` (eg. :code:`{"neighbours": "cells"}`). Defaults to a CPU
+        computation.
+    processes : int
+        Number of processes. Defaults to the number of CPUs.
+    trajectory_every : int
+        If set, positions are saved every `trajectory_every` iterations.
+    checkpoint_every : int
+        If set, a checkpoint is saved every `checkpoint_every` iterations, so that an interrupted run is resumed from
+        it rather than from the start.
+
+    Attributes
+    ----------
+    points : list
+        Parameters of each run.
+    names : list
+        Name of the directory of each run.
+    """
+
+    MODEL = "model" # répertoire du modèle de référence
+    SPEC = "sweep.json" # description du balayage, pour la reprendre
+
+    def __init__(self, model, directory, iterations, grid, options=None, processes=None, trajectory_every=0,
+                 checkpoint_every=0):
+        self.directory = str(directory)
+        self.iterations = int(iterations)
+        self.grid = {key: list(values) for key, values in grid.items()}
+        self.options = dict(options or {"prefer_gpu": False})
+        self.processes = processes or os.cpu_count()
+        self.trajectory_every = trajectory_every
+        self.checkpoint_every = checkpoint_every
+
+        keys = list(self.grid)
+        self.points = [dict(zip(keys, values)) for values in itertools.product(*self.grid.values())]
+        self.names = ["run_{:04d}".format(k) for k in range(len(self.points))]
+
+        # nouveau balayage (sinon, repris par resume : sa description est déjà écrite)
+        if model is not None:
+            spec = {"iterations": self.iterations, "grid": _jsonable(self.grid), "options": self.options,
+                    "trajectory_every": trajectory_every, "checkpoint_every": checkpoint_every}
+            path = os.path.join(self.directory, self.SPEC)
+            if os.path.exists(path):
+                # les calculs déjà terminés doivent correspondre aux points de la grille
+                with open(path) as file:
+                    saved = json.load(file)
+                if saved != json.loads(json.dumps(spec)) or not self._same_model(model):
+                    raise ValueError(f"{self.directory} holds a different sweep : use Sweep.resume to continue it, "
+                                     f"or another directory")
+            else:
+                os.makedirs(self.directory, exist_ok=True)
+                DynState(os.path.join(self.directory, self.MODEL)).save_model(model)
+                with open(path, "w") as file:
+                    json.dump(spec, file, indent=4)
+
+    def _same_model(self, model):
+        saved = DynState(os.path.join(self.directory, self.MODEL)).load_model()
+        return saved.params == json.loads(json.dumps(_jsonable(model.params))) and \
+            np.array_equal(saved.pos, model.pos) and np.array_equal(saved.v, model.v)
+
+    @classmethod
+    def resume(cls, directory, processes=None):
+        """
+        Loads a sweep from its directory, to run its incomplete runs.
+
+        Parameters
+        ----------
+        directory : str
+            Directory of the sweep.
+        processes : int
+            Number of processes. Defaults to the number of CPUs.
+
+        Returns
+        -------
+        Sweep
+        """
+        with open(os.path.join(str(directory), cls.SPEC)) as file:
+            spec = json.load(file)
+        return cls(None, directory, spec["iterations"], spec["grid"], spec["options"], processes,
+                   spec["trajectory_every"], spec["checkpoint_every"])
+
+    def dynstate(self, k):
+        """
+
+        Parameters
+        ----------
+        k : int
+            Index of the run.
+
+        Returns
+        -------
+        DynState
+            Where run `k` is saved.
+        """
+        return DynState(os.path.join(self.directory, self.names[k]))
+
+    def pending(self):
+        """
+
+        Returns
+        -------
+        list
+            Indices of the runs that are not complete.
+        """
+        pending = []
+        for k, name in enumerate(self.names):
+            if not os.path.isdir(os.path.join(self.directory, name)):
+                pending.append(k)
+                continue
+            categories = self.dynstate(k).categories
+            if "status" not in categories or categories["status"] != "complete":
+                pending.append(k)
+        return pending
+
+    def run(self, callback=None):
+        """
+        Computes the runs that are not complete.
+
+        Parameters
+        ----------
+        callback : callable
+            Called with the index of each run as soon as it is complete (in any order).
+
+        Returns
+        -------
+        list
+            `DynState` of every run.
+        """
+        pending = self.pending()
+        if pending:
+            # "spawn" : les processus ne partagent ni les threads de numba ni un éventuel contexte OpenGL
+            with ProcessPoolExecutor(max_workers=min(self.processes, len(pending)),
+                                     mp_context=mp.get_context("spawn"), initializer=_init_worker) as pool:
+                futures = {pool.submit(_run_point, self.directory, self.names[k], self.points[k], self.iterations,
+                                       self.options, self.trajectory_every, self.checkpoint_every): k
+                           for k in pending}
+                for future in as_completed(futures):
+                    future.result()
+                    if callback:
+                        callback(futures[future])
+        return [self.dynstate(k) for k in range(len(self.points))]
+
+
+def _jsonable(value):
+    if isinstance(value, dict):
+        return {key: _jsonable(v) for key, v in value.items()}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [_jsonable(v) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
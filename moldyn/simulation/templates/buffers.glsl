@@ -0,0 +1,26 @@
+// Buffers de positions (entrée), de forces, d'énergies potentielles et de liaisons (sorties)
+
+layout (std430, binding=0) buffer in_0
+{
+    vec2 inxs[NPART];
+};
+
+layout (std430, binding=1) buffer out_0
+{
+    vec2 outfs[NPART];
+};
+
+layout (std430, binding=2) buffer out_1
+{
+    float outes[NPART];
+};
+
+layout (std430, binding=3) buffer out_2
+{
+    float outms[NPART];
+};
+
+layout (std430, binding=4) buffer in_params
+{
+    uint inparams[];
+};
@@ -0,0 +1,47 @@
+// Constantes et buffers de la grille de cellules construite sur le GPU (voir cells_bin.glsl et cells_scan.glsl)
+
+#define NCX %%NCX%%
+#define NCY %%NCY%%
+#define NCELLS (NCX*NCY)
+#define ORIGIN_X %%ORIGIN_X%%
+#define ORIGIN_Y %%ORIGIN_Y%%
+#define CELL_SIZE_X %%CELL_SIZE_X%%
+#define CELL_SIZE_Y %%CELL_SIZE_Y%%
+
+// Nombre d'atomes par cellule, puis compteurs de remplissage lors du tri
+layout (std430, binding=15) buffer io_cell_count
+{
+    uint cell_count[NCELLS];
+};
+
+// Les atomes de la cellule c sont cell_atoms[cell_start[c]] ... cell_atoms[cell_start[c+1]-1]
+layout (std430, binding=16) buffer io_cell_start
+{
+    uint cell_start[NCELLS+1];
+};
+
+layout (std430, binding=17) buffer io_cell_atoms
+{
+    uint cell_atoms[NPART];
+};
+
+layout (std430, binding=18) buffer io_atom_cell
+{
+    uint atom_cell[NPART];
+};
+
+int cell_coord(float x, float origin, float size, int n, bool periodic) {
+	int c = int(floor((x-origin)/size));
+	if (periodic) {
+		c = ((c % n) + n) % n;
+	} else { // hors de la boîte : on range l'atome dans la cellule du bord
+		c = clamp(c, 0, n-1);
+	}
+	return c;
+}
+
+uint cell_of(vec2 pos) {
+	int cx = cell_coord(pos.x, ORIGIN_X, CELL_SIZE_X, NCX, X_PERIODIC != 0);
+	int cy = cell_coord(pos.y, ORIGIN_Y, CELL_SIZE_Y, NCY, Y_PERIODIC != 0);
+	return uint(cy*NCX + cx);
+}
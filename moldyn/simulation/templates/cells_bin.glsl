@@ -0,0 +1,46 @@
+// %%VARIABLE%% will be replaced with consts by python code
+// Tri des atomes par cellule (tri par comptage) : stage=0 compte les atomes de chaque cellule, puis, une fois
+// cell_start calculé par cells_scan.glsl, stage=1 range chaque atome dans sa cellule, et stage=2 (une instance par
+// cellule) trie les atomes de chaque cellule par indice.
+
+#version 430
+
+
+#include "lj.glsl"
+#include "buffers.glsl"
+#include "cells.glsl"
+
+
+layout (local_size_x=LAYOUT_SIZE, local_size_y=1, local_size_z=1) in;
+
+uniform uint stage;
+
+void main()
+{
+	uint x = gl_GlobalInvocationID.x;
+
+	if (stage == 2) {
+		// tri par insertion (les cellules ne contiennent que quelques atomes) : les forces sont ainsi sommées dans
+		// le même ordre à chaque calcul, quel que soit l'ordonnancement, comme sur CPU
+		if (x < NCELLS) {
+			for (uint a=cell_start[x]+1; a<cell_start[x+1]; a++) {
+				uint i = cell_atoms[a];
+				uint b = a;
+				for (; b>cell_start[x] && cell_atoms[b-1]>i; b--) {
+					cell_atoms[b] = cell_atoms[b-1];
+				}
+				cell_atoms[b] = i;
+			}
+		}
+	} else if(x < NPART) {
+		if (stage == 0) {
+			uint c = cell_of(inxs[x]);
+			atom_cell[x] = c;
+			atomicAdd(cell_count[c], 1);
+		} else {
+			// l'ordre des atomes au sein d'une cellule dépend de l'ordonnancement des instances (rétabli par stage=2)
+			uint c = atom_cell[x];
+			cell_atoms[cell_start[c] + atomicAdd(cell_count[c], 1)] = x;
+		}
+	}
+}
@@ -0,0 +1,64 @@
+// %%VARIABLE%% will be replaced with consts by python code
+// Somme préfixe du nombre d'atomes par cellule, en un seul groupe de travail : chaque instance parcourt un bloc
+// contigu de cellules. Si SHARED_COUNTS, les compteurs sont d'abord copiés en mémoire partagée (ce qui n'est possible
+// que si la grille est assez petite). Les compteurs sont remis à zéro pour la seconde passe de cells_bin.glsl.
+
+#version 430
+
+
+#include "lj.glsl"
+#include "cells.glsl"
+
+#define SCAN_SIZE 256
+#define SHARED_COUNTS %%SHARED_COUNTS%%
+#define CHUNK ((NCELLS + SCAN_SIZE - 1) / SCAN_SIZE)
+
+layout (local_size_x=SCAN_SIZE, local_size_y=1, local_size_z=1) in;
+
+shared uint sums[SCAN_SIZE];
+
+#if SHARED_COUNTS
+	shared uint counts[NCELLS];
+	#define COUNT(c) counts[c]
+#else
+	#define COUNT(c) cell_count[c]
+#endif
+
+void main()
+{
+	uint l = gl_LocalInvocationID.x;
+	uint a = min(l*CHUNK, NCELLS);
+	uint b = min(a + CHUNK, NCELLS);
+
+	#if SHARED_COUNTS
+		for (uint c=l;c<NCELLS;c+=SCAN_SIZE) {
+			counts[c] = cell_count[c];
+		}
+		barrier();
+	#endif
+
+	uint local_sum = 0;
+	for (uint c=a;c<b;c++) {
+		local_sum += COUNT(c);
+	}
+	sums[l] = local_sum;
+	barrier();
+
+	// somme préfixe (inclusive) des blocs
+	for (uint offset=1;offset<SCAN_SIZE;offset<<=1) {
+		uint t = l >= offset ? sums[l-offset] : 0;
+		barrier();
+		sums[l] += t;
+		barrier();
+	}
+
+	uint start = sums[l] - local_sum;
+	for (uint c=a;c<b;c++) {
+		cell_start[c] = start;
+		start += COUNT(c);
+		cell_count[c] = 0;
+	}
+	if (l == SCAN_SIZE-1) {
+		cell_start[NCELLS] = sums[l];
+	}
+}
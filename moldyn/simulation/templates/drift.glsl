@@ -0,0 +1,42 @@
+// %%VARIABLE%% will be replaced with consts by python code
+// Demi-pas de déplacement et conditions périodiques de bord
+
+#version 430
+
+
+#include "lj.glsl"
+
+
+layout (local_size_x=LAYOUT_SIZE, local_size_y=1, local_size_z=1) in;
+
+#include "buffers.glsl"
+#include "integrator.glsl"
+
+void main()
+{
+	const uint x = gl_GlobalInvocationID.x;
+
+	if(x < NPART) {
+		vec2 pos = inxs[x] + vs[x]*DT2;
+
+		#if X_PERIODIC
+			if (pos.x<X_LIM_INF) {
+				pos.x+=LENGTH_X;
+			}
+			if (pos.x>X_LIM_SUP) {
+				pos.x-=LENGTH_X;
+			}
+		#endif
+
+		#if Y_PERIODIC
+			if (pos.y<Y_LIM_INF) {
+				pos.y+=LENGTH_Y;
+			}
+			if (pos.y>Y_LIM_SUP) {
+				pos.y-=LENGTH_Y;
+			}
+		#endif
+
+		inxs[x] = pos;
+	}
+}
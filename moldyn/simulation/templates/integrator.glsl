@@ -0,0 +1,42 @@
+// Constantes et buffers de l'intégrateur qui garde positions et vitesses sur le GPU (voir integrator_GPU.py)
+
+#define DT %%DT%%
+#define DT2 (0.5*DT)
+#define M_A %%M_A%%
+#define M_B %%M_B%%
+#define GAMMA %%GAMMA%%
+#define KNPARTS %%KNPARTS%% // kB*NPART
+
+#define X_LIM_INF %%X_LIM_INF%%
+#define Y_LIM_INF %%Y_LIM_INF%%
+#define X_LIM_SUP %%X_LIM_SUP%%
+#define Y_LIM_SUP %%Y_LIM_SUP%%
+#define Y_MIDDLE (0.5*(Y_LIM_INF+Y_LIM_SUP))
+
+#define UP_FORCES %%UP_FORCES%% // forces extérieures appliquées à la zone haute
+#define UP_ZONE_LOWER_LIMIT %%UP_ZONE_LOWER_LIMIT%%
+#define ROTATIVE %%ROTATIVE%% // on retire le terme de rotation de l'énergie cinétique microscopique
+#define REDUCE_SIZE 256
+
+layout (std430, binding=10) buffer io_v
+{
+    vec2 vs[NPART];
+};
+
+// 1.0 pour les atomes libres, 0.0 pour ceux bloqués dans la zone basse
+layout (std430, binding=11) buffer in_block
+{
+    float block[NPART];
+};
+
+// (vitesse moyenne, coefficient du terme de rotation), énergie cinétique microscopique
+layout (std430, binding=12) buffer io_state
+{
+    vec2 v_avg;
+    float rot;
+    float ec;
+};
+
+float mass(uint i) {
+	return i < N_A ? M_A : M_B;
+}
@@ -0,0 +1,43 @@
+// %%VARIABLE%% will be replaced with consts by python code
+// Mise à jour des vitesses (forces, forces extérieures, thermostat, blocage) puis demi-pas de déplacement
+
+#version 430
+
+
+#include "lj.glsl"
+
+
+layout (local_size_x=LAYOUT_SIZE, local_size_y=1, local_size_z=1) in;
+
+#include "buffers.glsl"
+#include "integrator.glsl"
+
+uniform float T_v; // température de consigne
+uniform uint thermostat;
+uniform vec2 up_force;
+
+void main()
+{
+	const uint x = gl_GlobalInvocationID.x;
+
+	if(x < NPART) {
+		vec2 f = outfs[x];
+
+		#if UP_FORCES
+			if (inxs[x].y > UP_ZONE_LOWER_LIMIT) {
+				f += up_force;
+			}
+		#endif
+
+		vec2 v = vs[x] + f*(DT/mass(x));
+
+		if (thermostat != 0) {
+			v *= sqrt(1.0 + GAMMA*(T_v*KNPARTS/ec - 1.0));
+		}
+
+		v *= block[x];
+
+		vs[x] = v;
+		inxs[x] += v*DT2;
+	}
+}
@@ -0,0 +1,69 @@
+// Constantes et potentiel de Lennard-Jones, communs aux shaders de calcul des forces
+
+#define LAYOUT_SIZE %%LAYOUT_SIZE%%
+#define NPART %%NPART%%
+#define N_A %%N_A%%
+
+#define RCUT_A %%RCUT_A%%
+#define RCUT_B %%RCUT_B%%
+#define RCUT_AB %%RCUT_AB%%
+
+#define EPSILON_A %%EPSILON_A%%
+#define EPSILON_B %%EPSILON_B%%
+#define EPSILON_AB %%EPSILON_AB%%
+
+#define SIGMA_A %%SIGMA_A%%
+#define SIGMA_B %%SIGMA_B%%
+#define SIGMA_AB %%SIGMA_AB%%
+
+#define LENGTH_X %%LENGTH_X%%
+#define LENGTH_Y %%LENGTH_Y%%
+#define SHIFT_X LENGTH_X/2 // générique et logique
+#define SHIFT_Y LENGTH_Y/2
+
+#define X_PERIODIC %%X_PERIODIC%%
+#define Y_PERIODIC %%Y_PERIODIC%%
+
+#define ENERGIES %%ENERGIES%% // 0 pour la variante qui ne calcule que les forces
+
+
+float force(float dist, float p, float epsilon) {
+	return (-4.0*epsilon*(6.0*p-12.0*p*p))/(dist*dist);
+}
+
+float energy(float dist, float p, float epsilon) {
+	return epsilon*(4.0*(p*p-p)+127.0/4096.0);
+}
+
+vec2 min_image(vec2 distxy) {
+	// Conditions périodiques de bord
+	#if X_PERIODIC
+		if (distxy.x<(-SHIFT_X)) {
+			distxy.x+=LENGTH_X;
+		}
+		if (distxy.x>SHIFT_X) {
+			distxy.x-=LENGTH_X;
+		}
+	#endif
+
+	#if Y_PERIODIC
+		if (distxy.y<(-SHIFT_Y)) {
+			distxy.y+=LENGTH_Y;
+		}
+		if (distxy.y>SHIFT_Y) {
+			distxy.y-=LENGTH_Y;
+		}
+	#endif
+	return distxy;
+}
+
+vec3 lj_params(uint i, uint j) {
+	// (epsilon, sigma, rcut) pour l'interaction entre les atomes i et j
+	if ((i < N_A) != (j < N_A)) {
+		return vec3(EPSILON_AB, SIGMA_AB, RCUT_AB);
+	}
+	if (i < N_A) {
+		return vec3(EPSILON_A, SIGMA_A, RCUT_A);
+	}
+	return vec3(EPSILON_B, SIGMA_B, RCUT_B);
+}
@@ -3,65 +3,12 @@
 #version 430
 
 
-#define LAYOUT_SIZE %%LAYOUT_SIZE%%
-#define NPART %%NPART%%
-#define N_A %%N_A%%
-
-#define RCUT_A %%RCUT_A%%
-#define RCUT_B %%RCUT_B%%
-#define RCUT_AB %%RCUT_AB%%
-
-#define EPSILON_A %%EPSILON_A%%
-#define EPSILON_B %%EPSILON_B%%
-#define EPSILON_AB %%EPSILON_AB%%
-
-#define SIGMA_A %%SIGMA_A%%
-#define SIGMA_B %%SIGMA_B%%
-#define SIGMA_AB %%SIGMA_AB%%
-
-#define LENGTH_X %%LENGTH_X%%
-#define LENGTH_Y %%LENGTH_Y%%
-#define SHIFT_X LENGTH_X/2 // générique et logique
-#define SHIFT_Y LENGTH_Y/2
-
-#define X_PERIODIC %%X_PERIODIC%%
-#define Y_PERIODIC %%Y_PERIODIC%%
+#include "lj.glsl"
 
 
 layout (local_size_x=LAYOUT_SIZE, local_size_y=1, local_size_z=1) in;
 
-layout (std430, binding=0) buffer in_0
-{
-    vec2 inxs[NPART];
-};
-
-layout (std430, binding=1) buffer out_0
-{
-    vec2 outfs[NPART];
-};
-
-layout (std430, binding=2) buffer out_1
-{
-    float outes[NPART];
-};
-
-layout (std430, binding=3) buffer out_2
-{
-    float outms[NPART];
-};
-
-layout (std430, binding=4) buffer in_params
-{
-    uint inparams[];
-};
-
-float force(float dist, float p, float epsilon) {
-	return (-4.0*epsilon*(6.0*p-12.0*p*p))/(dist*dist);
-}
-
-float energy(float dist, float p, float epsilon) {
-	return epsilon*(4.0*(p*p-p)+127.0/4096.0);
-}
+#include "buffers.glsl"
 
 void iterate(vec2 pos, uint a, uint b, float epsilon, float sigma, float rcut) {
 	// a et b les bornes, pos la position de l'atome associé à l'instance
@@ -105,7 +52,9 @@ void iterate(vec2 pos, uint a, uint b, float epsilon, float sigma, float rcut) {
 					const float p=pow(sigma/dist, 6);
 
 					outfs[x] += force(dist, p, epsilon)*distxy;
-					outes[x] += energy(dist, p, epsilon);
+					#if ENERGIES
+						outes[x] += energy(dist, p, epsilon);
+					#endif
 					outms[x] += 1.0;
 				}
 			}
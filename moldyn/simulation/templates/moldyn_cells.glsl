@@ -0,0 +1,83 @@
+// %%VARIABLE%% will be replaced with consts by python code
+// Variante de moldyn.glsl qui ne parcourt que les atomes des cellules voisines, la grille étant construite sur le GPU
+// par cells_bin.glsl et cells_scan.glsl
+
+#version 430
+
+
+#include "lj.glsl"
+
+
+layout (local_size_x=LAYOUT_SIZE, local_size_y=1, local_size_z=1) in;
+
+#include "buffers.glsl"
+#include "cells.glsl"
+
+void main()
+{
+	uint x = gl_GlobalInvocationID.x;
+
+	if(x < NPART) { // On vérifie qu'on est bien associé à un atome
+		vec2 pos = inxs[x];
+
+		vec2 f = vec2(0.0);
+		float e = 0.0;
+		float m = 0.0;
+
+		int cx = int(atom_cell[x] % NCX);
+		int cy = int(atom_cell[x] / NCX);
+
+		// sur une petite grille périodique, on ne visite pas deux fois la même cellule
+		int nx = X_PERIODIC != 0 ? min(3, NCX) : 3;
+		int ny = Y_PERIODIC != 0 ? min(3, NCY) : 3;
+
+		for (int oy=0;oy<ny;oy++) {
+			int y = cy - 1 + oy;
+			#if Y_PERIODIC
+				y = (y + NCY) % NCY;
+			#else
+				if (y < 0 || y >= NCY) {
+					continue;
+				}
+			#endif
+			for (int ox=0;ox<nx;ox++) {
+				int xx = cx - 1 + ox;
+				#if X_PERIODIC
+					xx = (xx + NCX) % NCX;
+				#else
+					if (xx < 0 || xx >= NCX) {
+						continue;
+					}
+				#endif
+				uint c = uint(y*NCX + xx);
+
+				for (uint k=cell_start[c];k<cell_start[c+1];k++) {
+					uint i = cell_atoms[k];
+					if (i != x) {
+						vec3 params = lj_params(x, i); // epsilon, sigma, rcut
+						vec2 distxy = min_image(pos - inxs[i]);
+
+						if(abs(distxy.x)<params.z && abs(distxy.y)<params.z) {
+
+							float dist = length(distxy);
+
+							if (dist<params.z) {
+								float p=pow(params.y/dist, 6);
+
+								f += force(dist, p, params.x)*distxy;
+								#if ENERGIES
+									e += energy(dist, p, params.x);
+								#endif
+								m += 1.0;
+							}
+						}
+					}
+				}
+			}
+		}
+
+		outfs[x] = f;
+		outes[x] = e;
+		outms[x] = m;
+	}
+}
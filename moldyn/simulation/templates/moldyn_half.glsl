@@ -0,0 +1,60 @@
+// %%VARIABLE%% will be replaced with consts by python code
+// Première passe du calcul par demi-paires : la liste de voisins de x ne contient que des atomes d'indice supérieur,
+// et chaque paire n'est calculée qu'une fois. Le résultat est rangé à la place de la paire dans la liste ; la seconde
+// passe (moldyn_half_gather.glsl) additionne les contributions de chaque atome.
+
+#version 430
+
+
+#include "lj.glsl"
+
+
+layout (local_size_x=LAYOUT_SIZE, local_size_y=1, local_size_z=1) in;
+
+#include "buffers.glsl"
+
+layout (std430, binding=5) buffer in_nstart
+{
+    uint nstart[];
+};
+
+layout (std430, binding=6) buffer in_nlist
+{
+    uint nlist[];
+};
+
+// (force sur x, énergie, liaison) pour chaque paire de la liste
+layout (std430, binding=7) buffer out_pairs
+{
+    vec4 outpairs[];
+};
+
+void main()
+{
+	const uint x = gl_GlobalInvocationID.x;
+
+	if(x < NPART) { // On vérifie qu'on est bien associé à un atome
+		const vec2 pos = inxs[x];
+
+		for (uint k=nstart[x];k<nstart[x+1];k++) {
+			const uint i = nlist[k];
+			const vec3 params = lj_params(x, i); // epsilon, sigma, rcut
+			const vec2 distxy = min_image(pos - inxs[i]);
+
+			vec4 res = vec4(0.0);
+
+			if(abs(distxy.x)<params.z && abs(distxy.y)<params.z) {
+
+				float dist = length(distxy);
+
+				if (dist<params.z) {
+					const float p=pow(params.y/dist, 6);
+
+					res = vec4(force(dist, p, params.x)*distxy, ENERGIES != 0 ? energy(dist, p, params.x) : 0.0, 1.0);
+				}
+			}
+
+			outpairs[k] = res;
+		}
+	}
+}
@@ -0,0 +1,56 @@
+// %%VARIABLE%% will be replaced with consts by python code
+// Seconde passe du calcul par demi-paires (voir moldyn_half.glsl) : chaque atome additionne les paires où il apparaît
+// en premier, et soustrait la force de celles où il apparaît en second (troisième loi de Newton).
+
+#version 430
+
+
+#include "lj.glsl"
+
+
+layout (local_size_x=LAYOUT_SIZE, local_size_y=1, local_size_z=1) in;
+
+#include "buffers.glsl"
+
+layout (std430, binding=5) buffer in_nstart
+{
+    uint nstart[];
+};
+
+layout (std430, binding=7) buffer in_pairs
+{
+    vec4 inpairs[];
+};
+
+// Les paires où x apparaît en second sont inpairs[rlist[rstart[x]]] ... inpairs[rlist[rstart[x+1]-1]]
+layout (std430, binding=8) buffer in_rstart
+{
+    uint rstart[];
+};
+
+layout (std430, binding=9) buffer in_rlist
+{
+    uint rlist[];
+};
+
+void main()
+{
+	const uint x = gl_GlobalInvocationID.x;
+
+	if(x < NPART) { // On vérifie qu'on est bien associé à un atome
+		vec4 res = vec4(0.0);
+
+		for (uint k=nstart[x];k<nstart[x+1];k++) {
+			res += inpairs[k];
+		}
+
+		for (uint k=rstart[x];k<rstart[x+1];k++) {
+			const vec4 pair = inpairs[rlist[k]];
+			res += vec4(-pair.xy, pair.zw);
+		}
+
+		outfs[x] = res.xy;
+		outes[x] = res.z;
+		outms[x] = res.w;
+	}
+}
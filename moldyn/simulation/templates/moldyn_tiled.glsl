@@ -0,0 +1,66 @@
+// %%VARIABLE%% will be replaced with consts by python code
+// Variante de moldyn.glsl où les positions sont lues par tuiles de LAYOUT_SIZE atomes, chargées en mémoire partagée
+// par l'ensemble du groupe de travail : chaque position n'est lue qu'une fois par groupe dans le buffer global.
+
+#version 430
+
+
+#include "lj.glsl"
+
+
+layout (local_size_x=LAYOUT_SIZE, local_size_y=1, local_size_z=1) in;
+
+#include "buffers.glsl"
+
+shared vec2 tile[LAYOUT_SIZE];
+
+void main()
+{
+	uint x = gl_GlobalInvocationID.x;
+	uint l = gl_LocalInvocationID.x;
+
+	// toutes les instances participent au chargement des tuiles (et donc aux barrier()), même sans atome associé
+	vec2 pos = x < NPART ? inxs[x] : vec2(0.0);
+
+	vec2 f = vec2(0.0);
+	float e = 0.0;
+	float m = 0.0;
+
+	for (uint t=0;t<NPART;t+=LAYOUT_SIZE) {
+		if (t+l < NPART) {
+			tile[l] = inxs[t+l];
+		}
+		barrier();
+
+		uint size = min(LAYOUT_SIZE, NPART-t);
+		for (uint k=0;k<size;k++) {
+			uint i = t+k;
+			if (i != x) {
+				vec3 params = lj_params(x, i); // epsilon, sigma, rcut
+				vec2 distxy = min_image(pos - tile[k]);
+
+				if(abs(distxy.x)<params.z && abs(distxy.y)<params.z) {
+
+					float dist = length(distxy);
+
+					if (dist<params.z) {
+						float p=pow(params.y/dist, 6);
+
+						f += force(dist, p, params.x)*distxy;
+						#if ENERGIES
+							e += energy(dist, p, params.x);
+						#endif
+						m += 1.0;
+					}
+				}
+			}
+		}
+		barrier(); // la tuile ne doit pas être remplacée avant que tout le groupe l'ait parcourue
+	}
+
+	if(x < NPART) {
+		outfs[x] = f;
+		outes[x] = e;
+		outms[x] = m;
+	}
+}
@@ -0,0 +1,61 @@
+// %%VARIABLE%% will be replaced with consts by python code
+// Variante de moldyn.glsl qui ne parcourt que la liste de voisins (liste de Verlet) de chaque atome
+
+#version 430
+
+
+#include "lj.glsl"
+
+
+layout (local_size_x=LAYOUT_SIZE, local_size_y=1, local_size_z=1) in;
+
+#include "buffers.glsl"
+
+// Les voisins de l'atome x sont nlist[nstart[x]] ... nlist[nstart[x+1]-1]
+layout (std430, binding=5) buffer in_nstart
+{
+    uint nstart[];
+};
+
+layout (std430, binding=6) buffer in_nlist
+{
+    uint nlist[];
+};
+
+void main()
+{
+	const uint x = gl_GlobalInvocationID.x;
+
+	if(x < NPART) { // On vérifie qu'on est bien associé à un atome
+		const vec2 pos = inxs[x];
+
+		vec2 f = vec2(0.0);
+		float e = 0.0;
+		float m = 0.0;
+
+		for (uint k=nstart[x];k<nstart[x+1];k++) {
+			const uint i = nlist[k];
+			const vec3 params = lj_params(x, i); // epsilon, sigma, rcut
+			const vec2 distxy = min_image(pos - inxs[i]);
+
+			if(abs(distxy.x)<params.z && abs(distxy.y)<params.z) {
+
+				float dist = length(distxy);
+
+				if (dist<params.z) {
+					const float p=pow(params.y/dist, 6);
+
+					f += force(dist, p, params.x)*distxy;
+					#if ENERGIES
+						e += energy(dist, p, params.x);
+					#endif
+					m += 1.0;
+				}
+			}
+		}
+
+		outfs[x] = f;
+		outes[x] = e;
+		outms[x] = m;
+	}
+}
@@ -0,0 +1,29 @@
+// %%VARIABLE%% will be replaced with consts by python code
+// Enregistre l'énergie cinétique (voir thermo.glsl), et les sommes des énergies potentielles et des liaisons (voir
+// reduce.glsl) de l'itération en cours, pour qu'elles soient relues toutes ensemble.
+
+#version 430
+
+
+#include "lj.glsl"
+#include "integrator.glsl"
+
+
+layout (local_size_x=1, local_size_y=1, local_size_z=1) in;
+
+layout (std430, binding=13) buffer in_totals
+{
+    vec2 totals;
+};
+
+layout (std430, binding=19) buffer out_records
+{
+    vec4 records[]; // énergie cinétique, somme des énergies potentielles, somme des liaisons
+};
+
+uniform uint index;
+
+void main()
+{
+	records[index] = vec4(ec, totals, 0.0);
+}
@@ -0,0 +1,62 @@
+// %%VARIABLE%% will be replaced with consts by python code
+// Réduction en deux passes des énergies potentielles et des liaisons : stage=0 avec REDUCE_GROUPS groupes, chacun
+// écrivant sa somme partielle, puis stage=1 avec un seul groupe, qui somme les résultats partiels.
+
+#version 430
+
+
+#include "lj.glsl"
+#include "buffers.glsl"
+
+#define REDUCE_SIZE 256
+#define REDUCE_GROUPS %%REDUCE_GROUPS%%
+
+layout (local_size_x=REDUCE_SIZE, local_size_y=1, local_size_z=1) in;
+
+layout (std430, binding=13) buffer out_totals
+{
+    vec2 totals; // somme des énergies potentielles, somme des liaisons
+};
+
+layout (std430, binding=14) buffer io_partials
+{
+    vec2 partials[REDUCE_GROUPS];
+};
+
+uniform uint stage;
+
+shared vec2 partial[REDUCE_SIZE];
+
+void main()
+{
+	uint l = gl_LocalInvocationID.x;
+
+	vec2 acc = vec2(0.0);
+	if (stage == 0) {
+		for (uint i=gl_GlobalInvocationID.x;i<NPART;i+=REDUCE_SIZE*REDUCE_GROUPS) {
+			acc += vec2(outes[i], outms[i]);
+		}
+	} else {
+		for (uint i=l;i<REDUCE_GROUPS;i+=REDUCE_SIZE) {
+			acc += partials[i];
+		}
+	}
+
+	partial[l] = acc;
+	barrier();
+
+	for (uint s=REDUCE_SIZE/2;s>0;s>>=1) {
+		if (l < s) {
+			partial[l] += partial[l+s];
+		}
+		barrier();
+	}
+
+	if (l == 0) {
+		if (stage == 0) {
+			partials[gl_WorkGroupID.x] = partial[0];
+		} else {
+			totals = partial[0];
+		}
+	}
+}
@@ -0,0 +1,57 @@
+// %%VARIABLE%% will be replaced with consts by python code
+// Réduction en un seul groupe de travail : vitesse moyenne (et terme de rotation) pour stage=0, puis énergie cinétique
+// microscopique pour stage=1.
+
+#version 430
+
+
+#include "lj.glsl"
+#include "buffers.glsl"
+#include "integrator.glsl"
+
+
+layout (local_size_x=REDUCE_SIZE, local_size_y=1, local_size_z=1) in;
+
+uniform uint stage;
+
+shared vec4 partial[REDUCE_SIZE];
+
+void main()
+{
+	uint l = gl_LocalInvocationID.x;
+
+	vec4 acc = vec4(0.0);
+	for (uint i=l;i<NPART;i+=REDUCE_SIZE) {
+		if (stage == 0) {
+			acc.xy += vs[i];
+			#if ROTATIVE
+				acc.z += vs[i].x/(inxs[i].y - Y_MIDDLE);
+			#endif
+		} else {
+			vec2 dv = vs[i] - v_avg;
+			#if ROTATIVE
+				dv.x -= rot*(inxs[i].y - Y_MIDDLE);
+			#endif
+			acc.x += mass(i)*dot(dv, dv);
+		}
+	}
+
+	partial[l] = acc;
+	barrier();
+
+	for (uint s=REDUCE_SIZE/2;s>0;s>>=1) {
+		if (l < s) {
+			partial[l] += partial[l+s];
+		}
+		barrier();
+	}
+
+	if (l == 0) {
+		if (stage == 0) {
+			v_avg = partial[0].xy/NPART;
+			rot = partial[0].z/NPART;
+		} else {
+			ec = 0.5*partial[0].x;
+		}
+	}
+}
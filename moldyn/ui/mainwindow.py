@@ -3,6 +3,7 @@ import shutil
 
 from PyQt5.QtWidgets import QMainWindow, QTreeWidgetItem, QHeaderView, QListWidgetItem, QMessageBox, QFileDialog
 from PyQt5.QtCore import QThread, pyqtSignal
+from concurrent.futures import ThreadPoolExecutor
 from mpl_toolkits.axisartist.parasite_axes import HostAxes, ParasiteAxes
 from pyqtgraph import PlotWidget
 import time
@@ -11,6 +12,7 @@ import multiprocessing as mp
 from datetime import timedelta
 
 from moldyn.utils.data_mng import DynState, tmp1_path, tmp_path
+from moldyn.utils.trajectory import AsyncTrajectoryWriter
 
 MODEL_FILE_FILTER = "Model file (*.mdl);;Legacy Model file (*.zip)"
 
@@ -34,7 +36,6 @@ from .model_viewer import ModelView
 
 from ._conv import _float
 
-from ..simulation.builder import Model
 from ..simulation.runner import Simulation
 
 from ..processing import visualisation as visu
@@ -45,6 +46,8 @@ from . import draggableLine
 class MoldynMainWindow(QMainWindow):
     updated_signal = pyqtSignal(int, float)
     movie_progress_signal = pyqtSignal(int)
+    save_progress_signal = pyqtSignal(str)
+    simulation_done_signal = pyqtSignal()
     displayed_properties = dict()
 
     def __init__(self):
@@ -121,6 +124,12 @@ class MoldynMainWindow(QMainWindow):
         self.ui.simuBtn.clicked.connect(self.simulate)
 
         self.updated_signal.connect(self.update_progress)
+        self.simulation_done_signal.connect(self.simulation_done)
+
+        # Thread de simulation conservé d'une simulation à l'autre : son contexte OpenGL, ses shaders (voir
+        # moldyn.simulation.backends) et la simulation elle-même sont réutilisés quand on la continue
+        self.simu_executor = ThreadPoolExecutor(max_workers=1)
+        self.simulation_built = None
 
         self.ui.designTemperatureBtn.clicked.connect(self.design_temperature_profile)
 
@@ -196,6 +205,7 @@ class MoldynMainWindow(QMainWindow):
 
         self.ui.makeMovieBtn.clicked.connect(self.make_movie)
         self.movie_progress_signal.connect(self.ui.movieProgressBar.setValue)
+        self.save_progress_signal.connect(self.ui.statusbar.showMessage)
 
         # Misc
         try:
@@ -218,8 +228,10 @@ class MoldynMainWindow(QMainWindow):
         self.ui.gotoSimuBtn.setEnabled(True)
         self.ui.tab_simu.setEnabled(True)
 
-        self.simulation = Simulation(self.model, prefer_gpu=self.ui.tryToUseGPUCheckBox.checkState())
+        # le module de calcul sera créé par le thread de simulation, qui a son propre contexte OpenGL
+        self.simulation = Simulation(self.model, prefer_gpu=False)
         self.model_view = ModelView(self.simulation.model)
+        self.history_ds = DynState(tmp_path)
 
         for dp in self.displayed_properties:
             self.displayed_properties[dp].setText(1, str(self.model.__getattr__(dp)))
@@ -248,10 +260,11 @@ class MoldynMainWindow(QMainWindow):
                                                    options=QFileDialog.DontUseNativeDialog)
         if path:
             ds = self._load_model(path)
-            with ds.open(ds.STATE_FCT, 'r') as IO:
-                for key, item in IO.items():
-                    self.simulation.state_fct[key] = item
-            c_i = len(self.simulation.state_fct["T"])
+            self.history_ds = ds # archive lue sans extraction, dont on garde la trajectoire pour les films
+            for key, item in ds.load_state_fct().items():
+                self.simulation.state_fct[key] = item
+            iters = self.simulation.state_fct["iters"]
+            c_i = int(iters[-1]) + 1 if len(iters) else 0 # les fonctions d'état peuvent être échantillonnées
             self.simulation.current_iter = c_i
             self.ui.currentIteration.setText(str(c_i))
             self.ui.currentTime.setText(str((c_i)*self.model.dt))
@@ -286,21 +299,7 @@ class MoldynMainWindow(QMainWindow):
 
     def _load_model(self, path):
         ds = DynState(path)
-        model = Model()
-        # position of particles
-        with ds.open(ds.POS, 'r') as IO:
-            model.pos = IO.load()
-        # parameters
-        with ds.open(ds.PAR) as IO:
-            for key, item in IO.items():
-                model.params[key] = item
-        # velocity
-        with ds.open(ds.VEL, 'r') as IO:
-            model.v = IO.load()
-
-        model._m()
-
-        self.set_model(model)
+        self.set_model(ds.load_model())
         return ds
 
     def _save_model(self, m):
@@ -384,9 +383,6 @@ class MoldynMainWindow(QMainWindow):
             self.ui.currentTime.setText(str((v+1)*self.model.dt))
             self.ui.ETA.setText(str(timedelta(seconds=int( (self.ui.iterationsSpinBox.value()/c_i - 1)*(new_t-self.simu_starttime)))))
 
-        if self.save_pos:
-            self.pos_IO.save(self.simulation.model.pos)
-
     def simulate(self):
         self.ui.simuBtn.setEnabled(False)
         self.ui.iterationsSpinBox.setEnabled(False)
@@ -401,13 +397,15 @@ class MoldynMainWindow(QMainWindow):
         self.t_deque.append(0)
         self.ui.statusbar.showMessage("Simulation is running...")
 
+        self.history_ds = DynState(tmp_path)
         self.save_pos = self.ui.saveAllAtomsPositionCheckBox.checkState()
         self.simulation.model.params["save_pos_history"] = self.save_pos
         if self.save_pos:
             mode = "a" if self.simulation.current_iter else "w"
 
-            self.pos_IO = DynState(tmp_path).open(DynState.POS_H, mode=mode)
-            self.pos_IO.__enter__()
+            # écriture par un thread dédié, pour que le disque ne ralentisse ni la simulation ni l'interface
+            self.pos_IO = AsyncTrajectoryWriter(DynState(tmp_path).trajectory_writer(self.simulation.model.npart,
+                                                                                     mode=mode))
 
         if len(self.simulation.T_ramps[0]):
             final_t = (self.simulation.current_iter + self.ui.iterationsSpinBox.value())*self.model.dt
@@ -416,39 +414,46 @@ class MoldynMainWindow(QMainWindow):
             T.append(self.simulation.T_f(final_t))
             self.simulation.set_T_ramps(t, T)
 
+        prefer_gpu = bool(self.ui.tryToUseGPUCheckBox.checkState())
+        iterations = self.ui.iterationsSpinBox.value()
+
         def run():
-            # Pour continuer la simu précedente. On est obligés d'en créer une nouvelle pour des questions de scope.
-            # On pourrait créer et conserver le thread une bonne fois pour toutes, pour que ce bricolage cesse.
-            del(self.simulation._compute) # le module de calcul risque de continuer à exister sinon
-            self.c_i = self.simulation.current_iter
-            self.simulation = Simulation(simulation=self.simulation, prefer_gpu=self.ui.tryToUseGPUCheckBox.checkState())
-            self.model_view = ModelView(self.simulation.model)
-            self.simu_starttime = time.perf_counter()
-            def up(s):
-                self.updated_signal.emit(s.current_iter, time.perf_counter())
-            self.simulation.iter(self.ui.iterationsSpinBox.value(), up)
-            self.simu_thr.exit()
-
-        def end():
-            if self.save_pos:
-                self.pos_IO.file.close()
-
-            with DynState(tmp_path).open(DynState.STATE_FCT, mode="w") as ds:
-                ds.from_dict(self.simulation.state_fct)
+            try:
+                self.c_i = self.simulation.current_iter
+                # La simulation n'est recréée que si elle ne l'a pas été par ce thread, ou si le choix du GPU a changé.
+                # Sinon, on la continue telle quelle.
+                if self.simulation_built != (self.simulation, prefer_gpu):
+                    self.simulation = Simulation(simulation=self.simulation, prefer_gpu=prefer_gpu)
+                    if self.simulation_built is not None:
+                        self.simulation_built[0].release() # créée par ce thread, dans son contexte
+                    self.simulation_built = (self.simulation, prefer_gpu)
+                    self.model_view = ModelView(self.simulation.model)
+                self.simu_starttime = time.perf_counter()
+                def up(s):
+                    if self.save_pos:
+                        self.pos_IO(s)
+                    self.updated_signal.emit(s.current_iter, time.perf_counter())
+                self.simulation.iter(iterations, up)
+            finally:
+                self.simulation_done_signal.emit()
+
+        self.simu_executor.submit(run)
+
+    def simulation_done(self):
+        if self.save_pos:
+            self.pos_IO.close()
 
-            self.enable_process_tab(True)
-            self.ui.simuBtn.setEnabled(True)
-            self.ui.iterationsSpinBox.setEnabled(True)
-            self.ui.tryToUseGPUCheckBox.setEnabled(True)
-            self.ui.simulationTimeLineEdit.setEnabled(True)
-            self.ui.temperature_groupBox.setEnabled(True)
-            self.ui.groupBoxMovie.setEnabled(self.save_pos)
-            self.ui.statusbar.showMessage("Simulation complete. (Iterations : " + str(self.simulation.current_iter) + ")")
-
-        self.simu_thr = QThread()
-        self.simu_thr.run = run
-        self.simu_thr.finished.connect(end)
-        self.simu_thr.start()
+        with DynState(tmp_path).open(DynState.STATE_FCT, mode="w") as ds:
+            ds.from_dict(self.simulation.state_fct)
+
+        self.enable_process_tab(True)
+        self.ui.simuBtn.setEnabled(True)
+        self.ui.iterationsSpinBox.setEnabled(True)
+        self.ui.tryToUseGPUCheckBox.setEnabled(True)
+        self.ui.simulationTimeLineEdit.setEnabled(True)
+        self.ui.temperature_groupBox.setEnabled(True)
+        self.ui.groupBoxMovie.setEnabled(self.save_pos)
+        self.ui.statusbar.showMessage("Simulation complete. (Iterations : " + str(self.simulation.current_iter) + ")")
 
     def enable_process_tab(self, b):
         self.ui.tab_processing.setEnabled(b)
@@ -471,12 +476,28 @@ class MoldynMainWindow(QMainWindow):
             #shutil.rmtree('./data/tmp1')
             ds = DynState(tmp_path)
             if not self.ui.saveAllAtomsPositionCheckBox.checkState():
-                try:
-                    os.remove(tmp_path+'/'+DynState.POS_H)
-                except:
-                    pass
+                for file in (DynState.TRAJ, DynState.POS_H):
+                    try:
+                        os.remove(tmp_path+'/'+file)
+                    except:
+                        pass
             ds.save_model(self.simulation.model)
-            ds.to_zip(path)
+
+            # l'archive peut être volumineuse : elle est écrite par un autre thread
+            def run():
+                def up(done, total):
+                    self.save_progress_signal.emit(f"Saving simulation history... {100*done//max(total, 1)} %")
+                ds.to_zip(path, callback=up)
+
+            def end():
+                self.ui.tab_processing.setEnabled(True)
+                self.ui.statusbar.showMessage("Simulation history saved.")
+
+            self.ui.tab_processing.setEnabled(False)
+            self.save_thr = QThread()
+            self.save_thr.run = run
+            self.save_thr.finished.connect(end)
+            self.save_thr.start()
 
     def export_to_csv(self):
         path, filter = QFileDialog.getSaveFileName(caption="Export to CSV", filter="CSV file (*.csv)",
@@ -617,7 +638,7 @@ class MoldynMainWindow(QMainWindow):
                 def up(k):
                     self.movie_progress_signal.emit(k)
 
-                visu.make_movie(self.simulation, DynState(tmp_path), path, self.ui.stepsByFrameSpinBox.value(),
+                visu.make_movie(self.simulation, self.history_ds, path, self.ui.stepsByFrameSpinBox.value(),
                                 self.ui.FPSSpinBox.value(), callback=up)
 
             def end():
@@ -0,0 +1,12 @@
+import importlib
+
+__all__ = ["appdirs", "data_mng", "gl_util", "trajectory", "types"]
+
+def __getattr__(name):
+    # modules importés au premier accès, seulement s'ils sont utilisés
+    if name in __all__:
+        return importlib.import_module("." + name, __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -1,9 +1,12 @@
 # -*-encoding: utf-8 -*-
 import os, sys
+import shutil
+import hashlib
 from functools import wraps
 
 import numpy as np
 import json
+import time
 import datetime
 try:
     import fcntl
@@ -13,11 +16,24 @@ except ImportError:
 from . import datreant as dt
 from zipfile import *
 from . import appdirs
+from ..simulation.observables import Series, SERIES
+from .trajectory import Trajectory, TrajectoryWriter
 
 data_path = appdirs.user_data_dir("open-moldyn")
 tmp_path = data_path + "/tmp_sim"
 tmp1_path = data_path + "/tmp_mdl"
 
+# fichier marquant les répertoires d'extraction créés par DynState (archive et version extraites)
+EXTRACTION_MARK = ".moldyn_extraction.json"
+
+# compression des membres d'une archive, selon l'extension : la trajectoire n'est pas compressée, pour être lue sur place
+ZIP_COMPRESSION = {
+    ".mdt": ZIP_STORED,
+    ".npy": ZIP_DEFLATED,
+    ".npz": ZIP_DEFLATED,
+    ".json": ZIP_DEFLATED,
+}
+
 CATEGORY_LIST = [
     "npart",
     "spc1",
@@ -48,6 +64,9 @@ class ParamIO(dict):
         The treant that support the leaf (file) associated with it.
     file_name : datreant.Leaf
         The file name of the json file associated with it.
+    archive : tuple
+        Zip archive and member name from which the json file is read instead of file_name, if set (see `DynState`).
+        It is then only written to file_name if modified.
 
     Example
     -------
@@ -62,6 +81,8 @@ class ParamIO(dict):
         # in the .json file
     """
 
+    archive = None
+
     def __init__(self, dynState : dt.Treant, file: dt.Leaf, **kwargs):
         """
 
@@ -88,8 +109,7 @@ class ParamIO(dict):
         self : ParamIO
         """
         try:
-            with open(self.file_name, mode='r') as file:
-                params = json.load(self.file_name)
+            params = self._read()
             for key, value in params.items():
                 self[key] = value
         except json.decoder.JSONDecodeError:
@@ -117,9 +137,8 @@ class ParamIO(dict):
         """
         param_exists = False
         try:
-            with open(self.file_name, mode='r') as file:
-                params = json.load(self.file_name)
-                param_exists = True
+            params = self._read()
+            param_exists = True
         except json.decoder.JSONDecodeError:
             print("File corrupted")
             pass
@@ -132,6 +151,13 @@ class ParamIO(dict):
             #self.dynState.categories['last modified'] = datetime.datetime.now().strftime('%d/%m/%Y-%X')
         #self._update_categories()
 
+    def _read(self):
+        if self.archive is not None:
+            with ZipFile(self.archive[0]) as archive:
+                return json.loads(archive.read(self.archive[1]).decode("utf-8"))
+        with open(self.file_name, mode='r') as file:
+            return json.load(file)
+
     def from_dict(self, rdict: dict):
         """
         Copy rdict into itself
@@ -188,6 +214,102 @@ class ParamIO(dict):
             if key in CATEGORY_LIST:
                 self.dynState.categories[key] = value
 
+class StateFctIO(ParamIO):
+    """
+    An interface to interact with the binary state function file as a dictionary, with a context manager.
+
+    Works like `ParamIO`, but the file is a numpy .npz archive : state functions recorded at each iteration are
+    loaded as `moldyn.simulation.observables.Series`, and set point ramps as lists.
+
+    Example
+    -------
+    .. code-block:: python
+
+        t = DynState(dirpath)
+        with t.open(t.STATE_FCT, 'w') as IO:
+            IO.from_dict(simulation.state_fct)
+    """
+
+    def __enter__(self):
+        """
+        Try to load the content of the .npz file into itself.
+
+        Returns
+        -------
+        self : StateFctIO
+        """
+        try:
+            if self.archive is not None:
+                with ZipFile(self.archive[0]) as archive, archive.open(self.archive[1]) as file, np.load(file) as data:
+                    for key in data.files:
+                        self[key] = _state_fct_value(key, data[key])
+            else:
+                with np.load(str(self.file_name.abspath)) as data:
+                    for key in data.files:
+                        self[key] = _state_fct_value(key, data[key])
+        except FileNotFoundError:
+            pass
+
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """
+        Store itself into the .npz file, if no exception was raised and it was not read from an archive.
+
+        Parameters
+        ----------
+        exc_type
+        exc_val
+        exc_tb
+        """
+        if exc_type is None and self.archive is None:
+            with open(str(self.file_name.abspath), mode='wb') as file:
+                np.savez(file, **{key: np.asarray(value, dtype=np.float64) for key, value in self.items()})
+
+
+def _open_member(path, info):
+    # le membre reste lisible après la fermeture de l'archive, jusqu'à sa propre fermeture
+    with ZipFile(path) as archive:
+        return archive.open(info)
+
+
+def _archive_version(archive):
+    # version d'une archive : son chemin, sa taille et sa date de modification
+    stat = os.stat(archive)
+    return f"{os.path.abspath(archive)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def _extraction_path(archive):
+    # répertoire propre à l'archive, et à son contenu : les fichiers extraits d'une autre archive (ou d'une version
+    # précédente de celle-ci) ne peuvent pas masquer ses membres
+    return os.path.join(data_path, "tmp", hashlib.sha1(_archive_version(archive).encode()).hexdigest()[:16])
+
+
+def _clean_extractions(keep):
+    # supprime les répertoires d'extraction créés par DynState pour des archives supprimées ou modifiées depuis
+    root = os.path.dirname(keep)
+    if not os.path.isdir(root):
+        return
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if path == keep:
+            continue
+        try:
+            with open(os.path.join(path, EXTRACTION_MARK)) as file:
+                archive, version = json.load(file)
+        except (OSError, ValueError): # pas un répertoire d'extraction
+            continue
+        if not os.path.exists(archive) or _archive_version(archive) != version:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def _state_fct_value(key, value):
+    # les fonctions d'état enregistrées à chaque itération sont des Series, les consignes des listes
+    if key in SERIES:
+        return Series(value)
+    return np.asarray(value).tolist()
+
+
 class NumpyIO:
     """
     An interface to interact with numpy save files with a context manager.
@@ -202,6 +324,8 @@ class NumpyIO:
         The file name of the .npy file associated with it.
     file : file object
         the file that is opened (contains None until entering a context manager)
+    archive : tuple
+        Zip archive and member name from which the array is read instead of file_name, if set (see `DynState`).
 
     Example
     -------
@@ -214,11 +338,14 @@ class NumpyIO:
         with t.open("pos.npy", 'w') as IO:
             IO.save(arr) #save an array
     """
+    archive = None
+
     def __init__(self, dynState, file : dt.Leaf, mode):
         self.dynState = dynState
         self.mode = mode
         self.file_name = file
         self.file = None
+        self._zip = None
 
     def __enter__(self):
         self.open()
@@ -231,13 +358,20 @@ class NumpyIO:
         """
         Open the internal file.
         """
-        self.file = open(self.file_name, mode=self.mode)
+        if self.archive is not None:
+            self._zip = ZipFile(self.archive[0])
+            self.file = self._zip.open(self.archive[1])
+        else:
+            self.file = open(self.file_name, mode=self.mode)
 
     def close(self):
         """
         Close the internal file.
         """
         self.file.close()
+        if self._zip is not None:
+            self._zip.close()
+            self._zip = None
 
     def save(self, arr):
         """
@@ -269,38 +403,111 @@ class DynState(dt.Treant):
     """
     A Treant specialized for handling .npy and .json files for moldyn
 
+    If created from a .zip (or .mds, .mdl) archive, the archive is not extracted : files are read directly from it
+    (the trajectory through `np.memmap` if it is stored without compression), and written to the extraction
+    directory, where they take precedence over the archive. Each archive (and each version of it) has its own
+    extraction directory in `data_path/tmp`, where files written by a previous opening are discarded ; directories of
+    archives deleted or modified since are removed when an archive is opened. If `extraction_path` is given, it is
+    used as is : files already in it take precedence over the archive, and nothing is removed.
+
     Attributes
     ----------
     POS: str
         standard name of the position file ("pos.npy")
     POS_H: str
-        standard name of the position history file ("pos_history.npy")
+        name of the position history file of older simulations ("pos_history.npy")
+    TRAJ: str
+        standard name of the trajectory file ("trajectory.mdt", see `moldyn.utils.trajectory`)
     VEL: str
         standard name of the velocity file ("velocities.npy")
     STATE_FCT: str
-        standard name of the state function file ("state_fct.json")
+        standard name of the state function file ("state_fct.npz")
+    STATE_FCT_JSON: str
+        name of the state function file of older simulations ("state_fct.json")
+    CHECKPOINT: str
+        standard name of the checkpoint file ("checkpoint.npz", see `moldyn.simulation.runner.Simulation.checkpoint`)
+    TIMINGS: str
+        standard name of the timing summary file ("timings.json", see `moldyn.simulation.profiler.StepProfiler`)
     PAR: str
         standard name of the parameter file ("parameters.json")
+    archive: str
+        path of the archive the DynState was created from (None if it is a directory)
     """
     POS = "pos.npy"  # position of particles
-    POS_H = "pos_history.npy"  # history of position
+    POS_H = "pos_history.npy"  # ancien format de l'historique des positions, encore lu
+    TRAJ = "trajectory.mdt"  # history of position (and optionally velocities and forces)
     VEL = "velocities.npy"  # final velocities
-    STATE_FCT = "state_fct.json"  # state functions (energy, temperature...)
+    STATE_FCT = "state_fct.npz"  # state functions (energy, temperature...)
+    STATE_FCT_JSON = "state_fct.json"  # ancien format, encore lu
     PAR = "parameters.json"  # parameters of model and simulation
+    CHECKPOINT = "checkpoint.npz"  # state of a simulation, to resume it
+    TIMINGS = "timings.json"  # time spent in each phase of the iterations
 
-    def __init__(self, treant, *, extraction_path : str = data_path+'/tmp'):
+    def __init__(self, treant, *, extraction_path : str = None):
+        self.archive = None
+        self._members = dict()
         if isinstance(treant, dt.Treant):
             super().__init__(treant)
         elif isinstance(treant, str) and is_zipfile(treant) :
             try:
                 with ZipFile(treant, 'r') as archive:
-                    archive.extractall(extraction_path)
-                    super().__init__(extraction_path)
+                    self._members = {info.filename: info for info in archive.infolist()}
             except BadZipFile:
                 pass
+            else:
+                self.archive = treant
+                if extraction_path is not None:
+                    super().__init__(extraction_path)
+                else:
+                    extraction_path = _extraction_path(treant)
+                    _clean_extractions(extraction_path)
+                    super().__init__(extraction_path)
+                    # fichiers écrits lors d'une ouverture précédente, qui masqueraient ceux de l'archive
+                    for name in self._members:
+                        if self.leafloc[name].exists:
+                            os.remove(self.leafloc[name].abspath)
+                    with open(os.path.join(extraction_path, EXTRACTION_MARK), "w") as file:
+                        json.dump([os.path.abspath(treant), _archive_version(treant)], file)
         else:
             super().__init__(treant)
 
+    def _archived(self, file):
+        # membre de l'archive lu à la place du fichier, s'il n'a pas été écrit dans le répertoire d'extraction
+        if file in self._members and not self.leafloc[file].exists:
+            return self._members[file]
+        return None
+
+    def exists(self, file):
+        """
+        Check if a file is in this tree or in the archive it was created from.
+
+        Parameters
+        ----------
+        file: str
+            The name of the file.
+
+        Returns
+        -------
+        bool
+        """
+        return self.leafloc[file].exists or file in self._members
+
+    def _open_trajectory(self):
+        info = self._archived(self.TRAJ)
+        if info is None:
+            return Trajectory(self.leafloc[self.TRAJ].abspath)
+        if info.compress_type != ZIP_STORED:
+            # seul un membre non compressé peut être lu sur place
+            with ZipFile(self.archive) as archive:
+                archive.extract(info, str(self.abspath))
+            return Trajectory(self.leafloc[self.TRAJ].abspath)
+        with open(self.archive, "rb") as file:
+            # en-tête local : les données suivent le nom et le champ extra du membre
+            file.seek(info.header_offset + 26)
+            name_len, extra_len = np.frombuffer(file.read(4), dtype="<u2")
+        return Trajectory(self.archive, offset=info.header_offset + 30 + int(name_len) + int(extra_len),
+                          size=info.file_size)
+
     def open(self, file, mode='r'):
         """
         Open the file in this tree (ie. directory and subdir).
@@ -323,6 +530,10 @@ class DynState(dt.Treant):
         Returns
         -------
         If file is a .npy file, return a NumpyIO object.
+        If file is a .npz file, return a StateFctIO object.
+        If file is a .mdt file, return a Trajectory object (read only, see :py:meth:`trajectory_writer` to write).
+        If the DynState was created from an archive and the file was not written since, it is read directly from
+        the archive (files of other types are extracted first).
         If file is a .json file, return a ParamIO object.
         Else, return a StringIO or a BytesIO depending on mode.
 
@@ -340,32 +551,255 @@ class DynState(dt.Treant):
             with t.open("pos.npy", 'w') as IO:
                 IO.save(arr) #save an array
         """
+        # lecture directe dans l'archive, si le fichier n'a pas été réécrit (les paramètres sont toujours relus, puis
+        # écrits dans le répertoire seulement s'ils ont changé)
+        info = self._archived(file) if mode == 'r' or file.endswith(".json") else None
         if file.endswith(".npy"):
             if not(mode.endswith("+b")):
                 mode += "+b"
-            return NumpyIO(self, self.leafloc[file], mode)
+            IO = NumpyIO(self, self.leafloc[file], mode)
+        elif file.endswith(".npz"):
+            IO = StateFctIO(self, self.leafloc[file])
+        elif file.endswith(".mdt"):
+            return self._open_trajectory()
         elif file.endswith(".json"):
-            return ParamIO(self, self.leafloc[file])
+            IO = ParamIO(self, self.leafloc[file])
+        elif info is not None:
+            with ZipFile(self.archive) as archive:
+                archive.extract(info, str(self.abspath))
+            return open(self.leafloc[file].abspath, mode)
         else:
             return open(self.leafloc[file].abspath, mode)
+        if info is not None:
+            IO.archive = (self.archive, file)
+        return IO
 
     def add_tag(self,*tags):
         self.tags.add(*tags)
 
-    def to_zip(self, path: str):
+    def _zip_members(self):
+        # (nom, taille, date, ouverture en lecture) de chaque fichier, lu dans le répertoire ou dans l'archive
+        members = dict()
+        for leaf in self.leaves():
+            if leaf.exists:
+                name = str(leaf.abspath).replace('\\', '/').split('/')[-1]
+                path = str(leaf.abspath)
+                stat = os.stat(path)
+                members[name] = (stat.st_size, time.localtime(stat.st_mtime)[:6],
+                                 lambda path=path: open(path, "rb"))
+        for name, info in self._members.items():
+            if name not in members:
+                members[name] = (info.file_size, info.date_time, lambda info=info: _open_member(self.archive, info))
+        return members
+
+    def to_zip(self, path: str, compression=None, level=6, callback=None):
         """
         Zip every leaf (aka. file) of the dynState treant into an archive at path.
 
+        Each file is stored or compressed according to its extension (see `ZIP_COMPRESSION`) : by default, the
+        trajectory is stored without compression, so that it can be read in place (see `DynState`). Files are streamed
+        to the archive by blocks, so that memory use stays bounded and `callback` is called while large files are
+        compressed.
+
+        If the DynState was created from an archive, its members that were not rewritten are copied too.
+
         Parameters
         ----------
         path : str
             The path of the archive.
+        compression : dict
+            Compression of files (`zipfile.ZIP_STORED` or `zipfile.ZIP_DEFLATED`) by extension, overriding
+            `ZIP_COMPRESSION`. Other files are stored.
+        level : int
+            Compression level (from 1 to 9).
+        callback : function
+            An optional callback function that is called as data is written, and is passed the number of bytes
+            already written and the total number of bytes.
+        """
+        modes = dict(ZIP_COMPRESSION)
+        modes.update(compression or {})
+        members = self._zip_members()
+        total = sum(size for size, _, _ in members.values())
+        done = 0
+
+        with ZipFile(path, "w", allowZip64=True) as archive:
+            for name, (size, date_time, source) in members.items():
+                zinfo = ZipInfo(name, date_time)
+                zinfo.compress_type = modes.get(os.path.splitext(name)[1], ZIP_STORED)
+                zinfo.file_size = size
+                if zinfo.compress_type == ZIP_DEFLATED:
+                    if hasattr(ZipInfo, "compress_level"):
+                        zinfo.compress_level = level
+                    else: # avant Python 3.13
+                        zinfo._compresslevel = level
+                # zlib libère le GIL : l'interface graphique reste fluide pendant la compression
+                with source() as src, archive.open(zinfo, "w", force_zip64=size > 2**30) as dst:
+                    while True:
+                        block = src.read(2**22)
+                        if not block:
+                            break
+                        dst.write(block)
+                        done += len(block)
+                        if callback:
+                            callback(done, total)
+                if callback:
+                    callback(done, total)
+
+    def load_state_fct(self):
         """
-        with ZipFile(path, "w") as archive:
-            for leaf in self.leaves():
-                if leaf.exists:
-                    leaf_path = str(leaf.abspath).replace('\\', '/').split('/')[-1]
-                    archive.write(leaf.relpath, arcname=leaf_path)
+        Load the state functions, from the binary file or, for older simulations, from the json file.
+
+        Returns
+        -------
+        dict
+            State functions (see `moldyn.simulation.runner.Simulation`).
+        """
+        state_fct = dict()
+        if self.exists(self.STATE_FCT) or not self.exists(self.STATE_FCT_JSON):
+            with self.open(self.STATE_FCT, 'r') as IO:
+                IO.to_dict(state_fct)
+        else:
+            with self.open(self.STATE_FCT_JSON, 'r') as IO:
+                for key, value in IO.items():
+                    state_fct[key] = _state_fct_value(key, value)
+        return state_fct
+
+    def trajectory_writer(self, npart, mode='w', **kwargs):
+        """
+        Open the trajectory file for writing.
+
+        Parameters
+        ----------
+        npart : int
+            Number of atoms.
+        mode : str (default='w')
+            'w' to create a new trajectory, 'a' to append frames to the existing one.
+        kwargs
+            Passed to `moldyn.utils.trajectory.TrajectoryWriter` (dtype, stride, channels).
+
+        Returns
+        -------
+        TrajectoryWriter
+        """
+        return TrajectoryWriter(self.leafloc[self.TRAJ].abspath, npart, mode=mode, **kwargs)
+
+    def load_trajectory(self):
+        """
+        Load the trajectory. The position history of older simulations is converted once to the trajectory format.
+
+        Returns
+        -------
+        Trajectory
+            The trajectory, or None if no position history was saved.
+        """
+        if not self.exists(self.TRAJ):
+            if not self.exists(self.POS_H):
+                return None
+            with self.open(self.POS_H, 'r') as IO:
+                writer = None
+                k = 0
+                while True:
+                    try:
+                        pos = IO.load()
+                    except (EOFError, ValueError): # fin du fichier
+                        break
+                    if writer is None:
+                        writer = self.trajectory_writer(len(pos))
+                    writer.write(k, pos=pos)
+                    k += 1
+            if writer is None:
+                return None
+            writer.close()
+        return self.open(self.TRAJ, 'r')
+
+    def write_checkpoint(self, arrays, meta):
+        """
+        Write a checkpoint atomically : the previous checkpoint is only replaced once the new one is complete.
+
+        Parameters
+        ----------
+        arrays : dict
+            Arrays to save, by name.
+        meta : dict
+            Other values, saved as json.
+        """
+        path = str(self.leafloc[self.CHECKPOINT].abspath)
+        with open(path + ".tmp", mode='wb') as file:
+            np.savez(file, meta=np.array(json.dumps(meta)), **arrays)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(path + ".tmp", path)
+
+    def read_checkpoint(self):
+        """
+        Read the checkpoint.
+
+        Returns
+        -------
+        arrays : dict
+            Saved arrays, by name.
+        meta : dict
+            Other saved values.
+        """
+        if self._archived(self.CHECKPOINT) is not None:
+            with ZipFile(self.archive) as archive, archive.open(self.CHECKPOINT) as file, np.load(file) as data:
+                arrays = {key: data[key] for key in data.files}
+        else:
+            with np.load(str(self.leafloc[self.CHECKPOINT].abspath)) as data:
+                arrays = {key: data[key] for key in data.files}
+        return arrays, json.loads(str(arrays.pop("meta")))
+
+    def save_timings(self, summary):
+        """
+        Save the timing summary of a profiled simulation.
+
+        Parameters
+        ----------
+        summary : dict
+            Summary returned by `moldyn.simulation.profiler.StepProfiler.summary`.
+        """
+        with self.open(self.TIMINGS, 'w') as IO:
+            IO.from_dict(summary)
+
+    def load_timings(self):
+        """
+        Load the timing summary saved with :py:meth:`save_timings`.
+
+        Returns
+        -------
+        dict
+            The summary, or None if the simulation was not profiled.
+        """
+        if not self.exists(self.TIMINGS):
+            return None
+        timings = dict()
+        with self.open(self.TIMINGS, 'r') as IO:
+            IO.to_dict(timings)
+        return timings
+
+    def load_model(self):
+        """
+        Load the model saved with :py:meth:`save_model`.
+
+        Returns
+        -------
+        simulation.builder.Model
+        """
+        from ..simulation.builder import Model # builder importe ce module
+
+        model = Model()
+        # position of particles
+        with self.open(self.POS, 'r') as IO:
+            model.pos = IO.load()
+        # parameters
+        with self.open(self.PAR) as IO:
+            for key, item in IO.items():
+                model.params[key] = item
+        # velocity
+        with self.open(self.VEL, 'r') as IO:
+            model.v = IO.load()
+        model._m()
+        return model
 
     def save_model(self, model):
         """
@@ -1,11 +1,16 @@
 # -*-encoding: utf-8 -*-
-import moderngl
 import os
+import re
+
+_include = re.compile(r'^#include "(.+)"$', re.MULTILINE)
 
 def source(uri, consts={}):
     """
     Reads and replaces constants (in all caps) in a text file.
 
+    Lines such as :code:`#include "file.glsl"` are replaced by the contents of the file (path relative to `uri`),
+    so that shaders can share code.
+
     Parameters
     ----------
     uri : str
@@ -23,6 +28,8 @@ def source(uri, consts={}):
     with open(uri, 'r') as fp:
         content = fp.read()
 
+    content = _include.sub(lambda m: source(os.path.join(os.path.dirname(uri), m.group(1))), content)
+
     # feed constant values
     for key, value in consts.items():
         content = content.replace(f"%%{key}%%".upper(), str(value))
@@ -39,11 +46,18 @@ def testGL():
         Initialisation success.
 
     """
+    import moderngl
+
     f = source(os.path.dirname(__file__)+'/dummy.glsl', {"X":50})
     try:
         context = moderngl.create_standalone_context(require=430)
+    except:
+        return False
+    try:
         context.compute_shader(f)
     except:
         return False
     else:
         return True
+    finally:
+        context.release()
@@ -0,0 +1,138 @@
+# -*-encoding: utf-8 -*-
+"""
+Import-time benchmark.
+
+Subpackages and costly dependencies (numba, moderngl, scipy, matplotlib, Qt...) are only imported by the modules that
+use them, and OpenGL is only probed when the first context is created : building or loading a model on a headless
+node should not pay for the graphical interface nor for the compute back ends. :py:func:`benchmark` (or the
+`moldyn-importtime` command) checks that it stays so, by importing modules in fresh interpreters.
+
+Example
+-------
+.. code-block:: bash
+
+    moldyn-importtime # exit status 1 if a budget is exceeded
+    moldyn-importtime moldyn.processing.data_proc --repeat 3
+"""
+
+import sys
+import json
+import subprocess
+
+GUI_MODULES = ("PyQt5", "matplotlib", "PIL", "imageio")
+COMPUTE_MODULES = ("numba", "moderngl", "numexpr", "scipy")
+
+BUDGETS = {
+    "moldyn": (0.02, GUI_MODULES + COMPUTE_MODULES + ("numpy",)),
+    "moldyn.simulation.builder": (0.03, GUI_MODULES + COMPUTE_MODULES),
+    "moldyn.simulation.runner": (None, GUI_MODULES + ("scipy.interpolate", "moldyn.utils.datreant")),
+    "moldyn.cli": (None, GUI_MODULES + ("scipy.interpolate",)),
+}
+"""
+dict : For each module, maximal import time (in s, on top of the import of numpy, `None` if not checked) and modules
+that it must not import.
+"""
+
+_SCRIPT = """
+import sys, time, json
+start = time.perf_counter()
+import {}
+elapsed = time.perf_counter() - start
+print(json.dumps([elapsed, sorted(sys.modules)]))
+"""
+
+
+def measure(module, repeat=5, python=sys.executable):
+    """
+    Imports `module` in fresh interpreters.
+
+    Parameters
+    ----------
+    module : str
+        Name of the module.
+    repeat : int
+        Number of interpreters.
+    python : str
+        Interpreter.
+
+    Returns
+    -------
+    tuple
+        Shortest import time (in s), and names of the modules loaded once `module` is imported.
+    """
+    best = None
+    modules = []
+    for _ in range(repeat):
+        out = subprocess.run([python, "-c", _SCRIPT.format(module)], check=True, capture_output=True, text=True)
+        elapsed, modules = json.loads(out.stdout.splitlines()[-1])
+        best = elapsed if best is None else min(best, elapsed)
+    return best, modules
+
+
+def benchmark(budgets=None, repeat=5, python=sys.executable):
+    """
+    Measures import times, and checks them against their budget.
+
+    Parameters
+    ----------
+    budgets : dict
+        Same as :py:data:`BUDGETS` (the default).
+    repeat : int
+        Number of interpreters per module (the shortest time is kept).
+    python : str
+        Interpreter.
+
+    Returns
+    -------
+    list
+        For each module, a dict with its name, its import time (`"time"`), the import time of numpy (`"numpy"`),
+        its budget, the forbidden modules it imported (`"forbidden"`) and whether it passed (`"ok"`).
+    """
+    budgets = BUDGETS if budgets is None else budgets
+    numpy_time, _ = measure("numpy", repeat, python)
+
+    results = []
+    for module, (budget, forbidden) in budgets.items():
+        elapsed, loaded = measure(module, repeat, python)
+        loaded = set(loaded)
+        found = [name for name in forbidden if name in loaded]
+        ok = not found and (budget is None or elapsed - ("numpy" in loaded) * numpy_time <= budget)
+        results.append(dict(module=module, time=elapsed, numpy=numpy_time, budget=budget, forbidden=found, ok=ok))
+    return results
+
+
+def main(argv=None):
+    """
+    Entry point of `moldyn-importtime`.
+
+    Parameters
+    ----------
+    argv : list
+        Arguments (defaults to those of the command line).
+
+    Returns
+    -------
+    int
+        Exit status : 1 if a module exceeds its budget.
+    """
+    import argparse
+
+    p = argparse.ArgumentParser(prog="moldyn-importtime",
+                                description="Measures the import time of moldyn modules in fresh interpreters.")
+    p.add_argument("modules", nargs="*", help="modules to measure, without budget (defaults to the checked ones)")
+    p.add_argument("--repeat", type=int, default=5, help="interpreters per module, the shortest time is kept")
+    args = p.parse_args(argv)
+
+    budgets = {module: (None, ()) for module in args.modules} if args.modules else None
+    results = benchmark(budgets, args.repeat)
+
+    print(f"{'numpy':40} {1e3*results[0]['numpy']:8.1f} ms")
+    for r in results:
+        budget = "" if r["budget"] is None else f" (budget : numpy + {1e3*r['budget']:.0f} ms)"
+        forbidden = f" imports {', '.join(r['forbidden'])}" if r["forbidden"] else ""
+        print(f"{r['module']:40} {1e3*r['time']:8.1f} ms{budget}{forbidden}{'' if r['ok'] else '  FAILED'}")
+    return 0 if all(r["ok"] for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
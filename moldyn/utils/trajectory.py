@@ -0,0 +1,707 @@
+# -*-encoding: utf-8 -*-
+"""
+Binary trajectory files : positions (and optionally speeds and forces) of all atoms, saved every few iterations.
+
+A trajectory file is made of a fixed-size header (magic string, then a json description : number of atoms, dtype,
+channels, stride between frames...), followed by fixed-size frame records. Frame `k` is thus at offset
+:code:`HEADER_SIZE + k*frame_size`, and the whole file can be read through `np.memmap` without loading it.
+
+Example
+-------
+.. code-block:: python
+
+    with TrajectoryWriter("trajectory.mdt", model.npart, channels=("pos", "v")) as traj:
+        simulation.iter(1000, lambda s: traj.write(s.current_iter, pos=s.model.pos, v=s.model.v))
+
+    traj = Trajectory("trajectory.mdt")
+    len(traj), traj[-1], traj.channel("v")[10:20].mean(axis=(0, 1))
+
+Frames can also be written by a background thread (see `AsyncTrajectoryWriter`), so that the simulation does not wait
+for the disk.
+
+Compressed trajectories (`"zlib"` or `"lzma"` codec, see `QuantizedCodec`) are made of chunks of frames instead : each
+chunk starts with its size, its number of frames and their iteration numbers, so that the chunk holding frame `k` is
+found without decompressing the others.
+"""
+
+import os
+import json
+import lzma
+import time
+import zlib
+import queue
+import threading
+import numpy as np
+
+MAGIC = b"MOLDYNTJ"
+VERSION = 1
+HEADER_SIZE = 4096
+CHANNELS = ("pos", "v", "F")
+CODECS = ("raw", "zlib", "lzma")
+
+# en-tête de chaque bloc compressé, suivi des numéros d'itération des images (int64), puis des données compressées
+_CHUNK_HEAD = np.dtype([("size", "<u8"), ("frames", "<u4"), ("reserved", "<u4")])
+
+
+def _record_dtype(npart, dtype, channels):
+    return np.dtype([("iteration", "<i8")] + [(c, dtype, (npart, 2)) for c in channels])
+
+
+def read_header(file):
+    """
+    Reads the header of a trajectory file.
+
+    Parameters
+    ----------
+    file : file object
+        Binary file, whose position is at the start of the trajectory.
+
+    Returns
+    -------
+    dict
+        Description of the trajectory.
+    """
+    if file.read(len(MAGIC)) != MAGIC:
+        raise ValueError("Not a trajectory file")
+    size = int(np.frombuffer(file.read(4), dtype="<u4")[0])
+    header = json.loads(file.read(size - len(MAGIC) - 4).decode("utf-8"))
+    header["header_size"] = size
+    return header
+
+
+def write_header(file, header):
+    """
+    Writes the header of a trajectory file.
+
+    Parameters
+    ----------
+    file : file object
+        Binary file, whose position is at the start of the trajectory.
+    header : dict
+        Description of the trajectory.
+    """
+    data = json.dumps(header).encode("utf-8")
+    if len(data) > HEADER_SIZE - len(MAGIC) - 4:
+        raise ValueError("Trajectory header too large")
+    file.write(MAGIC)
+    file.write(np.array([HEADER_SIZE], dtype="<u4").tobytes())
+    file.write(data.ljust(HEADER_SIZE - len(MAGIC) - 4, b" "))
+
+
+class QuantizedCodec:
+    """
+    Lossy compression of frame records.
+
+    Positions are rounded to a multiple of `precision` relative to the lower limits of the box, stored as integer
+    differences from the previous frame of the chunk (bytes grouped by weight), and compressed with zlib or lzma. The error on positions is
+    at most `precision/2`. Other channels (speeds, forces) are compressed without loss.
+
+    Parameters
+    ----------
+    header : dict
+        Description of the trajectory (`codec`, `precision` and `origin` entries are used).
+    dtype : np.dtype
+        Dtype of frame records.
+    """
+
+    def __init__(self, header, dtype):
+        self.dtype = dtype
+        self.channels = header["channels"]
+        self.precision = float(header["precision"])
+        self.origin = np.array(header["origin"], dtype=np.float64)
+        if header["codec"] == "zlib":
+            self._compress, self._decompress = zlib.compress, zlib.decompress
+        else:
+            self._compress, self._decompress = lzma.compress, lzma.decompress
+
+    def encode(self, records):
+        """
+
+        Parameters
+        ----------
+        records : np.ndarray
+            Frame records.
+
+        Returns
+        -------
+        bytes
+            Compressed data.
+        """
+        parts = []
+        for c in self.channels:
+            if c == "pos":
+                q = np.rint((records[c] - self.origin) / self.precision)
+                if len(q) and np.abs(q).max() >= 2**31:
+                    raise ValueError("Trajectory precision too small for the size of the box")
+                d = np.empty(q.shape, dtype="<i4")
+                d[:1] = q[:1]
+                d[1:] = np.diff(q, axis=0)
+                # octets regroupés par poids : les poids forts des petites différences sont presque tous nuls
+                parts.append(np.ascontiguousarray(d.view(np.uint8).reshape((-1, 4)).T).tobytes())
+            else:
+                parts.append(np.ascontiguousarray(records[c]).tobytes())
+        return self._compress(b"".join(parts))
+
+    def decode(self, data, iterations):
+        """
+
+        Parameters
+        ----------
+        data : bytes
+            Compressed data.
+        iterations : np.ndarray
+            Iteration number of each frame.
+
+        Returns
+        -------
+        np.ndarray
+            Frame records.
+        """
+        n = len(iterations)
+        records = np.empty((n,), dtype=self.dtype)
+        records["iteration"] = iterations
+        data = self._decompress(data)
+        offset = 0
+        for c in self.channels:
+            shape = records[c].shape
+            if c == "pos":
+                size = int(np.prod(shape))
+                d = np.frombuffer(data, dtype=np.uint8, count=4 * size, offset=offset)
+                offset += d.nbytes
+                d = np.ascontiguousarray(d.reshape((4, size)).T).view("<i4").reshape(shape)
+                records[c] = np.cumsum(d, axis=0, dtype=np.int64) * self.precision + self.origin
+            else:
+                a = np.frombuffer(data, dtype=records[c].dtype, count=int(np.prod(shape)), offset=offset)
+                offset += a.nbytes
+                records[c] = a.reshape(shape)
+        return records
+
+
+def _scan_chunks(file, header_size, size=None):
+    # index des blocs compressés : position, nombre d'images et numéros d'itération ; un bloc incomplet est ignoré
+    if size is None:
+        size = os.fstat(file.fileno()).st_size
+    offsets, iterations = [], []
+    offset = header_size
+    while offset + _CHUNK_HEAD.itemsize <= size:
+        file.seek(offset)
+        head = np.frombuffer(file.read(_CHUNK_HEAD.itemsize), dtype=_CHUNK_HEAD)[0]
+        n = int(head["frames"])
+        end = offset + _CHUNK_HEAD.itemsize + 8 * n + int(head["size"])
+        if end > size:
+            break
+        iterations.append(np.frombuffer(file.read(8 * n), dtype="<i8"))
+        offsets.append(offset)
+        offset = end
+    return offsets, iterations, offset
+
+
+def _fill(record, channels, iteration, arrays):
+    record["iteration"] = iteration
+    for c in channels:
+        record[c] = arrays.get(c, 0.0)
+
+
+class TrajectoryWriter:
+    """
+    Writes frames to a trajectory file.
+
+    Designed to be used with a context manager (the with statement) ; the file is closed when leaving it.
+
+    Parameters
+    ----------
+    path : str
+        Path of the trajectory file.
+    npart : int
+        Number of atoms.
+    dtype : str
+        Dtype of saved arrays (eg. `"f4"` to halve the file size).
+    stride : int
+        Number of iterations between two frames (informative).
+    channels : tuple
+        Saved arrays, among `"pos"`, `"v"` and `"F"`.
+    mode : str
+        `'w'` to create a new trajectory, `'a'` to append frames to an existing one (its header is then used, and
+        the other parameters are ignored).
+    codec : str
+        `"raw"` (fixed-size records), or `"zlib"` or `"lzma"` to compress frames by chunks (see `QuantizedCodec`).
+    precision : float
+        Precision of saved positions, with a compressed codec (eg. :code:`1e-4*model.sigma_a`).
+    origin : tuple
+        Lower limits of the box (:code:`model.lim_inf`), with a compressed codec.
+    chunk : int
+        Number of frames by chunk, with a compressed codec. Reading a frame needs to decompress its whole chunk.
+    until : int
+        In `'a'` mode, frames of iterations greater or equal to `until` are discarded (eg. when resuming a simulation
+        from a checkpoint).
+
+    Attributes
+    ----------
+    header : dict
+        Description of the trajectory.
+    frames : int
+        Number of frames in the file.
+    """
+
+    def __init__(self, path, npart, dtype="f8", stride=1, channels=("pos",), mode="w", codec="raw", precision=None,
+                 origin=(0.0, 0.0), chunk=64, until=None):
+        self.path = str(path)
+        kept = None
+
+        if mode == "a" and os.path.exists(self.path) and os.path.getsize(self.path):
+            with open(self.path, "rb") as file:
+                self.header = read_header(file)
+            if self.header["npart"] != npart:
+                raise ValueError("Number of atoms differs from the existing trajectory")
+            self._dtype = _record_dtype(npart, np.dtype(self.header["dtype"]), self.header["channels"])
+            self.file = open(self.path, "r+b")
+            # on ignore un éventuel enregistrement incomplet (arrêt pendant l'écriture)
+            if self.header["codec"] == "raw":
+                self.frames = (os.path.getsize(self.path) - self.header["header_size"]) // self._dtype.itemsize
+                if until is not None and self.frames:
+                    iterations = np.memmap(self.path, dtype=self._dtype, mode="r", offset=self.header["header_size"],
+                                           shape=(self.frames,))["iteration"]
+                    self.frames = int(np.count_nonzero(np.cumprod(iterations < until)))
+                    del iterations
+                end = self.header["header_size"] + self.frames * self._dtype.itemsize
+            else:
+                offsets, iterations, end = _scan_chunks(self.file, self.header["header_size"])
+                if until is not None:
+                    for c in range(len(offsets)):
+                        n = int(np.count_nonzero(np.cumprod(iterations[c] < until)))
+                        if n < len(iterations[c]):
+                            # le bloc est tronqué : ses premières images seront réécrites
+                            if n:
+                                kept = Trajectory(self.path)._chunk(c)[:n].copy()
+                            iterations = iterations[:c]
+                            end = offsets[c]
+                            break
+                self.frames = sum(len(i) for i in iterations)
+            self.file.truncate(end)
+            self.file.seek(0, os.SEEK_END)
+        else:
+            for c in channels:
+                if c not in CHANNELS:
+                    raise ValueError(f"Unknown trajectory channel : {c}")
+            if codec not in CODECS:
+                raise ValueError(f"Unknown trajectory codec : {codec}")
+            self.header = {"version": VERSION, "npart": npart, "dtype": np.dtype(dtype).str, "stride": stride,
+                           "channels": list(channels), "codec": codec}
+            if codec != "raw":
+                if not precision or precision <= 0:
+                    raise ValueError("Compressed trajectories need a positive precision")
+                self.header.update(precision=float(precision), origin=[float(x) for x in origin], chunk=int(chunk))
+            self._dtype = _record_dtype(npart, np.dtype(dtype), channels)
+            self.file = open(self.path, "wb")
+            write_header(self.file, self.header)
+            self.header["header_size"] = HEADER_SIZE
+            self.frames = 0
+
+        self._record = np.zeros((1,), dtype=self._dtype)
+        if self.header["codec"] != "raw":
+            self._codec = QuantizedCodec(self.header, self._dtype)
+            self._pending = self.new_records(self.header["chunk"])
+            self._npending = 0
+        if kept is not None:
+            self.write_records(kept)
+
+    @property
+    def channels(self):
+        """
+        list : Saved arrays.
+        """
+        return self.header["channels"]
+
+    def write(self, iteration, **arrays):
+        """
+        Appends a frame.
+
+        Parameters
+        ----------
+        iteration : int
+            Iteration number of the frame.
+        arrays : np.ndarray
+            Arrays of the frame, by channel name (eg. :code:`pos=model.pos`). Missing channels are saved as zeros.
+        """
+        _fill(self._record[0], self.channels, iteration, arrays)
+        self.write_records(self._record)
+
+    def new_records(self, n):
+        """
+
+        Parameters
+        ----------
+        n : int
+            Number of records.
+
+        Returns
+        -------
+        np.ndarray
+            Array of `n` empty frame records (structured array, with an `"iteration"` field and a field by channel).
+        """
+        return np.zeros((n,), dtype=self._dtype)
+
+    def write_records(self, records):
+        """
+        Appends frames given as records (see :py:meth:`new_records`).
+
+        Parameters
+        ----------
+        records : np.ndarray
+            Frame records.
+        """
+        if self.header["codec"] == "raw":
+            records.tofile(self.file)
+        else:
+            chunk = len(self._pending)
+            done = 0
+            while done < len(records):
+                k = min(chunk - self._npending, len(records) - done)
+                self._pending[self._npending:self._npending + k] = records[done:done + k]
+                self._npending += k
+                done += k
+                if self._npending == chunk:
+                    self._write_chunk()
+        self.frames += len(records)
+
+    def _write_chunk(self):
+        if not self._npending:
+            return
+        records = self._pending[:self._npending]
+        data = self._codec.encode(records)
+        head = np.zeros((1,), dtype=_CHUNK_HEAD)
+        head["size"] = len(data)
+        head["frames"] = self._npending
+        self.file.write(head.tobytes())
+        self.file.write(records["iteration"].astype("<i8").tobytes())
+        self.file.write(data)
+        self._npending = 0
+
+    def flush(self):
+        """
+        Flushes written frames to disk. With a compressed codec, the frames of an incomplete chunk are written as a
+        smaller chunk.
+        """
+        if self.header["codec"] != "raw":
+            self._write_chunk()
+        self.file.flush()
+
+    def close(self):
+        """
+        Closes the file.
+        """
+        if not self.file.closed:
+            if self.header["codec"] != "raw":
+                self._write_chunk()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class AsyncTrajectoryWriter:
+    """
+    Writes frames to a trajectory file from a background thread.
+
+    Frames are copied into a ring of preallocated records, then written to disk by a dedicated thread. When all
+    records are waiting to be written (the disk is slower than the simulation), :py:meth:`write` either waits for one
+    to be free (`"block"` policy), or drops the frame (`"drop"` policy, dropped frames are counted).
+
+    Can be used as a callback of `moldyn.simulation.runner.Simulation.iter` : a frame is then written every `stride`
+    iterations (`stride` of the trajectory header).
+
+    Designed to be used with a context manager (the with statement) ; pending frames are written and the file is
+    closed when leaving it.
+
+    Parameters
+    ----------
+    writer : TrajectoryWriter
+        Trajectory to which frames are written.
+    slots : int
+        Number of preallocated frame records.
+    policy : str
+        `"block"` or `"drop"`.
+
+    Attributes
+    ----------
+    writer : TrajectoryWriter
+        Trajectory to which frames are written.
+    dropped : int
+        Number of frames dropped (with the `"drop"` policy).
+    written : int
+        Number of frames written to disk.
+    io_time : float
+        Time spent by the background thread writing to disk, in seconds.
+
+    Example
+    -------
+    .. code-block:: python
+
+        with AsyncTrajectoryWriter(TrajectoryWriter(path, model.npart, stride=10)) as traj:
+            simulation.iter(10000, traj)
+        print(traj.throughput)
+    """
+
+    POLICIES = ("block", "drop")
+
+    def __init__(self, writer, slots=64, policy="block"):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown back-pressure policy : {policy}")
+        self.writer = writer
+        self.policy = policy
+        self.dropped = 0
+        self.written = 0
+        self.io_time = 0.0
+
+        self._records = writer.new_records(slots)
+        self._free = queue.Queue()
+        self._ready = queue.Queue()
+        for k in range(slots):
+            self._free.put(k)
+        self._error = None
+
+        self._thread = threading.Thread(target=self._run, name="trajectory writer", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            k = self._ready.get()
+            try:
+                if k is None:
+                    return
+                if self._error is None:
+                    t = time.perf_counter()
+                    self.writer.write_records(self._records[k:k + 1])
+                    self.io_time += time.perf_counter() - t
+                    self.written += 1
+            except Exception as e:
+                self._error = e
+            finally:
+                if k is not None:
+                    self._free.put(k)
+                self._ready.task_done()
+
+    def _check(self):
+        if self._error is not None:
+            raise self._error
+
+    def write(self, iteration, **arrays):
+        """
+        Queues a frame. Arrays are copied, and can be modified once the method returned.
+
+        Parameters
+        ----------
+        iteration : int
+            Iteration number of the frame.
+        arrays : np.ndarray
+            Arrays of the frame, by channel name (see `TrajectoryWriter.write`).
+
+        Returns
+        -------
+        bool
+            `False` if the frame was dropped.
+        """
+        self._check()
+        if self.policy == "block":
+            k = self._free.get()
+        else:
+            try:
+                k = self._free.get_nowait()
+            except queue.Empty:
+                self.dropped += 1
+                return False
+        _fill(self._records[k], self.writer.channels, iteration, arrays)
+        self._ready.put(k)
+        return True
+
+    def __call__(self, simulation):
+        if simulation.current_iter % self.writer.header["stride"] == 0:
+            self.write(simulation.current_iter, pos=simulation.model.pos, v=simulation.model.v, F=simulation.F)
+
+    @property
+    def pending(self):
+        """
+        int : Number of frames waiting to be written.
+        """
+        return self._ready.qsize()
+
+    @property
+    def throughput(self):
+        """
+        float : Write throughput of the background thread, in bytes per second.
+        """
+        return self.written * self._records.itemsize / max(self.io_time, 1e-9)
+
+    def flush(self):
+        """
+        Waits for all queued frames to be written, and flushes them to disk.
+        """
+        self._ready.join()
+        self._check()
+        self.writer.flush()
+
+    def close(self):
+        """
+        Writes all queued frames, stops the background thread and closes the file.
+        """
+        if self._thread.is_alive():
+            self._ready.put(None)
+            self._thread.join()
+        self.writer.close()
+        self._check()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class Trajectory:
+    """
+    Random-access reader of a trajectory file.
+
+    Frames are read through `np.memmap` : only the frames that are accessed are loaded. With a compressed codec,
+    only the chunks holding accessed frames are decompressed (the last one is kept in memory).
+
+    Parameters
+    ----------
+    path : str
+        Path of the trajectory file.
+    offset : int
+        Position of the trajectory in the file (eg. a member stored without compression in a zip archive).
+    size : int
+        Size of the trajectory in the file. Defaults to the rest of the file.
+
+    Attributes
+    ----------
+    header : dict
+        Description of the trajectory (`npart`, `dtype`, `stride`, `channels`...).
+
+    Example
+    -------
+    .. code-block:: python
+
+        traj = Trajectory(path)
+        pos = traj[k] # positions of frame k
+        for pos in traj[::10]: # every ten frames
+            ...
+    """
+
+    def __init__(self, path, offset=0, size=None):
+        self.path = str(path)
+        if size is None:
+            size = os.path.getsize(self.path) - offset
+        with open(self.path, "rb") as file:
+            file.seek(offset)
+            self.header = read_header(file)
+            if self.header["codec"] != "raw":
+                offsets, iterations, _ = _scan_chunks(file, offset + self.header["header_size"], offset + size)
+        self._dtype = _record_dtype(self.header["npart"], np.dtype(self.header["dtype"]), self.header["channels"])
+
+        if self.header["codec"] == "raw":
+            frames = (size - self.header["header_size"]) // self._dtype.itemsize
+            if frames:
+                self._records = np.memmap(self.path, dtype=self._dtype, mode="r",
+                                          offset=offset + self.header["header_size"], shape=(frames,))
+            else:
+                self._records = np.zeros((0,), dtype=self._dtype)
+            self._iterations = self._records["iteration"]
+        else:
+            self._codec = QuantizedCodec(self.header, self._dtype)
+            self._offsets = offsets
+            # indice de la première image de chaque bloc
+            self._first = np.cumsum([0] + [len(i) for i in iterations])
+            self._iterations = np.concatenate(iterations) if iterations else np.zeros((0,), dtype="<i8")
+            self._cache = (None, None)
+
+    def _chunk(self, c):
+        # images du bloc c, décompressées
+        if self._cache[0] != c:
+            with open(self.path, "rb") as file:
+                file.seek(self._offsets[c])
+                head = np.frombuffer(file.read(_CHUNK_HEAD.itemsize), dtype=_CHUNK_HEAD)[0]
+                file.seek(8 * int(head["frames"]), os.SEEK_CUR)
+                data = file.read(int(head["size"]))
+            self._cache = (c, self._codec.decode(data, self._iterations[self._first[c]:self._first[c + 1]]))
+        return self._cache[1]
+
+    def _take(self, item):
+        # enregistrements des images demandées (indice, tranche ou tableau d'indices)
+        if self.header["codec"] == "raw":
+            return self._records[item]
+        index = np.arange(len(self))[item]
+        chunks = np.searchsorted(self._first, index, side="right") - 1
+        if np.ndim(index) == 0:
+            return self._chunk(int(chunks))[index - self._first[chunks]]
+        records = np.empty(index.shape, dtype=self._dtype)
+        for c in np.unique(chunks):
+            mask = chunks == c
+            records[mask] = self._chunk(int(c))[index[mask] - self._first[c]]
+        return records
+
+    @property
+    def channels(self):
+        """
+        list : Saved arrays.
+        """
+        return self.header["channels"]
+
+    @property
+    def iterations(self):
+        """
+        np.ndarray : Iteration number of each frame.
+        """
+        return self._iterations
+
+    def channel(self, name="pos"):
+        """
+
+        Parameters
+        ----------
+        name : str
+            Channel name (`"pos"`, `"v"` or `"F"`).
+
+        Returns
+        -------
+        np.ndarray
+            Memory-mapped array of shape :code:`(frames, npart, 2)` (decompressed array with a compressed codec).
+        """
+        if name not in self.channels:
+            raise KeyError(f"Channel {name} was not saved")
+        return self._take(slice(None))[name]
+
+    def frame(self, k):
+        """
+
+        Parameters
+        ----------
+        k : int
+            Frame index.
+
+        Returns
+        -------
+        dict
+            Iteration number and arrays of frame `k`.
+        """
+        record = self._take(k)
+        frame = {"iteration": int(record["iteration"])}
+        for c in self.channels:
+            frame[c] = np.array(record[c])
+        return frame
+
+    def __len__(self):
+        return len(self._iterations)
+
+    def __getitem__(self, item):
+        if self.header["codec"] == "raw":
+            return self.channel("pos")[item]
+        return self._take(item)["pos"]
+
+    def __iter__(self):
+        if self.header["codec"] == "raw":
+            return iter(self.channel("pos"))
+        return (pos for c in range(len(self._offsets)) for pos in self._chunk(c)["pos"])